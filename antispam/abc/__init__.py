@@ -1,4 +1,5 @@
 from antispam.abc.cache import Cache
 from antispam.abc.lib import Lib
+from antispam.abc.similarity_engine import SimilarityEngine
 
-__all__ = ("Lib", "Cache")
+__all__ = ("Lib", "Cache", "SimilarityEngine")
@@ -22,14 +22,25 @@ DEALINGS IN THE SOFTWARE.
 """
 from typing import AsyncIterable, List, Optional, Protocol, Union, runtime_checkable
 
-from antispam.dataclasses import Guild, Member, Message
+from antispam.dataclasses import Guild, Member, Message, Options
 from antispam.dataclasses.propagate_data import PropagateData
 from antispam.enums import ResetType
 
 
 @runtime_checkable
 class Cache(Protocol):
-    """A generic Protocol for any Cache to implement"""
+    """
+    A generic Protocol for any Cache to implement
+
+    Notes
+    -----
+    Caches can also implement ``get_guild_metadata(guild_id)``,
+    returning a Guild without its members, and
+    ``get_guild_options(guild_id)``, returning only its Options.
+    These aren't part of the Protocol, :py:func:`get_guild_metadata`
+    and :py:func:`get_guild_options` fall back to :py:meth:`get_guild`
+    for caches without them.
+    """
 
     def __init__(self, handler) -> None:
         """Stores the handler for later option usage"""
@@ -232,3 +243,66 @@ class Cache(Protocol):
         deleting everything contained within.
         """
         raise NotImplementedError
+
+
+async def get_guild_metadata(cache: Cache, guild_id: int) -> Guild:
+    """Fetch a Guild from a cache without populating its members,
+    if the cache supports it
+
+    Parameters
+    ----------
+    cache : Cache
+        The cache to fetch from
+    guild_id : int
+        The id of the Guild to retrieve from cache
+
+    Raises
+    ------
+    GuildNotFound
+        A Guild could not be found in the cache
+        with the given id
+
+    Notes
+    -----
+    Caches without a ``get_guild_metadata``
+    method return the full guild instead.
+
+    Warnings
+    --------
+    The returned Guild should never be given to
+    :py:meth:`Cache.set_guild` as its members may be missing.
+    """
+    method = getattr(cache, "get_guild_metadata", None)
+    if method is None:
+        return await cache.get_guild(guild_id)
+
+    return await method(guild_id)
+
+
+async def get_guild_options(cache: Cache, guild_id: int) -> Options:
+    """Fetch only the Options for a Guild from a cache
+
+    Parameters
+    ----------
+    cache : Cache
+        The cache to fetch from
+    guild_id : int
+        The id of the Guild to retrieve Options for
+
+    Raises
+    ------
+    GuildNotFound
+        A Guild could not be found in the cache
+        with the given id
+
+    Notes
+    -----
+    Caches without a ``get_guild_options``
+    method use :py:func:`get_guild_metadata`
+    """
+    method = getattr(cache, "get_guild_options", None)
+    if method is None:
+        guild = await get_guild_metadata(cache, guild_id)
+        return guild.options
+
+    return await method(guild_id)
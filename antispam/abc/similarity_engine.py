@@ -0,0 +1,96 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+from typing import Protocol, runtime_checkable
+
+
+@runtime_checkable
+class SimilarityEngine(Protocol):
+    """A generic Protocol for any message similarity engine to implement.
+
+    An engine is responsible for deciding how 'close'
+    two pieces of message content are, on a scale of
+    ``0`` to ``100``. This is compared against
+    :py:attr:`antispam.Options.message_duplicate_accuracy`
+    to decide whether a message is a duplicate.
+    """
+
+    def process(self, content: str) -> str:
+        """
+        Normalize content into the form :py:meth:`compare` expects.
+
+        For the built-in engines this is the lower cased,
+        punctuation stripped and token sorted content.
+
+        Parameters
+        ----------
+        content : str
+            The raw message content
+
+        Returns
+        -------
+        str
+            The processed content
+        """
+        raise NotImplementedError
+
+    def compare(self, first: str, second: str, score_cutoff: float = 0) -> float:
+        """
+        Score two pieces of already processed content.
+
+        Parameters
+        ----------
+        first : str
+            Content which has been through :py:meth:`process`
+        second : str
+            Content which has been through :py:meth:`process`
+        score_cutoff : float
+            The minimum score we care about. Engines are
+            free to exit early and return ``0`` if they
+            can tell the result will fall below this.
+
+        Returns
+        -------
+        float
+            The similarity between ``0`` and ``100``
+        """
+        raise NotImplementedError
+
+    def ratio(self, first: str, second: str, score_cutoff: float = 0) -> float:
+        """
+        Process and then score two pieces of raw content.
+
+        Parameters
+        ----------
+        first : str
+            The raw content of the first message
+        second : str
+            The raw content of the second message
+        score_cutoff : float
+            See :py:meth:`compare`
+
+        Returns
+        -------
+        float
+            The similarity between ``0`` and ``100``
+        """
+        return self.compare(self.process(first), self.process(second), score_cutoff)
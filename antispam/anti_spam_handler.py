@@ -20,20 +20,44 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
 FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
+import asyncio
 import functools
 import logging
+import time
+from concurrent.futures import Executor
 from copy import deepcopy
-from typing import TYPE_CHECKING, Dict, Optional, Set, Type, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
 from attr import asdict
 
-from antispam.abc import Cache
+from antispam.abc import Cache, SimilarityEngine
+from antispam.abc import cache as abc_cache
 from antispam.base_plugin import BasePlugin
 from antispam.caches import MemoryCache
+from antispam.caches.batch_cache import BatchCache
 from antispam.core import Core
-from antispam.dataclasses import CorePayload, Guild, Options
+from antispam.dataclasses import (
+    CorePayload,
+    Guild,
+    OffloadMetrics,
+    Options,
+)
+from antispam.dataclasses.compact import serialize_compact_messages
+from antispam.dataclasses.propagate_data import PropagateData
 from antispam.deprecation import mark_deprecated
-from antispam.enums import IgnoreType, Library, ResetType
+from antispam.engines import RapidFuzzEngine, ScoreCache
+from antispam.enums import IgnoreType, Library, OverflowPolicy, ResetType
 from antispam.exceptions import (
     GuildNotFound,
     InvalidMessage,
@@ -44,6 +68,11 @@ from antispam.exceptions import (
     UnsupportedAction,
 )
 from antispam.factory import FactoryBuilder
+from antispam.ingestion import IngestionQueue
+from antispam.libs.shared import PropagationFilter
+from antispam.member_locks import MemberLocks
+from antispam.metrics import HandlerMetrics, MetricsRegistry
+from antispam.stage_timings import StageTimings
 from antispam.util import get_aware_time
 
 if TYPE_CHECKING:  # pragma: no cover
@@ -57,6 +86,73 @@ this is responsible for handling interaction with Guilds etc
 """
 
 
+def build_plugin_stages(
+    plugins: Dict[str, BasePlugin]
+) -> List[List[Tuple[str, BasePlugin]]]:
+    """
+    Groups plugins into stages which are called one after another,
+    where every plugin within a stage can be called at once.
+
+    Parameters
+    ----------
+    plugins : Dict[str, BasePlugin]
+        The plugins to group, in the order they were registered
+
+    Returns
+    -------
+    List[List[Tuple[str, BasePlugin]]]
+        Each stage, as pairs of registered name and plugin
+
+    Raises
+    ------
+    PluginError
+        Plugins depend on each other in a cycle
+    """
+    dependencies: Dict[str, Set[str]] = {
+        name: {
+            dependency.lower()
+            for dependency in plugin.depends_on
+            # Plugins which aren't registered can't hold anything up
+            if dependency.lower() in plugins
+        }
+        for name, plugin in plugins.items()
+    }
+
+    # Topologically sort, preferring the order plugins were registered in
+    ordered: List[str] = []
+    done: Set[str] = set()
+    while len(ordered) < len(plugins):
+        for name in plugins:
+            if name not in done and dependencies[name] <= done:
+                ordered.append(name)
+                done.add(name)
+                break
+        else:
+            raise PluginError(
+                "After invoke plugins depend on each other in a cycle: "
+                + ", ".join(name for name in plugins if name not in done)
+            )
+
+    stages: List[List[Tuple[str, BasePlugin]]] = []
+    # The trailing stage, if plugins can still be added to it
+    open_stage: Optional[List[Tuple[str, BasePlugin]]] = None
+    open_stage_names: Set[str] = set()
+    for name in ordered:
+        plugin = plugins[name]
+        if not plugin.concurrent_safe:
+            stages.append([(name, plugin)])
+            open_stage = None
+        elif open_stage is not None and not dependencies[name] & open_stage_names:
+            open_stage.append((name, plugin))
+            open_stage_names.add(name)
+        else:
+            open_stage = [(name, plugin)]
+            open_stage_names = {name}
+            stages.append(open_stage)
+
+    return stages
+
+
 def ensure_init(func):
     """Ensures all cache related operations
     are done on an initialized cache.
@@ -83,6 +179,13 @@ class AntiSpamHandler:
         *,
         options: Options = None,
         cache: Cache = None,
+        similarity_engine: SimilarityEngine = None,
+        executor: Executor = None,
+        offload_threshold: int = 20000,
+        score_cache: ScoreCache = None,
+        member_locks: MemberLocks = None,
+        stage_timings: StageTimings = None,
+        metrics: MetricsRegistry = None,
     ):
         """
         AntiSpamHandler entry point.
@@ -99,6 +202,49 @@ class AntiSpamHandler:
             the handler should use
         cache : Cache, Optional
             Your choice of backend caching
+        similarity_engine : SimilarityEngine, Optional
+            How message content should be compared
+            when looking for duplicates.
+
+            Defaults to :py:class:`antispam.engines.RapidFuzzEngine`
+        executor : Executor, Optional
+            An executor, such as a ``ProcessPoolExecutor``, to
+            compare long messages within rather then blocking
+            the event loop. You are responsible for shutting it down.
+
+            Defaults to comparing everything inline.
+        offload_threshold : int, Optional
+            How many characters of content a message and the
+            messages it is compared against need to have combined
+            before comparisons are made within ``executor``
+
+            Defaults to ``20000``
+        score_cache : ScoreCache, Optional
+            Where similarity scores are cached, this is
+            shared between every guild. Pass the same instance
+            to multiple handlers to share it between them, as long
+            as they use the same ``similarity_engine``.
+
+            Defaults to a :py:class:`antispam.engines.ScoreCache`
+            with its default memory cap.
+        member_locks : MemberLocks, Optional
+            How messages from the same member are kept from
+            being processed at the same time, while still
+            letting different members be processed concurrently.
+
+            Defaults to a :py:class:`antispam.member_locks.MemberLocks`
+            with its default amount of shards.
+        stage_timings : StageTimings, Optional
+            Where how long each stage of propagating
+            a message, including each plugin, takes is recorded.
+
+            Defaults to not timing anything, unless
+            ``metrics`` is given.
+        metrics : MetricsRegistry, Optional
+            Where metrics about propagated messages,
+            punishments and the handlers internals are kept.
+
+            Defaults to not keeping any metrics.
         """
 
         options = options or Options()
@@ -129,14 +275,59 @@ class AntiSpamHandler:
         if not issubclass(type(cache), Cache):
             raise ValueError("Expected `cache` that inherits from the `Cache` Protocol")
 
+        similarity_engine = similarity_engine or RapidFuzzEngine()
+        if not issubclass(type(similarity_engine), SimilarityEngine):
+            raise ValueError(
+                "Expected `similarity_engine` that inherits from the `SimilarityEngine` Protocol"
+            )
+
+        if executor is not None and not isinstance(executor, Executor):
+            raise ValueError("Expected `executor` of type `Executor`")
+
+        if offload_threshold < 0:
+            raise ValueError("Expected `offload_threshold` to not be negative")
+
+        if stage_timings is not None and not isinstance(stage_timings, StageTimings):
+            raise ValueError("Expected `stage_timings` of type `StageTimings`")
+
+        if metrics is not None:
+            if not isinstance(metrics, MetricsRegistry):
+                raise ValueError("Expected `metrics` of type `MetricsRegistry`")
+
+            stage_timings = stage_timings or StageTimings()
+
         self.bot = bot
         self.cache = cache
+        self.similarity_engine: SimilarityEngine = similarity_engine
+        self.executor: Optional[Executor] = executor
+        self.offload_threshold: int = offload_threshold
+        self.offload_metrics: OffloadMetrics = OffloadMetrics()
+        self.score_cache: ScoreCache = score_cache or ScoreCache()
+        self.member_locks: MemberLocks = member_locks or MemberLocks()
+        self.stage_timings: Optional[StageTimings] = stage_timings
+        # Where plugins are timed when stage_timings isn't set
+        self._plugin_timings: StageTimings = StageTimings()
+        self.ingestion: Optional[IngestionQueue] = None
+        # Guild id -> its compiled ignore rules, see add_ignored_item etc
+        self.propagation_filters: Dict[int, PropagationFilter] = {}
         self.core = Core(self)
+        self.metrics: Optional[HandlerMetrics] = (
+            HandlerMetrics(metrics, self) if metrics is not None else None
+        )
 
         self.needs_init = True
 
         self.pre_invoke_plugins: Dict[str, BasePlugin] = {}
         self.after_invoke_plugins: Dict[str, BasePlugin] = {}
+        # (plugins and their guilds_version they were built for, stages,
+        # guild id -> stages with the plugins subscribed to that guild)
+        self._after_invoke_stages: Optional[
+            Tuple[
+                Tuple[Tuple[str, int, Tuple[int, int, int]], ...],
+                List[List[Tuple[str, BasePlugin]]],
+                Dict[int, List[List[Tuple[str, BasePlugin]]]],
+            ]
+        ] = None
 
         # Import these here to avoid errors when not
         # having the other lib installed
@@ -222,13 +413,257 @@ class AntiSpamHandler:
         dict
             A dictionary of useful information about the Member in question
         """
-        try:
-            propagate_data = await self.lib_handler.check_message_can_be_propagated(
-                message=message
+        return await self._propagate(message, core=self.core, cache=self.cache)
+
+    @ensure_init
+    async def propagate_many(
+        self, messages: Iterable, *, return_exceptions: bool = False
+    ) -> List[Optional[Union[CorePayload, dict, Exception]]]:
+        """
+        Propagate a burst of messages at once.
+
+        Messages are processed one after another in the order
+        given, exactly as with :py:meth:`propagate`. However, each
+        guild and member is only loaded from the cache once and
+        each touched member is only written back once at the end.
+
+        Parameters
+        ----------
+        messages : Iterable[Union[discord.Message, hikari.messages.Message]]
+            The messages that need to be propagated out
+        return_exceptions : bool
+            If ``True``, exceptions raised while propagating a
+            message are returned in its place rather then raised.
+
+        Returns
+        -------
+        List[Optional[Union[CorePayload, dict, Exception]]]
+            What :py:meth:`propagate` would have returned
+            for each message, in the same order as ``messages``
+
+        Notes
+        -----
+        Every member in the batch stays locked until it has
+        finished, so :py:meth:`propagate` calls for those members
+        wait on the whole batch.
+
+        Plugins which read from the cache directly will not see
+        changes made earlier in the same batch until it has finished,
+        unless you are using :py:class:`antispam.caches.MemoryCache`.
+        Anything they write is kept.
+        """
+        if isinstance(self.cache, MemoryCache):
+            # Everything is already in memory, there are no round trips to save
+            cache = self.cache
+            core = self.core
+        else:
+            cache = BatchCache(self, self.cache)
+            core = Core(self, cache=cache)
+
+        filtered: List[Tuple[Any, Union[PropagateData, dict, Exception]]] = []
+        for message in messages:
+            try:
+                filtered.append((message, await self._get_propagate_data(message)))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+
+                filtered.append((message, e))
+
+        results = []
+        async with self.member_locks.hold_many(
+            (data.guild_id, data.member_id)
+            for _, data in filtered
+            if isinstance(data, PropagateData)
+        ):
+            try:
+                for message, data in filtered:
+                    if not isinstance(data, PropagateData):
+                        results.append(data)
+                        continue
+
+                    try:
+                        results.append(
+                            await self._propagate_member(
+                                message,
+                                data,
+                                core=core,
+                                cache=cache,
+                                skip_plugins=False,
+                            )
+                        )
+                    except Exception as e:
+                        if not return_exceptions:
+                            raise
+
+                        results.append(e)
+            finally:
+                if isinstance(cache, BatchCache):
+                    await cache.flush()
+
+        return results
+
+    @ensure_init
+    async def start(
+        self,
+        *,
+        workers: int = 4,
+        max_queue_size: int = 1000,
+        overflow_policy: OverflowPolicy = OverflowPolicy.BLOCK,
+    ) -> None:
+        """
+        Start workers to propagate messages
+        given to :py:meth:`submit` in the background.
+
+        Rather then every message being propagated at once,
+        at most ``workers`` messages are propagated at a time
+        while the rest wait in bounded queues.
+
+        Parameters
+        ----------
+        workers : int
+            How many messages can be propagated at once.
+
+            Defaults to ``4``
+        max_queue_size : int
+            How many messages can be waiting for each worker
+            before ``overflow_policy`` comes into effect.
+
+            Defaults to ``1000``
+        overflow_policy : OverflowPolicy
+            What to do when a message is submitted
+            while its queue is full.
+
+            Defaults to :py:attr:`OverflowPolicy.BLOCK`
+
+        Raises
+        ------
+        UnsupportedAction
+            The workers have already been started
+        ValueError
+            Invalid arguments were given
+
+        Notes
+        -----
+        Messages from the same member always go to the same worker,
+        so are propagated in the order they were submitted.
+
+        Metrics for the queue can be found
+        on ``AntiSpamHandler.ingestion.metrics``
+        """
+        if self.ingestion is not None and self.ingestion.running:
+            raise UnsupportedAction("The workers have already been started")
+
+        self.ingestion = IngestionQueue(
+            self,
+            workers=workers,
+            max_queue_size=max_queue_size,
+            overflow_policy=overflow_policy,
+        )
+        if self.metrics is not None:
+            self.ingestion.metrics.register_metrics(self.metrics.registry)
+
+        self.ingestion.start()
+        log.info("Started %s workers", workers)
+
+    async def stop(self, *, drain: bool = True) -> None:
+        """
+        Stop the workers started by :py:meth:`start`
+
+        Parameters
+        ----------
+        drain : bool
+            If ``True``, wait for every message
+            already submitted to be propagated first.
+            Otherwise they are cancelled.
+
+            Defaults to ``True``
+        """
+        if self.ingestion is None or not self.ingestion.running:
+            return
+
+        await self.ingestion.stop(drain=drain)
+        log.info("Stopped workers")
+
+    async def submit(self, message) -> asyncio.Future:
+        """
+        Queue a message to be propagated by the
+        workers started with :py:meth:`start`
+
+        Parameters
+        ----------
+        message : Union[discord.Message, hikari.messages.Message]
+            The message that needs to be propagated out
+
+        Returns
+        -------
+        asyncio.Future
+            A future which resolves to what :py:meth:`propagate`
+            would have returned. It is cancelled if the message is
+            dropped or the workers are stopped before it is propagated.
+
+        Raises
+        ------
+        UnsupportedAction
+            The workers have not been started
+        """
+        if self.ingestion is None or not self.ingestion.running:
+            raise UnsupportedAction(
+                "You must call AntiSpamHandler.start before submitting messages"
+            )
+
+        return await self.ingestion.submit(message)
+
+    async def _get_propagate_data(self, message) -> Union[PropagateData, dict]:
+        timings = self.stage_timings
+        if timings is not None:
+            start = time.perf_counter()
+
+        if getattr(self.lib_handler, "supports_propagate_data", False):
+            # Skip raising and catching on messages we ignore
+            propagate_data = await self.lib_handler.get_propagate_data(message)
+        else:
+            try:
+                propagate_data = await self.lib_handler.check_message_can_be_propagated(
+                    message=message
+                )
+            except PropagateFailure as e:
+                propagate_data = e.data
+
+        if timings is not None:
+            timings.record("filter", start)
+
+        return propagate_data
+
+    async def _propagate(
+        self, message, *, core: Core, cache: Cache, skip_plugins: bool = False
+    ) -> Optional[Union[CorePayload, dict]]:
+        propagate_data = await self._get_propagate_data(message)
+        if not isinstance(propagate_data, PropagateData):
+            return propagate_data
+
+        # Everything from loading the member through to saving them
+        # again needs to happen without another message interleaving
+        async with self.member_locks.hold(
+            propagate_data.guild_id, propagate_data.member_id
+        ):
+            return await self._propagate_member(
+                message,
+                propagate_data,
+                core=core,
+                cache=cache,
+                skip_plugins=skip_plugins,
             )
-        except PropagateFailure as e:
-            return e.data
 
+    async def _propagate_member(
+        self,
+        message,
+        propagate_data: PropagateData,
+        *,
+        core: Core,
+        cache: Cache,
+        skip_plugins: bool,
+    ) -> Optional[Union[CorePayload, dict]]:
         log.info(
             "Propagating message for %s(%s) in guild(%s)",
             propagate_data.member_name,
@@ -236,8 +671,13 @@ class AntiSpamHandler:
             propagate_data.guild_id,
         )
 
+        timings = self.stage_timings
+        if timings is not None:
+            start = time.perf_counter()
+
         try:
-            guild = await self.cache.get_guild(guild_id=propagate_data.guild_id)
+            # Core fetches the member itself, so the rest aren't needed
+            guild = await abc_cache.get_guild_metadata(cache, propagate_data.guild_id)
         except GuildNotFound:
             # Check we have perms to actually create this guild object
             # and punish based upon our guild wide permissions
@@ -248,17 +688,26 @@ class AntiSpamHandler:
                 raise MissingGuildPermissions
 
             guild = Guild(id=propagate_data.guild_id, options=self.options)
-            await self.cache.set_guild(guild)
+            await cache.set_guild(guild)
             log.info("Created Guild(id=%s)", guild.id)
 
+        if timings is not None:
+            timings.record("guild_load", start)
+
         pre_invoke_extensions = {}
 
-        for pre_invoke_ext in self.pre_invoke_plugins.values():
-            if guild.id in pre_invoke_ext.blacklisted_guilds:
+        for name, pre_invoke_ext in self.pre_invoke_plugins.items():
+            if not pre_invoke_ext.is_subscribed_to_guild(guild.id):
                 # https://github.com/Skelmis/DPY-Anti-Spam/issues/65
                 continue
 
-            pre_invoke_return = await pre_invoke_ext.propagate(message)
+            if timings is None:
+                pre_invoke_return = await pre_invoke_ext.propagate(message)
+            else:
+                start = time.perf_counter()
+                pre_invoke_return = await pre_invoke_ext.propagate(message)
+                timings.record(f"pre_invoke:{name}", start)
+
             pre_invoke_extensions[pre_invoke_ext.__class__.__name__] = pre_invoke_return
 
             try:
@@ -293,23 +742,112 @@ class AntiSpamHandler:
                 pass
 
         try:
-            main_return = await self.core.propagate(message, guild=guild)
+            main_return = await core.propagate(message, guild=guild)
             main_return.pre_invoke_extensions = pre_invoke_extensions
         except InvalidMessage as e:
             return {"status": e.message}
 
-        for after_invoke_ext in self.after_invoke_plugins.values():
-            if guild.id in after_invoke_ext.blacklisted_guilds:
-                # https://github.com/Skelmis/DPY-Anti-Spam/issues/65
-                continue
+        if self.metrics is not None:
+            self.metrics.observe(guild.id, main_return)
+
+        if skip_plugins:
+            return main_return
+
+        for stage in self._get_after_invoke_stages(guild.id):
+            # Skipped plugins still get an entry, in
+            # the same order as if they had been called
+            returns: Dict[str, Any] = {}
+            subscribed: List[Tuple[str, BasePlugin]] = []
+            for name, plugin in stage:
+                if plugin.is_subscribed_to(message, main_return):
+                    returns[plugin.__class__.__name__] = None
+                    subscribed.append((name, plugin))
+                else:
+                    returns[plugin.__class__.__name__] = plugin.skipped_return(
+                        message, main_return
+                    )
+
+            stage = subscribed
+            if not stage:
+                results = []
+            elif len(stage) == 1:
+                results = [
+                    await self._run_after_invoke_plugin(*stage[0], message, main_return)
+                ]
+            else:
+                results = await asyncio.gather(
+                    *(
+                        self._run_after_invoke_plugin(
+                            name, plugin, message, main_return
+                        )
+                        for name, plugin in stage
+                    )
+                )
 
-            after_invoke_return = await after_invoke_ext.propagate(message, main_return)
-            main_return.after_invoke_extensions[
-                after_invoke_ext.__class__.__name__
-            ] = after_invoke_return
+            # Plugins in later stages see these, and the
+            # order is the same however long each plugin took
+            for (_, plugin), after_invoke_return in zip(stage, results):
+                returns[plugin.__class__.__name__] = after_invoke_return
+
+            main_return.after_invoke_extensions.update(returns)
 
         return main_return
 
+    @property
+    def plugin_timings(self) -> StageTimings:
+        """
+        How long each after invoke plugin has taken, under the
+        ``after_invoke:<name>`` stage for its registered name.
+
+        Plugins are always timed. This is :py:attr:`stage_timings`
+        when it is set, otherwise somewhere only plugins are timed.
+        """
+        if self.stage_timings is not None:
+            return self.stage_timings
+
+        return self._plugin_timings
+
+    async def _run_after_invoke_plugin(
+        self, name: str, plugin: BasePlugin, message, main_return: CorePayload
+    ) -> Any:
+        start = time.perf_counter()
+        try:
+            return await plugin.propagate(message, main_return)
+        finally:
+            self.plugin_timings.record(f"after_invoke:{name}", start)
+
+    def _get_after_invoke_stages(
+        self, guild_id: int
+    ) -> List[List[Tuple[str, BasePlugin]]]:
+        key = tuple(
+            (name, id(plugin), plugin.guilds_version)
+            for name, plugin in self.after_invoke_plugins.items()
+        )
+        if self._after_invoke_stages is None or self._after_invoke_stages[0] != key:
+            stages = build_plugin_stages(self.after_invoke_plugins)
+            self._after_invoke_stages = (key, stages, {})
+
+        _, stages, guild_stages = self._after_invoke_stages
+        try:
+            return guild_stages[guild_id]
+        except KeyError:
+            pass
+
+        # https://github.com/Skelmis/DPY-Anti-Spam/issues/65
+        guild_stages[guild_id] = [
+            subscribed
+            for subscribed in (
+                [
+                    (name, plugin)
+                    for name, plugin in stage
+                    if plugin.is_subscribed_to_guild(guild_id)
+                ]
+                for stage in stages
+            )
+            if subscribed
+        ]
+        return guild_stages[guild_id]
+
     def add_ignored_item(self, item: int, ignore_type: IgnoreType) -> None:
         """
         Add an item to the relevant ignore list
@@ -349,6 +887,7 @@ class AntiSpamHandler:
         else:
             self.options.ignored_roles.add(item)
 
+        self.propagation_filters.clear()
         log.info("Added %s as an ignored item under bucket %s", item, ignore_type.name)
 
     def remove_ignored_item(self, item: int, ignore_type: IgnoreType) -> None:
@@ -390,6 +929,7 @@ class AntiSpamHandler:
         else:
             self.options.ignored_roles.discard(item)
 
+        self.propagation_filters.clear()
         log.info(
             "Removed %s as an ignored item under bucket %s", item, ignore_type.name
         )
@@ -432,6 +972,7 @@ class AntiSpamHandler:
             guild.options = options
 
         await self.cache.set_guild(guild)
+        self.propagation_filters.pop(guild_id, None)
         log.info("Set custom options for guild(%s)", guild_id)
 
     @ensure_init
@@ -461,8 +1002,8 @@ class AntiSpamHandler:
         the options on the guild you should use the package methods.
 
         """
-        guild = await self.cache.get_guild(guild_id=guild_id)
-        return deepcopy(guild.options)
+        options = await abc_cache.get_guild_options(self.cache, guild_id)
+        return deepcopy(options)
 
     async def get_options(self) -> Options:
         """
@@ -500,6 +1041,7 @@ class AntiSpamHandler:
         else:
             guild.options = self.options
             await self.cache.set_guild(guild)
+            self.propagation_filters.pop(guild_id, None)
             log.debug("Reset options for Guild(id=%s)", guild_id)
 
     @ensure_init
@@ -758,7 +1300,9 @@ class AntiSpamHandler:
             "after_invoke_plugins": {},
         }
         async for guild in self.cache.get_all_guilds():  # pragma: no cover
-            data["guilds"].append(asdict(guild, recurse=True))
+            data["guilds"].append(
+                asdict(guild, recurse=True, value_serializer=serialize_compact_messages)
+            )
 
         for plugin in self.pre_invoke_plugins.values():
             try:
@@ -1003,6 +1547,7 @@ class AntiSpamHandler:
             raise ValueError("Expected `cache` that inherits from the `Cache` Protocol")
 
         self.cache = cache
+        self.propagation_filters.clear()
         log.info(
             "Changed the AntiSpamHandler cache to use %s", cache.__class__.__name__
         )
@@ -20,18 +20,181 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
 FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
-from typing import Any, Dict, Optional, Set
+from collections.abc import MutableSet
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
 
 from antispam.dataclasses import CorePayload
 
 
+class GuildSet(MutableSet):
+    """
+    A set of guild ids which counts how many times it has been
+    changed in :py:attr:`version`, so anything built from it
+    knows when to be rebuilt.
+    """
+
+    __slots__ = ("_guilds", "version")
+
+    def __init__(self, guilds: Iterable[int] = ()):
+        self._guilds: Set[int] = set(guilds)
+        self.version: int = 0
+
+    def __contains__(self, guild_id) -> bool:
+        return guild_id in self._guilds
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._guilds)
+
+    def __len__(self) -> int:
+        return len(self._guilds)
+
+    def __repr__(self):
+        return f"GuildSet({self._guilds!r})"
+
+    def add(self, guild_id: int) -> None:
+        if guild_id not in self._guilds:
+            self._guilds.add(guild_id)
+            self.version += 1
+
+    def discard(self, guild_id: int) -> None:
+        if guild_id in self._guilds:
+            self._guilds.discard(guild_id)
+            self.version += 1
+
+    def update(self, *others: Iterable[int]) -> None:
+        """Add every guild in ``others``, like :py:meth:`set.update`"""
+        for other in others:
+            self |= other
+
+    def difference_update(self, *others: Iterable[int]) -> None:
+        """Remove every guild in ``others``, like :py:meth:`set.difference_update`"""
+        for other in others:
+            self -= other
+
+
 class BasePlugin:
+    #: The names of after invoke plugins which must finish before this
+    #: plugin is called, I.e. ``("stats",)``. These are the names plugins
+    #: are registered under, which is their class name in lowercase.
+    depends_on: Tuple[str, ...] = ()
+
+    #: Whether this after invoke plugin can be called at the same time
+    #: as other after invoke plugins. Plugins which aren't are always
+    #: called on their own, in the order they were registered.
+    concurrent_safe: bool = False
+
+    #: Only call this after invoke plugin for messages
+    #: which the member should be punished for.
+    only_punished: bool = False
+
     def __init__(self, is_pre_invoke=True) -> None:
         self.is_pre_invoke = is_pre_invoke
 
         # A set of blacklisted guilds,
         # If a guilds in this, the plugin wont run
-        self.blacklisted_guilds: Set[int] = set()
+        self.blacklisted_guilds = GuildSet()
+
+        # If set, the plugin will only run in these guilds
+        self.subscribed_guilds = None
+
+    @property
+    def blacklisted_guilds(self) -> GuildSet:
+        """Guilds this plugin won't be called for"""
+        try:
+            return self._blacklisted_guilds
+        except AttributeError:
+            # Subclasses don't always call super().__init__()
+            self._blacklisted_guilds = GuildSet()
+            return self._blacklisted_guilds
+
+    @blacklisted_guilds.setter
+    def blacklisted_guilds(self, guilds: Iterable[int]) -> None:
+        self._blacklisted_guilds = GuildSet(guilds)
+        self._guild_sets_replaced = getattr(self, "_guild_sets_replaced", 0) + 1
+
+    @property
+    def subscribed_guilds(self) -> Optional[GuildSet]:
+        """
+        If not ``None``, the only guilds this plugin is called for.
+
+        Like ``blacklisted_guilds`` this applies to
+        both pre invoke and after invoke plugins.
+        """
+        return getattr(self, "_subscribed_guilds", None)
+
+    @subscribed_guilds.setter
+    def subscribed_guilds(self, guilds: Optional[Iterable[int]]) -> None:
+        self._subscribed_guilds = None if guilds is None else GuildSet(guilds)
+        self._guild_sets_replaced = getattr(self, "_guild_sets_replaced", 0) + 1
+
+    @property
+    def guilds_version(self) -> Tuple[int, int, int]:
+        """
+        Changes whenever ``blacklisted_guilds`` or ``subscribed_guilds``
+        are changed or replaced, so what :py:meth:`is_subscribed_to_guild`
+        returned can be cached until then.
+        """
+        subscribed = self.subscribed_guilds
+        return (
+            getattr(self, "_guild_sets_replaced", 0),
+            self.blacklisted_guilds.version,
+            -1 if subscribed is None else subscribed.version,
+        )
+
+    def is_subscribed_to_guild(self, guild_id: int) -> bool:
+        """
+        Whether this plugin should be called for messages in a guild.
+
+        This is checked once per guild, then cached until
+        ``blacklisted_guilds`` or ``subscribed_guilds`` change.
+        """
+        if guild_id in self.blacklisted_guilds:
+            return False
+
+        return self.subscribed_guilds is None or guild_id in self.subscribed_guilds
+
+    def is_subscribed_to(self, message, data: CorePayload) -> bool:
+        """
+        Whether this after invoke plugin should be called for a message.
+
+        This is checked before every call, so should be cheap and can't
+        be async. Override it to skip calls your plugin would ignore,
+        I.e. messages without any mentions.
+
+        Parameters
+        ----------
+        message : Union[discord.Message, hikari.messages.Message]
+            The message being propagated
+        data : CorePayload
+            The return value from the main ``propagate()``
+
+        Returns
+        -------
+        bool
+            ``True`` to call :py:meth:`propagate`
+        """
+        return not self.only_punished or data.member_should_be_punished_this_message
+
+    def skipped_return(self, message, data: CorePayload) -> Any:
+        """
+        What is stored under this plugins name in
+        ``CorePayload.after_invoke_extensions`` when
+        :py:meth:`is_subscribed_to` returns ``False``,
+        in place of what :py:meth:`propagate` would return.
+
+        Parameters
+        ----------
+        message : Union[discord.Message, hikari.messages.Message]
+            The message being propagated
+        data : CorePayload
+            The return value from the main ``propagate()``
+
+        Returns
+        -------
+        Any
+            Defaults to ``None``
+        """
+        return None
 
     async def propagate(self, message, data: Optional[CorePayload] = None) -> Any:
         """
@@ -0,0 +1,374 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import copy
+import datetime
+import logging
+from typing import AsyncIterable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+import attr
+
+from antispam import dataclasses, exceptions
+from antispam.abc import Cache
+from antispam.abc.cache import get_guild_metadata
+from antispam.enums import ResetType
+
+log = logging.getLogger(__name__)
+
+
+def _copy_member(member: dataclasses.Member) -> dataclasses.Member:
+    return attr.evolve(
+        member,
+        duplicate_channel_counter_dict=dict(member.duplicate_channel_counter_dict),
+        messages=[attr.evolve(message) for message in member.messages],
+        addons=copy.deepcopy(member.addons),
+    )
+
+
+def _merge_messages(
+    loaded_ids: FrozenSet[int],
+    changed: List[dataclasses.Message],
+    current: List[dataclasses.Message],
+) -> List[dataclasses.Message]:
+    """
+    Applies the messages removed from or added to ``changed``,
+    since it held ``loaded_ids``, to ``current``
+    """
+    changed_messages = {message.id: message for message in changed}
+    messages = []
+    for message in current:
+        if message.id in changed_messages:
+            messages.append(changed_messages.pop(message.id))
+        elif message.id not in loaded_ids:
+            # Added by something else
+            messages.append(message)
+
+    messages.extend(
+        message for message in changed_messages.values() if message.id not in loaded_ids
+    )
+    return messages
+
+
+def _merge_member(
+    loaded: dataclasses.Member,
+    changed: dataclasses.Member,
+    current: dataclasses.Member,
+) -> dataclasses.Member:
+    """
+    Applies what changed between ``loaded`` and ``changed``
+    to ``current``, keeping anything else which was written
+    to the wrapped cache in the meantime.
+    """
+    for field in attr.fields(dataclasses.Member):
+        if field.name in ("id", "guild_id", "messages", "addons"):
+            continue
+
+        value = getattr(changed, field.name)
+        if value != getattr(loaded, field.name):
+            setattr(current, field.name, value)
+
+    for key in loaded.addons.keys() | changed.addons.keys():
+        if key not in changed.addons:
+            current.addons.pop(key, None)
+        elif key not in loaded.addons or changed.addons[key] != loaded.addons[key]:
+            current.addons[key] = changed.addons[key]
+
+    current.messages = _merge_messages(
+        frozenset(message.id for message in loaded.messages),
+        changed.messages,
+        current.messages,
+    )
+    return current
+
+
+class BatchCache(Cache):
+    """
+    A write back cache wrapping another cache,
+    used by :py:meth:`antispam.AntiSpamHandler.propagate_many`
+
+    Each guild and member is only loaded from the wrapped cache
+    once, members only as they are needed, and changes are only
+    written back on :py:meth:`flush`.
+
+    Like the wrapped cache, what is returned is a copy and changes
+    only count once they are set again. So a batch sees exactly
+    what propagating each message on its own would have.
+    """
+
+    def __init__(self, handler, cache: Cache):
+        self.handler = handler
+        self.cache: Cache = cache
+
+        # Guilds without their members
+        self._guilds: Dict[int, dataclasses.Guild] = {}
+        # Guild id -> member id -> the member as last set
+        self._members: Dict[int, Dict[int, dataclasses.Member]] = {}
+        # (guild_id, member_id) -> the member as it was loaded
+        # from the wrapped cache, used to merge on flush
+        self._loaded: Dict[Tuple[int, int], dataclasses.Member] = {}
+        # Guilds which don't exist in the wrapped cache yet
+        self._new_guilds: Set[int] = set()
+        # Guilds with every member loaded, rather then just their metadata
+        self._complete_guilds: Set[int] = set()
+        # (guild_id, member_id)
+        self._touched_members: Set[Tuple[int, int]] = set()
+
+    def _load(self, member: dataclasses.Member) -> None:
+        self._members.setdefault(member.guild_id, {})[member.id] = member
+        self._loaded[(member.guild_id, member.id)] = _copy_member(member)
+
+    def _copy_guild(self, guild_id: int, *, with_members: bool) -> dataclasses.Guild:
+        guild = self._guilds[guild_id]
+        members = {}
+        if with_members:
+            members = {
+                member.id: _copy_member(member)
+                for member in self._members.get(guild_id, {}).values()
+            }
+
+        return attr.evolve(
+            guild,
+            members=members,
+            messages=list(guild.messages),
+            addons=copy.deepcopy(guild.addons),
+        )
+
+    async def _get_member(self, member_id: int, guild_id: int) -> dataclasses.Member:
+        """Returns the stored member itself, rather then a copy"""
+        try:
+            return self._members[guild_id][member_id]
+        except KeyError:
+            pass
+
+        await self.get_guild_metadata(guild_id)
+        if guild_id in self._complete_guilds:
+            raise exceptions.MemberNotFound
+
+        member = await self.cache.get_member(member_id, guild_id)
+        self._load(member)
+        return member
+
+    async def initialize(self, *args, **kwargs) -> None:
+        return await self.cache.initialize(*args, **kwargs)
+
+    async def get_guild(self, guild_id: int) -> dataclasses.Guild:
+        if guild_id not in self._complete_guilds:
+            guild = await self.cache.get_guild(guild_id)
+            members = self._members.get(guild_id, {})
+            for member in guild.members.values():
+                # Keep any members already loaded, as they may have changed
+                if member.id not in members:
+                    self._load(member)
+
+            guild.members = {}
+            self._guilds.setdefault(guild_id, guild)
+            self._complete_guilds.add(guild_id)
+
+        return self._copy_guild(guild_id, with_members=True)
+
+    async def get_guild_metadata(self, guild_id: int) -> dataclasses.Guild:
+        if guild_id not in self._guilds:
+            # Members are loaded as they are needed
+            guild = await get_guild_metadata(self.cache, guild_id)
+            guild.members = {}
+            self._guilds[guild_id] = guild
+
+        return self._copy_guild(guild_id, with_members=False)
+
+    async def set_guild(self, guild: dataclasses.Guild) -> None:
+        if guild.id not in self._guilds:
+            self._new_guilds.add(guild.id)
+            self._complete_guilds.add(guild.id)
+
+        self._guilds[guild.id] = attr.evolve(guild, members={})
+        for member in guild.members.values():
+            await self.set_member(member)
+
+    async def delete_guild(self, guild_id: int) -> None:
+        self._guilds.pop(guild_id, None)
+        self._members.pop(guild_id, None)
+        self._new_guilds.discard(guild_id)
+        self._complete_guilds.discard(guild_id)
+        self._loaded = {
+            key: member for key, member in self._loaded.items() if key[0] != guild_id
+        }
+        self._touched_members = {
+            key for key in self._touched_members if key[0] != guild_id
+        }
+        await self.cache.delete_guild(guild_id)
+
+    async def get_member(self, member_id: int, guild_id: int) -> dataclasses.Member:
+        member = _copy_member(await self._get_member(member_id, guild_id))
+        # So set_member only removes messages the caller removed
+        member._persisted_state = frozenset(message.id for message in member.messages)
+        return member
+
+    async def set_member(self, member: dataclasses.Member) -> None:
+        try:
+            await self.get_guild_metadata(member.guild_id)
+        except exceptions.GuildNotFound:
+            await self.set_guild(
+                dataclasses.Guild(id=member.guild_id, options=self.handler.options)
+            )
+
+        members = self._members.setdefault(member.guild_id, {})
+        stored = members.get(member.id)
+        loaded_ids = getattr(member, "_persisted_state", None)
+        members[member.id] = member = _copy_member(member)
+        if stored is not None and isinstance(loaded_ids, frozenset):
+            # Like the wrapped cache, keep messages added since it was fetched
+            member.messages = _merge_messages(
+                loaded_ids, member.messages, stored.messages
+            )
+
+        self._touched_members.add((member.guild_id, member.id))
+
+    async def delete_member(self, member_id: int, guild_id: int) -> None:
+        self._members.get(guild_id, {}).pop(member_id, None)
+        self._loaded.pop((guild_id, member_id), None)
+        self._touched_members.discard((guild_id, member_id))
+        await self.cache.delete_member(member_id, guild_id)
+
+    async def add_message(self, message: dataclasses.Message) -> None:
+        try:
+            member = await self._get_member(message.author_id, message.guild_id)
+        except (exceptions.GuildNotFound, exceptions.MemberNotFound):
+            await self.set_member(
+                dataclasses.Member(id=message.author_id, guild_id=message.guild_id)
+            )
+            member = self._members[message.guild_id][message.author_id]
+
+        options = self._guilds[message.guild_id].options
+        member.expire_messages(
+            message.creation_time
+            - datetime.timedelta(milliseconds=options.message_interval)
+        )
+        member.messages.append(attr.evolve(message))
+        self._touched_members.add((message.guild_id, message.author_id))
+
+    async def reset_member_count(
+        self, member_id: int, guild_id: int, reset_type: ResetType
+    ) -> None:
+        try:
+            member = await self._get_member(member_id, guild_id)
+        except (exceptions.MemberNotFound, exceptions.GuildNotFound):
+            return
+
+        if reset_type == ResetType.KICK_COUNTER:
+            member.kick_count = 0
+        else:
+            member.warn_count = 0
+
+        self._touched_members.add((guild_id, member_id))
+
+    async def get_all_guilds(self) -> AsyncIterable[dataclasses.Guild]:  # noqa
+        await self.flush()
+        async for guild in self.cache.get_all_guilds():
+            yield guild
+
+    async def get_all_members(
+        self, guild_id: int
+    ) -> AsyncIterable[dataclasses.Member]:  # noqa
+        await self.flush()
+        async for member in self.cache.get_all_members(guild_id):
+            yield member
+
+    async def drop(self) -> None:
+        self._guilds = {}
+        self._members = {}
+        self._loaded = {}
+        self._new_guilds = set()
+        self._complete_guilds = set()
+        self._touched_members = set()
+        await self.cache.drop()
+
+    async def flush(self) -> None:
+        """
+        Writes every change made since the last flush to the wrapped cache.
+
+        Changes are merged into what the wrapped cache currently
+        holds, so anything written to it directly in the meantime,
+        such as by plugins, is kept.
+
+        Caches with ``supports_member_batches``, such as
+        :py:class:`antispam.caches.RedisCache`, read and write every
+        touched member in one round trip each. Otherwise the
+        members are flushed concurrently.
+        """
+        log.debug(
+            "Flushing %s new guilds and %s members",
+            len(self._new_guilds),
+            len(self._touched_members),
+        )
+        await asyncio.gather(
+            *(self._flush_guild(guild_id) for guild_id in self._new_guilds)
+        )
+
+        keys = list(self._touched_members)
+        if getattr(self.cache, "supports_member_batches", False):
+            current = await self.cache.get_members(
+                (member_id, guild_id) for guild_id, member_id in keys
+            )
+            await self.cache.set_members(
+                self._merge_flushed(key, member) for key, member in zip(keys, current)
+            )
+        else:
+            await asyncio.gather(*(self._flush_member(key) for key in keys))
+
+        for guild_id, member_id in keys:
+            self._loaded[(guild_id, member_id)] = _copy_member(
+                self._members[guild_id][member_id]
+            )
+
+        self._new_guilds = set()
+        self._touched_members = set()
+
+    async def _flush_guild(self, guild_id: int) -> None:
+        try:
+            await get_guild_metadata(self.cache, guild_id)
+        except exceptions.GuildNotFound:
+            # Its members are merged in when they are flushed
+            await self.cache.set_guild(self._copy_guild(guild_id, with_members=False))
+
+    async def _flush_member(self, key: Tuple[int, int]) -> None:
+        guild_id, member_id = key
+        try:
+            current = await self.cache.get_member(member_id, guild_id)
+        except (exceptions.MemberNotFound, exceptions.GuildNotFound):
+            current = None
+
+        await self.cache.set_member(self._merge_flushed(key, current))
+
+    def _merge_flushed(
+        self, key: Tuple[int, int], current: Optional[dataclasses.Member]
+    ) -> dataclasses.Member:
+        """The member to write back, given what the wrapped cache currently holds"""
+        guild_id, member_id = key
+        member = self._members[guild_id][member_id]
+        if current is None:
+            return member
+
+        loaded = self._loaded.get(
+            key, dataclasses.Member(id=member_id, guild_id=guild_id)
+        )
+        return _merge_member(loaded, member, current)
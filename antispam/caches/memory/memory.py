@@ -31,9 +31,21 @@ log = logging.getLogger(__name__)
 
 
 class MemoryCache(Cache):
-    def __init__(self, handler):
+    def __init__(self, handler, *, compact_messages: bool = False):
+        """
+        Parameters
+        ----------
+        handler : AntiSpamHandler
+            The AntiSpamHandler instance
+        compact_messages : bool
+            Store each members messages as
+            :py:class:`antispam.dataclasses.CompactMessages`
+            which uses far less memory, at the cost of
+            not keeping the original message content.
+        """
         self.handler = handler
         self.cache = {}
+        self.compact_messages: bool = compact_messages
         log.info("Cache instance ready to roll.")
 
     async def initialize(self, *args, **kwargs) -> None:
@@ -46,6 +58,10 @@ class MemoryCache(Cache):
         except KeyError:
             raise exceptions.GuildNotFound from None
 
+    async def get_guild_metadata(self, guild_id: int) -> dataclasses.Guild:
+        # Members are already in memory, so there is nothing to save
+        return await self.get_guild(guild_id)
+
     async def set_guild(self, guild: dataclasses.Guild) -> None:
         log.debug("Attempting to set Guild(id=%s)", guild.id)
         self.cache[guild.id] = guild
@@ -123,6 +139,13 @@ class MemoryCache(Cache):
 
             await self.set_guild(guild)
 
+        if self.compact_messages and not isinstance(
+            member.messages, dataclasses.CompactMessages
+        ):
+            member.messages = dataclasses.CompactMessages(
+                member.messages, engine=self.handler.similarity_engine
+            )
+
         member.messages.append(message)
         await self.set_member(member)
 
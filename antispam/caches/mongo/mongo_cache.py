@@ -72,13 +72,7 @@ class MongoCache(Cache):
 
     async def get_guild(self, guild_id: int) -> Guild:
         log.debug("Attempting to return cached Guild(id=%s)", guild_id)
-        guild: Guild = await self.guilds.find({"id": guild_id})
-
-        # This is a dict here actually
-        if not guild:
-            raise GuildNotFound
-
-        guild.options = Options(**guild.options)  # type: ignore
+        guild: Guild = await self.get_guild_metadata(guild_id)
         members: List[Member] = await self.members.find_many_by_custom(
             {"guild_id": guild_id}
         )
@@ -94,6 +88,17 @@ class MongoCache(Cache):
 
         return guild
 
+    async def get_guild_metadata(self, guild_id: int) -> Guild:
+        log.debug("Attempting to return cached metadata for Guild(id=%s)", guild_id)
+        guild: Guild = await self.guilds.find({"id": guild_id})
+
+        # This is a dict here actually
+        if not guild:
+            raise GuildNotFound
+
+        guild.options = Options(**guild.options)  # type: ignore
+        return guild
+
     async def set_guild(self, guild: Guild) -> None:
         log.debug("Attempting to set Guild(id=%s)", guild.id)
         guild = deepcopy(guild)
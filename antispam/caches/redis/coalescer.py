@@ -0,0 +1,175 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple, Union
+
+from redis.commands.core import AsyncCoreCommands
+
+if TYPE_CHECKING:
+    from redis import asyncio as aioredis
+    from redis.asyncio.client import Pipeline
+
+log = logging.getLogger(__name__)
+
+#: The arguments and options of a command, as queued by a Pipeline
+Command = Tuple[Tuple[Any, ...], Dict[str, Any]]
+
+
+class CommandCoalescer(AsyncCoreCommands):
+    """
+    Sends commands issued around the same time
+    to Redis together in a single pipeline.
+
+    Commands, and whole pipelines given to :py:meth:`execute`, are
+    held until the next iteration of the event loop, or until
+    ``window`` microseconds have passed, and then sent at once.
+    Each caller still gets back only the results of its own commands.
+
+    This can be used in place of a Redis connection
+    for anything other then pipelines and scanning.
+
+    Parameters
+    ----------
+    redis: redis.asyncio.Redis
+        The connection to send commands with
+    window: int
+        How many microseconds to wait for more commands
+        before sending them. ``0`` only waits for the
+        commands issued in the same event loop iteration.
+
+        Defaults to ``0``
+
+    Notes
+    -----
+    If any of the pipelines being sent together is a transaction,
+    everything sent with it is run inside the same ``MULTI``.
+    """
+
+    def __init__(self, redis: aioredis.Redis, *, window: int = 0):
+        if window < 0:
+            raise ValueError("Expected `window` to be at least 0")
+
+        self.redis: aioredis.Redis = redis
+        self.window: int = window
+        self._pending: List[Tuple[List[Command], bool, asyncio.Future]] = []
+        self._flush_handle: Optional[Union[asyncio.Handle, asyncio.TimerHandle]] = None
+        # Held so in flight sends aren't garbage collected
+        self._sending: Set[asyncio.Task] = set()
+
+    async def execute_command(self, *args, **options) -> Any:
+        """Sends a single command, as used by every Redis command method."""
+        (result,) = await self.execute([(args, options)])
+        return result
+
+    async def execute_pipeline(self, pipe: Pipeline) -> List[Any]:
+        """
+        Sends the commands queued on ``pipe`` rather then executing it,
+        running them in a transaction if ``pipe`` is one.
+        """
+        return await self.execute(
+            list(pipe.command_stack), transaction=pipe.is_transaction
+        )
+
+    async def execute(
+        self, commands: List[Command], *, transaction: bool = False
+    ) -> List[Any]:
+        """
+        Sends ``commands`` with any others issued
+        around the same time, and returns their results.
+
+        Parameters
+        ----------
+        commands: List[Tuple[tuple, dict]]
+            The arguments and options of each command
+        transaction: bool
+            Whether ``commands`` need to run in a transaction
+
+        Returns
+        -------
+        List[Any]
+            The result of each command, in order
+
+        Raises
+        ------
+        redis.RedisError
+            The first error any of ``commands`` raised,
+            or sending them to Redis failed
+        """
+        if not commands:
+            return []
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._pending.append((commands, transaction, future))
+        if self._flush_handle is None:
+            if self.window:
+                self._flush_handle = loop.call_later(
+                    self.window / 1_000_000, self._flush
+                )
+            else:
+                self._flush_handle = loop.call_soon(self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        pending, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._send(pending))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, pending: List[Tuple[List[Command], bool, asyncio.Future]]):
+        log.debug("Sending %s coalesced command groups", len(pending))
+        transaction = any(is_transaction for _, is_transaction, _ in pending)
+        try:
+            async with self.redis.pipeline(transaction=transaction) as pipe:
+                for commands, _, _ in pending:
+                    for args, options in commands:
+                        pipe.pipeline_execute_command(*args, **options)
+
+                results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+
+            return
+
+        offset = 0
+        for commands, _, future in pending:
+            own = results[offset : offset + len(commands)]
+            offset += len(commands)
+            if future.done():
+                # The caller was cancelled
+                continue
+
+            error = next(
+                (result for result in own if isinstance(result, Exception)), None
+            )
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(own)
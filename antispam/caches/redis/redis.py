@@ -22,11 +22,21 @@ DEALINGS IN THE SOFTWARE.
 """
 from __future__ import annotations
 
-import asyncio
 import datetime
 import logging
-from copy import deepcopy
-from typing import TYPE_CHECKING, List, AsyncIterable, Dict, cast
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
 
 from attr import asdict
 
@@ -34,36 +44,286 @@ import orjson as json
 
 from antispam.abc import Cache
 from antispam.enums import ResetType
-from antispam.exceptions import GuildNotFound, MemberNotFound
+from antispam.caches.redis.coalescer import CommandCoalescer
+from antispam.exceptions import (
+    DuplicateObject,
+    GuildNotFound,
+    MemberNotFound,
+    UnsupportedAction,
+)
 from antispam.dataclasses import Message, Member, Guild, Options
 
 if TYPE_CHECKING:
     from redis import asyncio as aioredis
+    from redis.asyncio.client import Pipeline
+    from redis.commands.core import AsyncScript
 
     from antispam import AntiSpamHandler
 
 log = logging.getLogger(__name__)
 
+#: Member fields stored in ``MEMBER_COUNTERS:{guild_id}:{member_id}``
+COUNTERS = ("warn_count", "kick_count", "times_timed_out", "duplicate_counter")
+
+#: How a member was last stored: the ``MEMBER`` key, the counters
+#: and the id and stored JSON of each message in its message list
+MemberState = Tuple[bytes, Dict[str, int], Tuple[Tuple[int, bytes], ...]]
+
+#: Adds a message to a member and counts its exact duplicates, see
+#: :py:meth:`RedisCache.add_message_and_count_duplicates` and
+#: :py:meth:`RedisCache.add_message_and_get_window`
+#:
+#: KEYS: GUILD, GUILDS, MEMBER, MEMBERS, MEMBER_MESSAGES, MEMBER_COUNTERS
+#:
+#: ARGV: guild json (empty if it is known to exist), guild id, member
+#: json, member id, message json, cutoff in ms, max messages, ttl in ms,
+#: message_duplicate_count (empty to only count duplicates), then the
+#: name and default value of each counter
+ADD_MESSAGE_SCRIPT = """
+local function window(message)
+    local created, digest = string.match(message, '"window":"(%d+):(%x+)"}$')
+    return tonumber(created), digest
+end
+
+local function message_id(message)
+    return string.match(message, '^{"id":(%d+),')
+end
+
+local function is_duplicate(message)
+    return string.find(message, '"is_duplicate":true', 1, true) ~= nil
+end
+
+local function mark_duplicate(message)
+    return (string.gsub(message, '"is_duplicate":false', '"is_duplicate":true', 1))
+end
+
+local counting = ARGV[9] ~= ""
+
+if ARGV[1] ~= "" then
+    redis.call("SET", KEYS[1], ARGV[1], "NX")
+    redis.call("SADD", KEYS[2], ARGV[2])
+elseif redis.call("EXISTS", KEYS[1]) == 0 then
+    -- Deleted since the caller last saw it, so it retries sending the guild
+    return {-3}
+end
+if redis.call("SET", KEYS[3], ARGV[3], "NX") and counting then
+    local defaults = {}
+    for i = 10, #ARGV do
+        table.insert(defaults, ARGV[i])
+    end
+    redis.call("HSET", KEYS[6], unpack(defaults))
+end
+redis.call("SADD", KEYS[4], ARGV[4])
+
+if counting then
+    local member = redis.call("GET", KEYS[3])
+    if string.find(member, '"internal_is_in_guild":false', 1, true) then
+        return {-1, member, redis.call("HGETALL", KEYS[6]), {}}
+    end
+end
+
+-- The oldest messages are dropped when they have expired,
+-- or when there wouldn't be space for this one otherwise
+local messages = redis.call("LRANGE", KEYS[5], 0, -1)
+local cutoff = tonumber(ARGV[6])
+local drop = math.max(#messages + 1 - tonumber(ARGV[7]), 0)
+local expired = 0
+for i, message in ipairs(messages) do
+    local created = window(message)
+    -- Messages stored without a window are treated as expired
+    if i > drop and created ~= nil and created > cutoff then
+        break
+    end
+    expired = i
+end
+
+local new_id = message_id(ARGV[5])
+local _, digest = window(ARGV[5])
+local matches = {}
+for i = expired + 1, #messages do
+    if counting and message_id(messages[i]) == new_id then
+        return {-2}
+    end
+    local _, other = window(messages[i])
+    if other == digest then
+        table.insert(matches, i)
+    end
+end
+
+if expired > 0 then
+    redis.call("LTRIM", KEYS[5], expired, -1)
+end
+
+local message = ARGV[5]
+local amount = 0
+if counting then
+    local unmarked = 0
+    for i = 1, expired do
+        if is_duplicate(messages[i]) then
+            unmarked = unmarked + 1
+        end
+    end
+    if unmarked > 0 then
+        redis.call("HINCRBY", KEYS[6], "duplicate_counter", -unmarked)
+    end
+
+    if #matches > 0 then
+        local counter = tonumber(redis.call("HGET", KEYS[6], "duplicate_counter")) or 1
+        amount = math.min(#matches, math.max(tonumber(ARGV[9]) - counter, 1))
+        redis.call("HINCRBY", KEYS[6], "duplicate_counter", amount)
+        for j = 1, amount do
+            local stored = messages[matches[j]]
+            if not is_duplicate(stored) then
+                redis.call("LSET", KEYS[5], matches[j] - expired - 1, mark_duplicate(stored))
+            end
+        end
+        message = mark_duplicate(message)
+    end
+end
+
+redis.call("RPUSH", KEYS[5], message)
+redis.call("PEXPIRE", KEYS[5], ARGV[8])
+
+if counting then
+    return {
+        amount,
+        redis.call("GET", KEYS[3]),
+        redis.call("HGETALL", KEYS[6]),
+        redis.call("LRANGE", KEYS[5], 0, -1),
+    }
+end
+return #matches + 1
+"""
+
 
 class RedisCache(Cache):
     """
     A cache backend built to use Redis.
 
+    Guilds are stored under ``GUILD:{guild_id}``. Each member is stored as
+
+    - ``MEMBER:{guild_id}:{member_id}``: Everything other then their
+      counters and messages
+    - ``MEMBER_COUNTERS:{guild_id}:{member_id}``: A hash of their warn,
+      kick, timeout and duplicate counts
+    - ``MEMBER_MESSAGES:{guild_id}:{member_id}``: A list of their messages,
+      oldest first, which expires ``message_interval`` after the last
+      message was added. Each message also has a ``window`` of
+      ``{timestamp_ms}:{digest}``, used by the Lua script
+
+    The ids of every guild are kept in the ``GUILDS`` set, and the ids
+    of a guilds members are kept in the ``MEMBERS:{guild_id}`` set, so
+    they can be found without scanning the whole keyspace.
+
     Parameters
     ----------
     handler: AntiSpamHandler
         The AntiSpamHandler instance
     redis: redis.asyncio.Redis
         Your redis connection instance.
+    batch_size: int
+        How many members are fetched per round trip
+        when getting all of a guilds members.
+
+        Defaults to ``1000``
+    max_messages: int
+        The most messages kept for a member, older
+        messages are dropped once there are more.
+
+        Defaults to ``100``
+    use_scripts: bool
+        If ``True``, messages are added by a Lua script which
+        also expires old messages and counts exact duplicates in
+        the same round trip. Core then uses
+        :py:meth:`add_message_and_get_window` in place of fetching
+        the member, unless ``per_channel_spam`` is enabled.
+
+        Defaults to ``False``
+    coalesce_window: Optional[int]
+        If set, commands issued within this many microseconds
+        of each other are sent to Redis in one pipeline by a
+        :py:class:`CommandCoalescer`. ``0`` sends together the
+        commands issued in the same event loop iteration.
+
+        Defaults to ``None``, which sends commands straight away
+
+    Notes
+    -----
+    Caches created before the id sets existed need
+    :py:meth:`migrate` to be awaited once after upgrading.
+    Members stored with their counters and messages in
+    ``MEMBER:{guild_id}:{member_id}`` are still read, and
+    are moved out of it the next time they are set.
+
+    Up to :py:attr:`max_known_guilds` guilds this cache has read,
+    written or created are remembered, so they aren't sent again
+    when members are set. Whether they still exist is checked in
+    the same round trip, so a guild deleted by another process is
+    recreated at the cost of one more round trip.
     """
 
-    def __init__(self, handler: AntiSpamHandler, redis: aioredis.Redis):
+    def __init__(
+        self,
+        handler: AntiSpamHandler,
+        redis: aioredis.Redis,
+        *,
+        batch_size: int = 1000,
+        max_messages: int = 100,
+        use_scripts: bool = False,
+        coalesce_window: Optional[int] = None,
+    ):
+        if batch_size < 1:
+            raise ValueError("Expected `batch_size` to be at least 1")
+
+        if max_messages < 1:
+            raise ValueError("Expected `max_messages` to be at least 1")
+
         self.redis: aioredis.Redis = redis
         self.handler: AntiSpamHandler = handler
+        self.batch_size: int = batch_size
+        self.max_messages: int = max_messages
+        # Guild id -> Options.message_interval, for guilds seen by
+        # this cache, so adding a message doesn't need to fetch it
+        self._message_intervals: Dict[int, int] = {}
+        # Guilds known to exist, so they don't need creating,
+        # least recently used first. The values are unused
+        self._known_guilds: Dict[int, None] = {}
+        self._coalescer: Optional[CommandCoalescer] = (
+            None
+            if coalesce_window is None
+            else CommandCoalescer(redis, window=coalesce_window)
+        )
+        # What single commands are sent with
+        self._client: Union[aioredis.Redis, CommandCoalescer] = self._coalescer or redis
+        self._add_message_script: Optional[AsyncScript] = (
+            redis.register_script(ADD_MESSAGE_SCRIPT) if use_scripts else None
+        )
+
+    #: Whether :py:meth:`get_members` and :py:meth:`set_members` can be used
+    supports_member_batches: bool = True
+    #: How many guilds are remembered as existing
+    max_known_guilds: int = 10_000
+
+    @property
+    def supports_message_window(self) -> bool:
+        """Whether :py:meth:`add_message_and_get_window` can be used"""
+        return self._add_message_script is not None
 
     async def get_guild(self, guild_id: int) -> Guild:
         log.debug("Attempting to return cached Guild(id=%s)", guild_id)
-        resp = await self.redis.get(f"GUILD:{guild_id}")
+        guild: Guild = await self.get_guild_metadata(guild_id)
+
+        guild_members: Dict[int, Member] = {}
+        async for member in self.get_all_members(guild_id):
+            guild_members[member.id] = member
+
+        guild.members = guild_members
+        guild._persisted_member_ids = set(guild_members)
+        return guild
+
+    async def get_guild_metadata(self, guild_id: int) -> Guild:
+        log.debug("Attempting to return cached metadata for Guild(id=%s)", guild_id)
+        resp = await self._client.get(f"GUILD:{guild_id}")
         if not resp:
             raise GuildNotFound
 
@@ -72,33 +332,63 @@ class RedisCache(Cache):
         # This is actually a dict here
         guild.options = cast(dict, guild.options)
         guild.options = Options(**guild.options)
-
-        guild_members: Dict[int, Member] = {}
-        async for member in self.get_all_members(guild_id):
-            guild_members[member.id] = member
-
-        guild.members = guild_members
+        self._message_intervals[guild.id] = guild.options.message_interval
+        self._remember_guilds([guild.id])
         return guild
 
     async def set_guild(self, guild: Guild) -> None:
         log.debug("Attempting to set Guild(id=%s)", guild.id)
-        guild = deepcopy(guild)  # Ensure idempotent
-
-        # We do this to clear the 'old' guilds members
-        await self._delete_members_for_guild(guild.id)
-
-        members: List[Member] = list(guild.members.values())
-        guild.members = {}
-        iters = [self.set_member(m) for m in members]
-        await asyncio.gather(*iters)
-
-        as_json = json.dumps(asdict(guild, recurse=True))
-        await self.redis.set(f"GUILD:{guild.id}", as_json)
+        as_dict = asdict(
+            guild,
+            recurse=True,
+            filter=lambda attribute, _: attribute.name != "members",
+        )
+        as_dict["members"] = {}
+
+        stored_ids: Optional[Set[int]] = getattr(guild, "_persisted_member_ids", None)
+        if stored_ids is None:
+            # Not loaded by get_guild, so check what's actually stored
+            stored_ids = {
+                int(member_id)
+                for member_id in await self._client.smembers(f"MEMBERS:{guild.id}")
+            }
+
+        removed = stored_ids - guild.members.keys()
+
+        written: List[Tuple[Member, MemberState]] = []
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(f"GUILD:{guild.id}", json.dumps(as_dict))
+            pipe.sadd("GUILDS", guild.id)
+            for member in guild.members.values():
+                # Only members which changed since they
+                # were last read or written are written
+                state = self._queue_member(pipe, member)
+                if state is not None:
+                    written.append((member, state))
+
+            if removed:
+                for member_id in removed:
+                    self._queue_member_delete(pipe, member_id, guild.id)
+
+            await self._execute(pipe)
+
+        for member, state in written:
+            member._persisted_state = state
+
+        self._message_intervals[guild.id] = guild.options.message_interval
+        self._remember_guilds([guild.id])
+        guild._persisted_member_ids = set(guild.members)
 
     async def delete_guild(self, guild_id: int) -> None:
         log.debug("Attempting to delete Guild(id=%s)", guild_id)
         await self._delete_members_for_guild(guild_id)
-        await self.redis.delete(f"GUILD:{guild_id}")
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(f"GUILD:{guild_id}")
+            pipe.srem("GUILDS", guild_id)
+            await self._execute(pipe)
+
+        self._message_intervals.pop(guild_id, None)
+        self._known_guilds.pop(guild_id, None)
 
     async def get_member(self, member_id: int, guild_id: int) -> Member:
         log.debug(
@@ -106,45 +396,319 @@ class RedisCache(Cache):
             member_id,
             guild_id,
         )
-        resp = await self.redis.get(f"MEMBER:{guild_id}:{member_id}")
+        async with self.redis.pipeline(transaction=False) as pipe:
+            self._queue_member_read(pipe, member_id, guild_id)
+            resp, counters, messages = await self._execute(pipe)
+
         if not resp:
             raise MemberNotFound
 
+        return self._load_member(resp, counters, messages)
+
+    async def get_members(
+        self, members: Iterable[Tuple[int, int]]
+    ) -> List[Optional[Member]]:
+        """
+        Returns several members in a single round trip.
+
+        Parameters
+        ----------
+        members: Iterable[Tuple[int, int]]
+            The ``(member_id, guild_id)`` of each member to return
+
+        Returns
+        -------
+        List[Optional[Member]]
+            Each member in the order given,
+            or ``None`` where it isn't stored
+        """
+        members = list(members)
+        if not members:
+            return []
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for member_id, guild_id in members:
+                self._queue_member_read(pipe, member_id, guild_id)
+
+            resp = await self._execute(pipe)
+
+        return [
+            self._load_member(*resp[i : i + 3]) if resp[i] else None
+            for i in range(0, len(resp), 3)
+        ]
+
+    @staticmethod
+    def _queue_member_read(pipe: Pipeline, member_id: int, guild_id: int) -> None:
+        pipe.get(f"MEMBER:{guild_id}:{member_id}")
+        pipe.hgetall(f"MEMBER_COUNTERS:{guild_id}:{member_id}")
+        pipe.lrange(f"MEMBER_MESSAGES:{guild_id}:{member_id}", 0, -1)
+
+    @staticmethod
+    def _load_member(
+        resp: bytes, counters: Dict[bytes, bytes], messages: List[bytes]
+    ) -> Member:
         as_json = json.loads(resp.decode("utf-8"))
+        # Members stored before messages had their own
+        # list kept them here, they are moved when next set
+        stored_messages: List[Dict[str, Any]] = as_json.pop("messages", [])
         member: Member = Member(**as_json)
-
-        messages: List[Message] = []
-        member.messages = cast(list, member.messages)
-        for message in member.messages:
-            message = Message(**message)
-            message.creation_time = datetime.datetime.fromisoformat(
-                message.creation_time  # type: ignore
-            )
-            messages.append(message)
-
-        member.messages = messages
+        for name, value in counters.items():
+            setattr(member, name.decode("utf-8"), int(value))
+
+        listed: List[Dict[str, Any]] = [json.loads(message) for message in messages]
+        for message in stored_messages + listed:
+            member.messages.append(RedisCache._load_message(message))
+
+        member._persisted_state = (
+            resp,
+            # Empty when the counters aren't stored yet
+            {name: getattr(member, name) for name in COUNTERS} if counters else {},
+            tuple((message["id"], raw) for message, raw in zip(listed, messages)),
+        )
         return member
 
+    @staticmethod
+    def _load_message(as_json: Dict[str, Any]) -> Message:
+        as_json.pop("window", None)
+        message = Message(**as_json)
+        message.creation_time = datetime.datetime.fromisoformat(
+            message.creation_time  # type: ignore
+        )
+        return message
+
     async def set_member(self, member: Member) -> None:
         log.debug(
             "Attempting to cache Member(id=%s) for Guild(id=%s)",
             member.id,
             member.guild_id,
         )
-        if not await self._does_guild_exist(member.guild_id):
-            guild = Guild(id=member.guild_id, options=self.handler.options)
-            guild.members = {}
-            guild_as_json = json.dumps(asdict(guild, recurse=True))
-            await self.redis.set(f"GUILD:{guild.id}", guild_as_json)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            checked = self._queue_guilds(pipe, [member.guild_id])
+            state = self._queue_member(pipe, member)
+            results = await self._execute(pipe)
+
+        await self._ensure_guilds([member.guild_id], checked, results)
+        if state is not None:
+            member._persisted_state = state
+
+    async def set_members(self, members: Iterable[Member]) -> None:
+        """
+        Sets several members in a single round trip,
+        the same as calling :py:meth:`set_member` for each.
+
+        Parameters
+        ----------
+        members: Iterable[Member]
+            The members to set
+        """
+        members = list(members)
+        if not members:
+            return
+
+        log.debug("Attempting to cache %s members", len(members))
+        guild_ids = list({member.guild_id: None for member in members})
+        async with self.redis.pipeline(transaction=True) as pipe:
+            checked = self._queue_guilds(pipe, guild_ids)
+            states = [self._queue_member(pipe, member) for member in members]
+            results = await self._execute(pipe)
+
+        await self._ensure_guilds(guild_ids, checked, results)
+        for member, state in zip(members, states):
+            if state is not None:
+                member._persisted_state = state
+
+    def _dump_default_guild(self, guild_id: int) -> bytes:
+        guild = Guild(id=guild_id, options=self.handler.options)
+        return json.dumps(asdict(guild, recurse=True))
+
+    def _queue_guild_create(self, pipe: Pipeline, guild_id: int) -> None:
+        """Queues creating a guild with the handlers options, if it doesn't exist"""
+        pipe.set(f"GUILD:{guild_id}", self._dump_default_guild(guild_id), nx=True)
+        pipe.sadd("GUILDS", guild_id)
+
+    def _queue_guilds(self, pipe: Pipeline, guild_ids: List[int]) -> List[int]:
+        """
+        Queues creating the guilds not known to exist, and checking the
+        known ones still do. Returns the known ones, whose checks are
+        the first results of ``pipe``.
+        """
+        checked = []
+        for guild_id in guild_ids:
+            if guild_id in self._known_guilds:
+                pipe.exists(f"GUILD:{guild_id}")
+                checked.append(guild_id)
+            else:
+                self._queue_guild_create(pipe, guild_id)
+
+        return checked
+
+    async def _ensure_guilds(
+        self, guild_ids: List[int], checked: List[int], results: List[Any]
+    ) -> None:
+        """Recreates the checked guilds another process deleted"""
+        missing = [guild_id for guild_id, exists in zip(checked, results) if not exists]
+        if missing:
+            log.debug("Recreating deleted Guild(s) %s", missing)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                for guild_id in missing:
+                    self._queue_guild_create(pipe, guild_id)
+
+                await self._execute(pipe)
+
+        self._remember_guilds(guild_ids)
+
+    def _remember_guilds(self, guild_ids: Iterable[int]) -> None:
+        """Marks guilds as known to exist, forgetting the least recently used"""
+        for guild_id in guild_ids:
+            self._known_guilds.pop(guild_id, None)
+            self._known_guilds[guild_id] = None
+
+        while len(self._known_guilds) > self.max_known_guilds:
+            del self._known_guilds[next(iter(self._known_guilds))]
+
+    async def _execute(self, pipe: Pipeline) -> List[Any]:
+        """Executes ``pipe``, coalesced with other commands if enabled"""
+        if self._coalescer is None:
+            return await pipe.execute()
+
+        return await self._coalescer.execute_pipeline(pipe)
+
+    @staticmethod
+    def _dump_member(member: Member) -> bytes:
+        """Everything but a members counters and messages, as stored in ``MEMBER``"""
+        as_dict = asdict(
+            member,
+            recurse=True,
+            filter=lambda attribute, _: attribute.name != "messages"
+            and attribute.name not in COUNTERS,
+        )
+        as_dict["messages"] = []
+        return json.dumps(as_dict)
+
+    def _queue_member(self, pipe: Pipeline, member: Member) -> Optional[MemberState]:
+        """
+        Queues writing whatever changed on a member since it
+        was last read or written, returning its new state.
+
+        Counters are changed with HINCRBY, and messages are removed
+        by value and pushed onto the end of the list, so concurrent
+        changes to the same member aren't overwritten.
+        """
+        old: Optional[MemberState] = getattr(member, "_persisted_state", None)
+        stored: Dict[int, bytes] = {} if old is None else dict(old[2])
+        state: MemberState = (
+            self._dump_member(member),
+            {name: getattr(member, name) for name in COUNTERS},
+            tuple(
+                (message.id, self._reuse_message(stored.get(message.id), message))
+                for message in member.messages
+            ),
+        )
+        if old == state:
+            return None
+
+        key = f"{member.guild_id}:{member.id}"
+        if old is None or old[0] != state[0]:
+            pipe.set(f"MEMBER:{key}", state[0])
+            pipe.sadd(f"MEMBERS:{member.guild_id}", member.id)
+
+        if old is None or not old[1]:
+            # Nothing to increment from
+            pipe.hset(f"MEMBER_COUNTERS:{key}", mapping=state[1])
+        else:
+            for name, value in state[1].items():
+                if value != old[1][name]:
+                    pipe.hincrby(f"MEMBER_COUNTERS:{key}", name, value - old[1][name])
+
+        old_messages = () if old is None else old[2]
+        if old_messages != state[2]:
+            new_messages = dict(state[2])
+            kept = [
+                message_id
+                for message_id, _ in old_messages
+                if message_id in new_messages
+            ]
+            if (
+                old is not None
+                and [message_id for message_id, _ in state[2][: len(kept)]] == kept
+            ):
+                # Messages are only removed and added to the end, so only
+                # send the difference. Removing by value rather then position
+                # means messages someone else already removed, I.e. expired
+                # by the Lua script or another copy of this member, don't
+                # remove a different message instead
+                for message_id, raw in old_messages:
+                    if message_id not in new_messages:
+                        pipe.lrem(f"MEMBER_MESSAGES:{key}", 1, raw)
+                    elif new_messages[message_id] != raw:
+                        # Marked as a duplicate since, replace it where it is
+                        pipe.linsert(
+                            f"MEMBER_MESSAGES:{key}",
+                            "BEFORE",
+                            raw,
+                            new_messages[message_id],
+                        )
+                        pipe.lrem(f"MEMBER_MESSAGES:{key}", 1, raw)
+
+                added = state[2][len(kept) :]
+            else:
+                pipe.delete(f"MEMBER_MESSAGES:{key}")
+                added = state[2]
+
+            if added:
+                self._queue_messages(
+                    pipe, key, member.guild_id, [raw for _, raw in added]
+                )
+
+        return state
+
+    def _reuse_message(self, raw: Optional[bytes], message: Message) -> bytes:
+        """``raw`` if it is still how ``message`` should be stored, otherwise dumps it"""
+        if raw is None or (b'"is_duplicate":true' in raw) != message.is_duplicate:
+            return self._dump_message(message)
+
+        return raw
+
+    def _queue_messages(
+        self, pipe: Pipeline, key: str, guild_id: int, messages: List[bytes]
+    ) -> None:
+        pipe.rpush(f"MEMBER_MESSAGES:{key}", *messages)
+        pipe.ltrim(f"MEMBER_MESSAGES:{key}", -self.max_messages, -1)
+        pipe.pexpire(
+            f"MEMBER_MESSAGES:{key}",
+            self._message_intervals.get(
+                guild_id, self.handler.options.message_interval
+            ),
+        )
 
-        as_json = json.dumps(asdict(member, recurse=True))
-        await self.redis.set(f"MEMBER:{member.guild_id}:{member.id}", as_json)
+    def _dump_message(self, message: Message) -> bytes:
+        """
+        A message as stored in ``MEMBER_MESSAGES``, with a ``window``
+        of ``{timestamp_ms}:{digest}`` for the Lua script to read.
+        """
+        as_dict = asdict(message, recurse=True)
+        digest = message.get_processed_content(self.handler.similarity_engine).digest
+        timestamp = int(message.creation_time.timestamp() * 1000)
+        # This must be last, the script matches it at the end
+        as_dict["window"] = f"{timestamp}:{digest.hex()}"
+        return json.dumps(as_dict)
 
     async def delete_member(self, member_id: int, guild_id: int) -> None:
         log.debug(
             "Attempting to delete Member(id=%s) in Guild(id=%s)", member_id, guild_id
         )
-        await self.redis.delete(f"MEMBER:{guild_id}:{member_id}")
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self._queue_member_delete(pipe, member_id, guild_id)
+            await self._execute(pipe)
+
+    @staticmethod
+    def _queue_member_delete(pipe: Pipeline, member_id: int, guild_id: int) -> None:
+        pipe.delete(
+            f"MEMBER:{guild_id}:{member_id}",
+            f"MEMBER_COUNTERS:{guild_id}:{member_id}",
+            f"MEMBER_MESSAGES:{guild_id}:{member_id}",
+        )
+        pipe.srem(f"MEMBERS:{guild_id}", member_id)
 
     async def add_message(self, message: Message) -> None:
         log.debug(
@@ -153,13 +717,174 @@ class RedisCache(Cache):
             message.author_id,
             message.guild_id,
         )
-        try:
-            member: Member = await self.get_member(message.author_id, message.guild_id)
-        except (MemberNotFound, GuildNotFound):
-            member: Member = Member(message.author_id, guild_id=message.guild_id)
+        if self._add_message_script is not None:
+            await self.add_message_and_count_duplicates(message)
+            return
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            checked = self._queue_guilds(pipe, [message.guild_id])
+            member = Member(message.author_id, guild_id=message.guild_id)
+            key = f"{message.guild_id}:{message.author_id}"
+            pipe.set(f"MEMBER:{key}", self._dump_member(member), nx=True)
+            pipe.sadd(f"MEMBERS:{message.guild_id}", message.author_id)
+            self._queue_messages(
+                pipe, key, message.guild_id, [self._dump_message(message)]
+            )
+            results = await self._execute(pipe)
+
+        await self._ensure_guilds([message.guild_id], checked, results)
+
+    async def add_message_and_count_duplicates(self, message: Message) -> int:
+        """
+        Adds a message to its member in a single round trip,
+        using the Lua script registered when ``use_scripts``
+        is ``True``.
+
+        Inside Redis the script drops the members messages older
+        then ``message_interval`` before this message, appends this
+        message and counts how many messages in what is left have
+        the same processed content. As this is all done atomically,
+        processes sharing the same Redis can't race each other.
+
+        Parameters
+        ----------
+        message: Message
+            The message to add
+
+        Returns
+        -------
+        int
+            How many of the members messages are exact
+            duplicates of this one, including itself.
+
+        Raises
+        ------
+        UnsupportedAction
+            This cache wasn't created with ``use_scripts=True``
+        """
+        interval = self._message_intervals.get(
+            message.guild_id, self.handler.options.message_interval
+        )
+        return await self._run_add_message_script(
+            message, int(message.creation_time.timestamp() * 1000) - interval
+        )
 
-        member.messages.append(message)
-        await self.set_member(member)
+    async def add_message_and_get_window(
+        self,
+        message: Message,
+        *,
+        cutoff: datetime.datetime,
+        duplicate_count: int,
+    ) -> Tuple[int, Member]:
+        """
+        Adds a message to its member and returns the member,
+        counting exact duplicates inside Redis, in a single round trip.
+
+        This is what :py:class:`antispam.core.Core` uses in place
+        of fetching the member when ``use_scripts`` is ``True``,
+        so only the fuzzy comparisons are left to Python.
+
+        Inside Redis the script drops the members messages created
+        at or before ``cutoff``, lowering their duplicate counter for
+        each dropped duplicate. It then raises the duplicate counter
+        for the exact duplicates of this message, the same way
+        :py:class:`antispam.core.Core` does, and appends the message.
+        As the counter is only changed inside Redis, processes sharing
+        the same Redis can't overwrite each others counts.
+
+        Parameters
+        ----------
+        message: Message
+            The message to add
+        cutoff: datetime.datetime
+            The newest creation time which counts as expired
+        duplicate_count: int
+            The guilds ``message_duplicate_count``
+
+        Returns
+        -------
+        Tuple[int, Member]
+            How much the duplicate counter was raised for exact
+            duplicates, and the member as it now is. The members
+            messages don't include ``message``, and if the member
+            isn't in the guild the message wasn't added.
+
+        Raises
+        ------
+        DuplicateObject
+            The member already has a message with this id
+        UnsupportedAction
+            This cache wasn't created with ``use_scripts=True``
+        """
+        result = await self._run_add_message_script(
+            message, int(cutoff.timestamp() * 1000), duplicate_count
+        )
+        if result[0] == -2:
+            raise DuplicateObject
+
+        amount, resp, counters, messages = result
+        member = self._load_member(
+            resp, dict(zip(counters[::2], counters[1::2])), messages
+        )
+        if amount >= 0:
+            # It's the last message, and the caller already has it
+            member.messages.pop()
+
+        return max(amount, 0), member
+
+    async def _run_add_message_script(
+        self,
+        message: Message,
+        cutoff: int,
+        duplicate_count: Optional[int] = None,
+    ) -> Any:
+        if self._add_message_script is None:
+            raise UnsupportedAction("This requires a RedisCache with use_scripts=True")
+
+        guild_json = b""
+        if message.guild_id not in self._known_guilds:
+            # Only create the guild if it doesn't exist
+            guild_json = self._dump_default_guild(message.guild_id)
+
+        member = Member(message.author_id, guild_id=message.guild_id)
+        counters: List[Any] = []
+        if duplicate_count is not None:
+            for name in COUNTERS:
+                counters.extend((name, getattr(member, name)))
+
+        key = f"{message.guild_id}:{message.author_id}"
+        result = await self._add_message_script(
+            keys=[
+                f"GUILD:{message.guild_id}",
+                "GUILDS",
+                f"MEMBER:{key}",
+                f"MEMBERS:{message.guild_id}",
+                f"MEMBER_MESSAGES:{key}",
+                f"MEMBER_COUNTERS:{key}",
+            ],
+            args=[
+                guild_json,
+                message.guild_id,
+                self._dump_member(member),
+                message.author_id,
+                self._dump_message(message),
+                cutoff,
+                self.max_messages,
+                self._message_intervals.get(
+                    message.guild_id, self.handler.options.message_interval
+                ),
+                "" if duplicate_count is None else duplicate_count,
+                *counters,
+            ],
+            client=self._client,
+        )
+        if result == [-3]:
+            # Another process deleted the guild
+            self._known_guilds.pop(message.guild_id, None)
+            return await self._run_add_message_script(message, cutoff, duplicate_count)
+
+        self._remember_guilds([message.guild_id])
+        return result
 
     async def reset_member_count(
         self, member_id: int, guild_id: int, reset_type: ResetType
@@ -170,17 +895,14 @@ class RedisCache(Cache):
             guild_id,
             reset_type.name,
         )
-        try:
-            member: Member = await self.get_member(member_id, guild_id)
-        except (MemberNotFound, GuildNotFound):
+        if not await self._client.exists(f"MEMBER:{guild_id}:{member_id}"):
             return
 
-        if reset_type == ResetType.KICK_COUNTER:
-            member.kick_count = 0
-        else:
-            member.warn_count = 0
-
-        await self.set_member(member)
+        await self._client.hset(
+            f"MEMBER_COUNTERS:{guild_id}:{member_id}",
+            "kick_count" if reset_type == ResetType.KICK_COUNTER else "warn_count",
+            0,
+        )
 
     async def drop(self) -> None:
         log.warning("Cache was just dropped")
@@ -189,10 +911,15 @@ class RedisCache(Cache):
 
     async def get_all_guilds(self) -> AsyncIterable[Guild]:
         log.debug("Yielding all cached guilds")
-        keys: List[bytes] = await self.redis.keys("GUILD:*")
-        for key in keys:
-            key = key.decode("utf-8").split(":")[1]
-            yield await self.get_guild(int(key))
+        guild_ids = sorted(
+            int(guild_id) for guild_id in await self._client.smembers("GUILDS")
+        )
+        for guild_id in guild_ids:
+            try:
+                yield await self.get_guild(guild_id)
+            except GuildNotFound:
+                # Deleted since we got the ids
+                continue
 
     async def get_all_members(self, guild_id: int) -> AsyncIterable[Member]:
         log.debug("Yielding all cached members for Guild(id=%s)", guild_id)
@@ -204,15 +931,82 @@ class RedisCache(Cache):
 
     async def _get_all_members(self, guild_id: int) -> AsyncIterable[Member]:
         """This exists so we don't need to raise GuildNotFound when used internally."""
-        keys: List[bytes] = await self.redis.keys(f"MEMBER:{guild_id}:*")
-        for key in keys:
-            key = key.decode("utf-8").split(":")[2]
-            yield await self.get_member(int(key), guild_id)
+        async for member_ids in self._scan_member_ids(guild_id):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for member_id in member_ids:
+                    self._queue_member_read(pipe, member_id, guild_id)
+
+                responses = await self._execute(pipe)
+
+            for i in range(0, len(responses), 3):
+                resp, counters, messages = responses[i : i + 3]
+                if resp:
+                    yield self._load_member(resp, counters, messages)
+
+    async def _scan_member_ids(self, guild_id: int) -> AsyncIterable[List[int]]:
+        """Yields batches of the ids in ``MEMBERS:{guild_id}``, without repeats."""
+        seen: Set[int] = set()
+        batch: List[int] = []
+        async for member_id in self.redis.sscan_iter(
+            f"MEMBERS:{guild_id}", count=self.batch_size
+        ):
+            member_id = int(member_id)
+            if member_id in seen:
+                # SSCAN can return an id more then once
+                continue
+
+            seen.add(member_id)
+            batch.append(member_id)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
 
     async def _does_guild_exist(self, guild_id: int) -> bool:
-        resp = await self.redis.get(f"GUILD:{guild_id}")
+        resp = await self._client.get(f"GUILD:{guild_id}")
         return bool(resp)
 
     async def _delete_members_for_guild(self, guild_id: int):
-        async for member in self._get_all_members(guild_id):
-            await self.delete_member(member.id, member.guild_id)
+        async for member_ids in self._scan_member_ids(guild_id):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for member_id in member_ids:
+                    self._queue_member_delete(pipe, member_id, guild_id)
+
+                await self._execute(pipe)
+
+        await self._client.delete(f"MEMBERS:{guild_id}")
+
+    async def migrate(self) -> int:
+        """
+        Adds guilds and members stored before the ``GUILDS``
+        and ``MEMBERS:{guild_id}`` sets existed to them.
+
+        This uses ``SCAN`` rather then ``KEYS``, so doesn't
+        block Redis, and is safe to run more then once.
+
+        Returns
+        -------
+        int
+            How many guilds and members were found
+        """
+        log.info("Adding existing guilds and members to the id sets")
+        found = 0
+        async with self.redis.pipeline(transaction=False) as pipe:
+            async for key in self.redis.scan_iter("*", count=self.batch_size):
+                key = key.decode("utf-8").split(":")
+                if key[0] == "GUILD" and len(key) == 2:
+                    pipe.sadd("GUILDS", int(key[1]))
+                elif key[0] == "MEMBER" and len(key) == 3:
+                    pipe.sadd(f"MEMBERS:{key[1]}", int(key[2]))
+                else:
+                    continue
+
+                found += 1
+                if len(pipe) >= self.batch_size:
+                    await pipe.execute()
+
+            await pipe.execute()
+
+        return found
@@ -20,11 +20,11 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
 FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
+import asyncio
 import datetime
 import logging
-from typing import TYPE_CHECKING
-
-from fuzzywuzzy import fuzz
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
 
 from antispam.abc import Cache
 from antispam.dataclasses import CorePayload, Guild, Member, Message
@@ -38,22 +38,32 @@ from antispam.util import get_aware_time
 
 if TYPE_CHECKING:  # pragma: no cover
     from antispam import AntiSpamHandler, Options
+    from antispam.abc import SimilarityEngine
 
 log = logging.getLogger(__name__)
 
 
+def _score_batch(
+    engine: "SimilarityEngine", content: str, contents: List[str], score_cutoff: float
+) -> List[float]:
+    """Scores content against each of contents, ran within an executor."""
+    return [engine.compare(content, other, score_cutoff) for other in contents]
+
+
 # noinspection PyProtectedMember
 class Core:
     """An abstract way to handle spam tracking on different levels"""
 
-    __slots__ = ("handler",)
+    __slots__ = ("handler", "_cache")
 
-    def __init__(self, handler):
+    def __init__(self, handler, cache: Optional[Cache] = None):
         self.handler: "AntiSpamHandler" = handler
+        # Used instead of the handlers cache when set
+        self._cache: Optional[Cache] = cache
 
     @property
     def cache(self) -> Cache:
-        return self.handler.cache
+        return self._cache or self.handler.cache
 
     @staticmethod
     def options(guild: Guild) -> "Options":
@@ -80,6 +90,16 @@ class Core:
 
         Please see and use :meth:`discord.ext.antispam.AntiSpamHandler.propagate`
         """
+        if (
+            getattr(self.cache, "supports_message_window", False)
+            and not self.options(guild).per_channel_spam
+        ):
+            return await self._propagate_user_scripted(original_message, guild)
+
+        timings = self.handler.stage_timings
+        if timings is not None:
+            start = time.perf_counter()
+
         try:
             if original_message.author.id in guild.members:
                 member = guild.members[original_message.author.id]
@@ -103,7 +123,10 @@ class Core:
                 guild_id=await self.handler.lib_handler.get_guild_id(original_message),
             )
             guild.members[member.id] = member
-            await self.cache.set_guild(guild=guild)
+            await self.cache.set_member(member)
+
+        if timings is not None:
+            start = timings.record("member_load", start)
 
         await self.clean_up(
             member=member,
@@ -111,19 +134,108 @@ class Core:
             channel_id=await self.handler.lib_handler.get_channel_id(original_message),
             guild=guild,
         )
+        if timings is not None:
+            start = timings.record("clean_up", start)
+
         message: Message = await self.handler.lib_handler.create_message(
             original_message
         )
-        self._calculate_ratios(message, member, guild)
+        if timings is not None:
+            start = timings.record("create_message", start)
+
+        comparisons = self._get_comparisons(message, member, guild)
+        scores = await self._score_in_executor(message, guild, comparisons)
+        self._calculate_ratios(
+            message, member, guild, scores=scores, comparisons=comparisons
+        )
+        if timings is not None:
+            start = timings.record("ratios", start)
 
         await self.cache.add_message(message)
+        if timings is not None:
+            timings.record("cache_write", start)
+
+        member.track_message(message, self.handler.similarity_engine)
+        log.info(
+            "Created Message(%s) on Member(id=%s) in Guild(id=%s)",
+            message.id,
+            member.id,
+            member.guild_id,
+        )
+        return await self._punish_if_required(original_message, member, message, guild)
+
+    async def _propagate_user_scripted(
+        self, original_message, guild: Guild
+    ) -> CorePayload:
+        """
+        :py:meth:`propagate_user` for caches which add the message and
+        count its exact duplicates in a single round trip, see
+        :py:meth:`antispam.caches.RedisCache.add_message_and_get_window`
+        """
+        timings = self.handler.stage_timings
+        if timings is not None:
+            start = time.perf_counter()
+
+        message: Message = await self.handler.lib_handler.create_message(
+            original_message
+        )
+        if timings is not None:
+            start = timings.record("create_message", start)
+
+        options = self.options(guild)
+        # This also expires the members old messages, so there is nothing to clean up
+        amount, member = await self.cache.add_message_and_get_window(
+            message,
+            cutoff=get_aware_time()
+            - datetime.timedelta(milliseconds=options.message_interval),
+            duplicate_count=options.message_duplicate_count,
+        )
+        if timings is not None:
+            start = timings.record("member_load", start)
+
+        if not member.internal_is_in_guild:
+            return CorePayload(
+                member_status="Bypassing message check since the member doesn't seem to be in a guild"
+            )
+
+        if amount:
+            message.is_duplicate = True
+
+        duplicate_counter = member.duplicate_counter
+        if duplicate_counter < options.message_duplicate_count:
+            comparisons = self._get_comparisons(message, member, guild)
+            scores = await self._score_in_executor(message, guild, comparisons)
+            self._calculate_ratios(
+                message,
+                member,
+                guild,
+                scores=scores,
+                comparisons=comparisons,
+                count_exact=False,
+            )
+            if timings is not None:
+                start = timings.record("ratios", start)
+
+        member.messages.append(message)
+        member.track_message(message, self.handler.similarity_engine)
+        if member.duplicate_counter != duplicate_counter:
+            # Only the difference is written, so this can't
+            # overwrite what another process has counted
+            await self.cache.set_member(member)
+            if timings is not None:
+                timings.record("cache_write", start)
+
         log.info(
             "Created Message(%s) on Member(id=%s) in Guild(id=%s)",
             message.id,
             member.id,
             member.guild_id,
         )
+        return await self._punish_if_required(original_message, member, message, guild)
 
+    async def _punish_if_required(
+        self, original_message, member: Member, message: Message, guild: Guild
+    ) -> CorePayload:
         if (
             self._get_duplicate_count(member, guild, channel_id=message.channel_id)
             < self.options(guild).message_duplicate_count
@@ -137,6 +249,19 @@ class Core:
                 member_status="Bypassing message check since the member doesn't seem to be in a guild"
             )
 
+        timings = self.handler.stage_timings
+        if timings is None:
+            return await self._punish(original_message, member, message, guild)
+
+        start = time.perf_counter()
+        try:
+            return await self._punish(original_message, member, message, guild)
+        finally:
+            timings.record("punishment", start)
+
+    async def _punish(
+        self, original_message, member: Member, message: Message, guild: Guild
+    ) -> CorePayload:
         # We need to punish the member with something
         log.debug(
             "Message(%s) on Member(id=%s) in Guild(id=%s) requires some form of punishment",
@@ -262,7 +387,7 @@ class Core:
 
                 member.times_timed_out += 1
                 member.internal_is_in_guild = True
-                await self.handler.cache.set_member(member)
+                await self.cache.set_member(member)
 
                 return_payload.member_was_timed_out = True
                 return_payload.member_status = "Member was timed out"
@@ -463,8 +588,9 @@ class Core:
             A reference time used to clean up
             past messages against
         channel_id : int
-            The channel to clean messages in
-            if this is set to per_channel
+            The channel the current message was sent in.
+            Expired messages are always removed from
+            the counter for their own channel.
         guild: Guild
             The guild to use for options
         """
@@ -473,31 +599,10 @@ class Core:
             member.id,
             member.guild_id,
         )
-        message_interval = self.options(guild).message_interval
-
-        def _is_still_valid(message_obj):
-            """
-            Given a message, figure out if it hasn't
-            expired yet based on timestamps
-            """
-            difference = current_time - message_obj.creation_time
-            offset = datetime.timedelta(milliseconds=message_interval)
-
-            if difference >= offset:
-                return False
-            return True
-
-        current_messages = []
-        outstanding_messages = []
-
-        for message in member.messages:
-            if _is_still_valid(message):
-                current_messages.append(message)
-            else:
-                outstanding_messages.append(message)
-
-        # TODO This might need to be deepcopied
-        member.messages = current_messages
+        outstanding_messages = member.expire_messages(
+            current_time
+            - datetime.timedelta(milliseconds=self.options(guild).message_interval)
+        )
 
         # Now if we have outstanding messages we need
         # to process them and see if we need to decrement
@@ -505,7 +610,9 @@ class Core:
         # the queue otherwise everything stacks up
         for outstanding_message in outstanding_messages:
             if outstanding_message.is_duplicate:
-                self._remove_duplicate_count(member, guild, channel_id)
+                self._remove_duplicate_count(
+                    member, guild, outstanding_message.channel_id
+                )
                 log.debug(
                     "Removing duplicate message(%s) from Member(id=%s) in Guild(id=%s)",
                     outstanding_message.id,
@@ -519,32 +626,109 @@ class Core:
                 outstanding_message.guild_id,
             )
 
+        if self.options(guild).per_channel_spam:
+            for expired_channel_id in {m.channel_id for m in outstanding_messages}:
+                if not member.get_channel_messages(expired_channel_id):
+                    # Nothing is left in this channel to be a
+                    # duplicate of, so start fresh next time
+                    member.duplicate_channel_counter_dict.pop(expired_channel_id, None)
+
     def _calculate_ratios(
         self,
         message: Message,
         member: Member,
         guild: Guild,
+        scores: Optional[Dict[int, float]] = None,
+        comparisons: Optional[List[Message]] = None,
+        count_exact: bool = True,
     ) -> None:
         """
         Calculates a messages relation to other messages
+
+        Parameters
+        ----------
+        message : Message
+            The message to calculate relations for
+        member : Member
+            The member who sent the message
+        guild : Guild
+            The guild to use for options
+        scores : Optional[Dict[int, float]]
+            Scores already calculated by :py:meth:`_score_in_executor`.
+            Any message without a score is scored inline.
+        comparisons : Optional[List[Message]]
+            The messages to score against, as returned by
+            :py:meth:`_get_comparisons`. Found if not given.
+        count_exact : bool
+            Whether to count exact duplicates, ``False``
+            when the cache has already counted them.
         """
-        for message_obj in member.messages:
-            # This calculates the relation to each other
-            if message == message_obj:
+        engine = self.handler.similarity_engine
+        accuracy = self.options(guild).message_duplicate_accuracy
+        per_channel_spam = self.options(guild).per_channel_spam
+        processed = message.get_processed_content(engine)
+
+        # Exact repeats can be counted without ever
+        # touching the similarity engine
+        exact_matches = []
+        if count_exact:
+            exact_matches = [
+                message_obj
+                for message_obj in member.get_digest_index(engine).get(
+                    processed.digest, []
+                )
+                if not per_channel_spam or message.channel_id == message_obj.channel_id
+            ]
+
+        if exact_matches:
+            if message in exact_matches:
                 raise DuplicateObject
 
-            elif (
-                self.options(guild).per_channel_spam
-                and message.channel_id != message_obj.channel_id
-            ):
-                # This user's spam should only be counted per channel
-                # and these messages are in different channel
-                continue
+            remaining = self.options(guild).message_duplicate_count - (
+                self._get_duplicate_count(
+                    member, channel_id=message.channel_id, guild=guild
+                )
+            )
+            amount = min(len(exact_matches), max(remaining, 1))
+            self._increment_duplicate_count(
+                member, guild, channel_id=message.channel_id, amount=amount
+            )
+            message.is_duplicate = True
+            # Only the matches which were counted, so expiring
+            # the rest doesn't lower the counter below where it was
+            for message_obj in exact_matches[:amount]:
+                message_obj.is_duplicate = True
 
-            elif (
-                fuzz.token_sort_ratio(message.content, message_obj.content)
-                >= self.options(guild).message_duplicate_accuracy
+            if (
+                self._get_duplicate_count(
+                    member, channel_id=message.channel_id, guild=guild
+                )
+                >= self.options(guild).message_duplicate_count
             ):
+                return
+
+        score_cache = self.handler.score_cache
+        if comparisons is None:
+            comparisons = self._get_comparisons(message, member, guild)
+
+        for message_obj in comparisons:
+            # This calculates the relation to each other
+            other_processed = message_obj.get_processed_content(engine)
+            score = scores.get(id(message_obj)) if scores is not None else None
+            if score is None:
+                score = score_cache.get(
+                    processed.digest, other_processed.digest, accuracy
+                )
+
+            if score is None:
+                score = engine.compare(
+                    processed.content, other_processed.content, accuracy
+                )
+                score_cache.set(
+                    processed.digest, other_processed.digest, accuracy, score
+                )
+
+            if score >= accuracy:
                 """
                 The handler works off an internal message duplicate counter
                 so just increment that and then let our logic process it later
@@ -563,6 +747,101 @@ class Core:
                 ):
                     break
 
+    def _get_comparisons(
+        self, message: Message, member: Member, guild: Guild
+    ) -> List[Message]:
+        """The messages which need scoring against the given message"""
+        engine = self.handler.similarity_engine
+        per_channel_spam = self.options(guild).per_channel_spam
+        digest = message.get_processed_content(engine).digest
+
+        if self.options(guild).use_lsh:
+            # Only score messages likely to be similar
+            candidates = member.get_lsh_candidates(message, engine)
+        elif per_channel_spam:
+            candidates = member.get_channel_messages(message.channel_id)
+        else:
+            candidates = member.messages
+
+        return [
+            message_obj
+            for message_obj in candidates
+            # This user's spam should only be counted per channel
+            if (not per_channel_spam or message.channel_id == message_obj.channel_id)
+            # Exact matches are counted without scoring
+            and message_obj.get_processed_content(engine).digest != digest
+        ]
+
+    async def _score_in_executor(
+        self, message: Message, guild: Guild, comparisons: List[Message]
+    ) -> Optional[Dict[int, float]]:
+        """
+        Scores the given message against ``comparisons``, as
+        returned by :py:meth:`_get_comparisons`, within
+        ``AntiSpamHandler.executor`` when there is enough
+        content for it to be worth doing so.
+
+        Returns
+        -------
+        Optional[Dict[int, float]]
+            Scores keyed by the ``id()`` of the compared message,
+            or ``None`` if these should be scored inline.
+        """
+        executor = self.handler.executor
+        if executor is None:
+            return None
+
+        engine = self.handler.similarity_engine
+        accuracy = self.options(guild).message_duplicate_accuracy
+        processed = message.get_processed_content(engine)
+        comparisons = [
+            message_obj
+            for message_obj in comparisons
+            # Already scored pairs are quicker to fetch inline
+            if self.handler.score_cache.peek(
+                processed.digest,
+                message_obj.get_processed_content(engine).digest,
+                accuracy,
+            )
+            is None
+        ]
+        contents = [
+            message_obj.get_processed_content(engine).content
+            for message_obj in comparisons
+        ]
+        characters = processed.length + sum(len(content) for content in contents)
+
+        metrics = self.handler.offload_metrics
+        if not comparisons or characters < self.handler.offload_threshold:
+            metrics.inline_batches += 1
+            return None
+
+        start = time.perf_counter()
+        scores = await asyncio.get_running_loop().run_in_executor(
+            executor,
+            _score_batch,
+            engine,
+            processed.content,
+            contents,
+            accuracy,
+        )
+        metrics.offloaded_batches += 1
+        metrics.offloaded_comparisons += len(comparisons)
+        metrics.offloaded_characters += characters
+        metrics.offloaded_seconds += time.perf_counter() - start
+
+        for message_obj, score in zip(comparisons, scores):
+            self.handler.score_cache.set(
+                processed.digest,
+                message_obj.get_processed_content(engine).digest,
+                accuracy,
+                score,
+            )
+
+        return {
+            id(message_obj): score for message_obj, score in zip(comparisons, scores)
+        }
+
     def _increment_duplicate_count(
         self,
         member: Member,
@@ -20,8 +20,14 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
 FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
+from antispam.dataclasses.compact import CompactMessage, CompactMessages
 from antispam.dataclasses.core import CorePayload
 from antispam.dataclasses.guild import Guild
+from antispam.dataclasses.histogram import Histogram
+from antispam.dataclasses.latency_histogram import LatencyHistogram
+from antispam.dataclasses.lock_metrics import LockMetrics
 from antispam.dataclasses.member import Member
-from antispam.dataclasses.message import Message
+from antispam.dataclasses.message import Message, ProcessedContent
+from antispam.dataclasses.offload_metrics import OffloadMetrics
 from antispam.dataclasses.options import Options
+from antispam.dataclasses.queue_metrics import GuildQueueMetrics, QueueMetrics
@@ -0,0 +1,423 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+import datetime
+from array import array
+from collections.abc import MutableSequence
+from itertools import islice
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Union
+
+from antispam.dataclasses.message import Message, ProcessedContent
+
+if TYPE_CHECKING:  # pragma: no cover
+    from antispam.abc import SimilarityEngine
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MILLISECOND = datetime.timedelta(milliseconds=1)
+_DIGEST_SIZE = 16
+
+
+def _to_milliseconds(time: datetime.datetime) -> int:
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=datetime.timezone.utc)
+
+    return (time - _EPOCH) // _MILLISECOND
+
+
+class CompactMessage(Message):
+    """
+    A :py:class:`Message` which reads and writes
+    through to its position within :py:class:`CompactMessages`
+
+    Notes
+    -----
+    ``content`` is the processed form of the original
+    content, as the original content is never stored.
+
+    Once removed from its :py:class:`CompactMessages` this
+    keeps a copy of its data so it can still be used.
+    """
+
+    __slots__ = ("_window", "_sequence", "_detached")
+
+    def __init__(self, window: "CompactMessages", sequence: int):
+        self._window: Optional[CompactMessages] = window
+        self._sequence: int = sequence
+        self._detached: Optional[Message] = None
+
+    @property
+    def _position(self) -> int:
+        return self._sequence - self._window._first_sequence
+
+    @property
+    def id(self) -> int:
+        if self._window is None:
+            return self._detached.id
+
+        return self._window._ids[self._position]
+
+    @property
+    def channel_id(self) -> int:
+        if self._window is None:
+            return self._detached.channel_id
+
+        return self._window._channel_ids[self._position]
+
+    @property
+    def guild_id(self) -> int:
+        if self._window is None:
+            return self._detached.guild_id
+
+        return self._window.guild_id
+
+    @property
+    def author_id(self) -> int:
+        if self._window is None:
+            return self._detached.author_id
+
+        return self._window.author_id
+
+    @property
+    def content(self) -> str:
+        if self._window is None:
+            return self._detached.content
+
+        return self._window._contents[self._position][0]
+
+    @property
+    def creation_time(self) -> datetime.datetime:
+        if self._window is None:
+            return self._detached.creation_time
+
+        return _EPOCH + self._window._timestamps[self._position] * _MILLISECOND
+
+    @property
+    def is_duplicate(self) -> bool:
+        if self._window is None:
+            return self._detached.is_duplicate
+
+        return bool(self._window._duplicates >> self._position & 1)
+
+    @is_duplicate.setter
+    def is_duplicate(self, value: bool) -> None:
+        if self._window is None:
+            self._detached.is_duplicate = value
+            return
+
+        bit = 1 << self._position
+        if value:
+            self._window._duplicates |= bit
+        else:
+            self._window._duplicates &= ~bit
+
+    @property
+    def processed_content(self) -> ProcessedContent:
+        if self._window is None:
+            return self._detached.processed_content
+
+        # Built the first time any message with this digest needs
+        # it, then shared until every message with it is removed
+        position = self._position
+        entry = self._window._contents[position]
+        if entry[2] is None:
+            entry[2] = ProcessedContent(
+                tokens=tuple(entry[0].split()),
+                content=entry[0],
+                length=len(entry[0]),
+                digest=bytes(
+                    self._window._digests[
+                        position * _DIGEST_SIZE : (position + 1) * _DIGEST_SIZE
+                    ]
+                ),
+            )
+
+        return entry[2]
+
+    def get_processed_content(self, engine: "SimilarityEngine") -> ProcessedContent:
+        return self.processed_content
+
+    def __eq__(self, other):
+        if not isinstance(other, Message):
+            return NotImplemented
+
+        return (
+            self.id,
+            self.channel_id,
+            self.guild_id,
+            self.author_id,
+            self.content,
+            self.creation_time,
+            self.is_duplicate,
+        ) == (
+            other.id,
+            other.channel_id,
+            other.guild_id,
+            other.author_id,
+            other.content,
+            other.creation_time,
+            other.is_duplicate,
+        )
+
+    __hash__ = None
+
+    def _detach(self) -> None:
+        processed = self.processed_content
+        detached = Message(
+            id=self.id,
+            channel_id=self.channel_id,
+            guild_id=self.guild_id,
+            author_id=self.author_id,
+            content=processed.content,
+            creation_time=self.creation_time,
+            is_duplicate=self.is_duplicate,
+        )
+        detached._processed_content = processed
+        self._detached = detached
+        self._window = None
+
+
+class CompactMessages(MutableSequence):
+    """
+    A memory efficient alternative to a list of :py:class:`Message`
+    for storing a members messages.
+
+    Ids, channel ids and creation times are stored as ``array('q')``
+    columns, ``is_duplicate`` as a bitset and content only as its
+    digest and processed form, shared between equal messages.
+    Items are :py:class:`CompactMessage` views over this storage.
+
+    Parameters
+    ----------
+    messages : Iterable[Message]
+        Messages to store initially
+    engine : Optional[SimilarityEngine]
+        Used to process messages which haven't been already
+
+    Notes
+    -----
+    Creation times are stored to the millisecond and
+    naive datetimes are assumed to be UTC, as are
+    all returned creation times.
+    """
+
+    def __init__(
+        self,
+        messages: Iterable[Message] = (),
+        *,
+        engine: Optional["SimilarityEngine"] = None,
+    ):
+        self.engine: Optional["SimilarityEngine"] = engine
+        self.guild_id: Optional[int] = None
+        self.author_id: Optional[int] = None
+
+        self._ids: array = array("q")
+        self._channel_ids: array = array("q")
+        self._timestamps: array = array("q")
+        self._duplicates: int = 0
+        self._digests: bytearray = bytearray()
+        # digest -> [processed content, usages, ProcessedContent once needed],
+        # each message holds the entry for its digest
+        self._interned: Dict[bytes, list] = {}
+        self._contents: List[list] = []
+        self._views: List[CompactMessage] = []
+        # The sequence of whatever is stored first
+        self._first_sequence: int = 0
+        # How many removed messages are still stored at the start,
+        # so removing the oldest messages doesn't move the rest
+        self._head: int = 0
+
+        for message in messages:
+            self.append(message)
+
+    def __len__(self) -> int:
+        return len(self._views) - self._head
+
+    def __iter__(self) -> Iterator[CompactMessage]:
+        return islice(self._views, self._head, None)
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[CompactMessage, List[CompactMessage]]:
+        if isinstance(index, slice):
+            return self._views[self._head :][index]
+
+        return self._views[self._head + range(len(self))[index]]
+
+    def __setitem__(self, index: int, message: Message) -> None:
+        if isinstance(index, slice):
+            raise TypeError("CompactMessages does not support slice assignment")
+
+        index = range(len(self))[index]
+        del self[index]
+        self.insert(index, message)
+
+    def __delitem__(self, index: Union[int, slice]) -> None:
+        positions = range(len(self))[index]
+        if isinstance(positions, int):
+            positions = range(positions, positions + 1)
+
+        if not positions:
+            return
+
+        for position in positions:
+            view = self._views[self._head + position]
+            view._detach()
+            self._release(view.processed_content.digest)
+
+        if positions.start == 0 and positions.step == 1:
+            # Removing the oldest messages, which is by far the most common.
+            # They are only dropped from storage once they make up half of
+            # it, so removing the oldest message is O(1) amortized
+            self._head += len(positions)
+            if self._head * 2 >= len(self._views):
+                self._compact()
+
+            return
+
+        self._compact()
+        removed = set(positions)
+        self._reorder(
+            [position for position in range(len(self)) if position not in removed]
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, tuple, CompactMessages)):
+            return NotImplemented
+
+        return list(self) == list(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"CompactMessages({list(self)!r})"
+
+    def append(self, message: Message) -> None:
+        processed = message.processed_content
+        if processed is None:
+            if self.engine is None:
+                raise ValueError(
+                    "Expected either an engine or messages with processed content"
+                )
+
+            processed = message.get_processed_content(self.engine)
+
+        if self.guild_id is None:
+            self.guild_id = message.guild_id
+            self.author_id = message.author_id
+
+        elif (message.guild_id, message.author_id) != (self.guild_id, self.author_id):
+            raise ValueError("All messages must be from the same member")
+
+        position = len(self._views)
+        self._ids.append(message.id)
+        self._channel_ids.append(message.channel_id)
+        self._timestamps.append(_to_milliseconds(message.creation_time))
+        if message.is_duplicate:
+            self._duplicates |= 1 << position
+
+        self._digests += processed.digest
+        self._contents.append(self._intern(processed))
+        self._views.append(CompactMessage(self, self._first_sequence + position))
+
+    def insert(self, index: int, message: Message) -> None:
+        length = len(self)
+        self.append(message)
+
+        position = max(0, min(index + length if index < 0 else index, length))
+        if position != length:
+            order = list(range(length))
+            order.insert(position, length)
+            self._reorder(order)
+
+    def sort(self, *, key=None, reverse: bool = False) -> None:
+        """Sorts these messages in place, like :py:meth:`list.sort`"""
+        self._compact()
+        views = sorted(self._views, key=key, reverse=reverse)
+        self._reorder([view._position for view in views])
+
+    def _compact(self) -> None:
+        """Drops the removed messages still stored at the start."""
+        amount = self._head
+        if not amount:
+            return
+
+        del self._ids[:amount]
+        del self._channel_ids[:amount]
+        del self._timestamps[:amount]
+        del self._digests[: amount * _DIGEST_SIZE]
+        del self._contents[:amount]
+        del self._views[:amount]
+        self._duplicates >>= amount
+        self._first_sequence += amount
+        self._head = 0
+
+    def _reorder(self, order: List[int]) -> None:
+        """Rebuilds storage to only hold the given positions, in that order."""
+        self._compact()
+        duplicates = 0
+        for new_position, position in enumerate(order):
+            if self._duplicates >> position & 1:
+                duplicates |= 1 << new_position
+
+        self._ids = array("q", [self._ids[position] for position in order])
+        self._channel_ids = array(
+            "q", [self._channel_ids[position] for position in order]
+        )
+        self._timestamps = array(
+            "q", [self._timestamps[position] for position in order]
+        )
+        self._digests = bytearray().join(
+            self._digests[position * _DIGEST_SIZE : (position + 1) * _DIGEST_SIZE]
+            for position in order
+        )
+        self._contents = [self._contents[position] for position in order]
+        self._views = [self._views[position] for position in order]
+        self._duplicates = duplicates
+
+        for position, view in enumerate(self._views):
+            view._sequence = self._first_sequence + position
+
+    def _intern(self, processed: ProcessedContent) -> list:
+        entry = self._interned.get(processed.digest)
+        if entry is None:
+            entry = self._interned[processed.digest] = [processed.content, 0, None]
+
+        entry[1] += 1
+        return entry
+
+    def _release(self, digest: bytes) -> None:
+        entry = self._interned[digest]
+        entry[1] -= 1
+        if not entry[1]:
+            self._interned.pop(digest)
+
+
+def serialize_compact_messages(instance, field, value):
+    """
+    An ``attr.asdict`` value serializer which turns
+    :py:class:`CompactMessages` into a list so they get
+    serialized like any other list of messages.
+    """
+    if isinstance(value, CompactMessages):
+        return list(value)
+
+    return value
@@ -29,8 +29,18 @@ from antispam.dataclasses.message import Message
 from antispam.dataclasses.options import Options
 
 
+class _PersistedGuildData:
+    """Storage for what a cache backend knows it has stored for a Guild.
+
+    This lives outside of the attrs fields so that it is never
+    persisted, and isn't kept by copies of the guild.
+    """
+
+    __slots__ = ("_persisted_member_ids",)
+
+
 @attr.s(slots=True)
-class Guild:
+class Guild(_PersistedGuildData):
     """A simplistic dataclass representing a Guild"""
 
     id: int = attr.ib(eq=True)
@@ -0,0 +1,67 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+from bisect import bisect_left
+from typing import List, Tuple
+
+import attr
+
+
+@attr.s(slots=True)
+class Histogram:
+    """
+    Counts observed values into fixed buckets.
+
+    Parameters
+    ----------
+    bounds : Tuple[float, ...]
+        The inclusive upper bound of each bucket, in ascending order.
+        Values above the last bound are counted in a final overflow bucket.
+    counts : List[int]
+        How many values fell into each bucket,
+        this is one longer then ``bounds``
+    count : int
+        How many values have been observed
+    sum : float
+        The total of every observed value
+    """
+
+    bounds: Tuple[float, ...] = attr.ib(converter=tuple)
+    counts: List[int] = attr.ib()
+    count: int = attr.ib(default=0)
+    sum: float = attr.ib(default=0.0)
+
+    @counts.default
+    def _counts_default(self) -> List[int]:
+        return [0] * (len(self.bounds) + 1)
+
+    def observe(self, value: float) -> None:
+        """Count a value into its bucket."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def reset(self) -> None:
+        """Forget every observed value."""
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
@@ -0,0 +1,133 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+import math
+from typing import Dict, Optional
+
+import attr
+
+
+@attr.s(slots=True)
+class LatencyHistogram:
+    """
+    Records durations into buckets whose width grows with the
+    value, so every recorded duration is kept to within a fixed
+    relative error however large or small it is.
+
+    Durations are stored as whole nanoseconds, rounded down to
+    their top ``precision`` bits. Only buckets which have had
+    something recorded in them take up any memory.
+
+    Parameters
+    ----------
+    precision : int
+        How many significant bits of each duration are kept,
+        the relative error is at most ``1 / 2 ** (precision - 1)``
+
+        Defaults to ``7``, or under 2%
+    counts : Dict[int, int]
+        The lowest value in each bucket, in nanoseconds,
+        mapped to how many durations fell into it
+    count : int
+        How many durations have been recorded
+    total : int
+        The sum of every recorded duration, in nanoseconds
+    min : Optional[int]
+        The smallest recorded duration, in nanoseconds
+    max : Optional[int]
+        The largest recorded duration, in nanoseconds
+    """
+
+    precision: int = attr.ib(default=7)
+    counts: Dict[int, int] = attr.ib(factory=dict)
+    count: int = attr.ib(default=0)
+    total: int = attr.ib(default=0)
+    min: Optional[int] = attr.ib(default=None)
+    max: Optional[int] = attr.ib(default=None)
+
+    @precision.validator
+    def _check_precision(self, attribute, value: int) -> None:
+        if value < 1:
+            raise ValueError("Expected `precision` to be at least 1")
+
+    def record(self, seconds: float) -> None:
+        """Record a duration, given in seconds."""
+        value = int(seconds * 1_000_000_000)
+        shift = value.bit_length() - self.precision
+        bucket = value >> shift << shift if shift > 0 else value
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        """The average recorded duration, in seconds."""
+        if not self.count:
+            return 0.0
+
+        return self.total / self.count / 1_000_000_000
+
+    def value_at_percentile(self, percentile: float) -> float:
+        """
+        The duration which ``percentile`` percent of
+        recorded durations are at or below.
+
+        Parameters
+        ----------
+        percentile : float
+            Between ``0`` and ``100``, I.e. ``99.9``
+
+        Returns
+        -------
+        float
+            The duration in seconds, or ``0`` if
+            nothing has been recorded
+        """
+        if not 0 <= percentile <= 100:
+            raise ValueError("Expected `percentile` to be between 0 and 100")
+
+        if not self.count:
+            return 0.0
+
+        target = max(1, math.ceil(self.count * percentile / 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                break
+
+        # Report the top of the bucket, without going past what was recorded
+        shift = bucket.bit_length() - self.precision
+        highest = bucket + (1 << shift) - 1 if shift > 0 else bucket
+        return min(highest, self.max) / 1_000_000_000
+
+    def reset(self) -> None:
+        """Forget every recorded duration."""
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
@@ -0,0 +1,83 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+from typing import TYPE_CHECKING
+
+import attr
+
+if TYPE_CHECKING:  # pragma: no cover
+    from antispam.metrics import MetricsRegistry
+
+
+@attr.s(slots=True)
+class LockMetrics:
+    """
+    How often messages had to wait on
+    :py:attr:`antispam.AntiSpamHandler.member_locks`
+
+    Parameters
+    ----------
+    acquisitions : int
+        How many times a member lock was acquired
+    contended_acquisitions : int
+        How many of those had to wait for another
+        message holding the same lock first
+    waiting : int
+        How many messages are currently waiting on a lock
+    wait_seconds : float
+        How long was spent waiting on locks in total
+    max_wait_seconds : float
+        The longest a single message has waited on a lock
+    """
+
+    acquisitions: int = attr.ib(default=0)
+    contended_acquisitions: int = attr.ib(default=0)
+    waiting: int = attr.ib(default=0)
+    wait_seconds: float = attr.ib(default=0.0)
+    max_wait_seconds: float = attr.ib(default=0.0)
+
+    def register_metrics(self, registry: "MetricsRegistry") -> None:
+        """Render these on ``registry``, read from here whenever it is rendered."""
+        registry.counter(
+            "antispam_member_lock_acquisitions",
+            "Times a member lock was acquired, by whether it was already held",
+            ("contended",),
+            function=lambda: {
+                ("false",): self.acquisitions - self.contended_acquisitions,
+                ("true",): self.contended_acquisitions,
+            },
+        )
+        registry.gauge(
+            "antispam_member_lock_waiting",
+            "Messages currently waiting for a member lock",
+            function=lambda: {(): self.waiting},
+        )
+        registry.counter(
+            "antispam_member_lock_wait_seconds",
+            "Time spent waiting for member locks",
+            function=lambda: {(): self.wait_seconds},
+        )
+        registry.gauge(
+            "antispam_member_lock_max_wait_seconds",
+            "The longest a single message has waited for a member lock",
+            function=lambda: {(): self.max_wait_seconds},
+        )
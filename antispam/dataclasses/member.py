@@ -20,15 +20,42 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
 FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
-from typing import Any, Dict, List
+import datetime
+from collections import deque
+from typing import TYPE_CHECKING, Any, Deque, Dict, List
 
 import attr
 
+from antispam.dataclasses.compact import CompactMessages
 from antispam.dataclasses.message import Message
 
+if TYPE_CHECKING:  # pragma: no cover
+    from antispam.abc import SimilarityEngine
+
+
+class _DerivedMemberData:
+    """Storage for data derived from a Member's messages.
+
+    This lives outside of the attrs fields so that it is never
+    persisted by cache backends, instead being rebuilt when first needed.
+
+    ``_persisted_state`` is how a cache backend last stored this member,
+    so it can tell whether the member has changed since. Copies don't
+    keep it, so are always treated as changed.
+    """
+
+    __slots__ = (
+        "_digest_index",
+        "_lsh_index",
+        "_channel_index",
+        "_index_source",
+        "_index_size",
+        "_persisted_state",
+    )
+
 
 @attr.s(slots=True)
-class Member:
+class Member(_DerivedMemberData):
     """A simplistic dataclass representing a Member"""
 
     id: int = attr.ib(eq=True)
@@ -47,3 +74,213 @@ class Member:
     # key -> Plugin.__class__.__name__
     # Value -> Whatever they want to store
     addons: Dict[str, Any] = attr.ib(default=attr.Factory(dict), eq=False)
+
+    def get_digest_index(
+        self, engine: "SimilarityEngine"
+    ) -> Dict[bytes, Deque[Message]]:
+        """
+        Returns a multiset of this members current messages,
+        keyed by :py:attr:`ProcessedContent.digest`.
+
+        Each value holds the messages with that digest, oldest first,
+        so the amount of exact duplicates is simply its length.
+
+        Parameters
+        ----------
+        engine : SimilarityEngine
+            The engine used to build any missing processed content
+
+        Notes
+        -----
+        If ``messages`` has been replaced or modified
+        without going through :py:meth:`track_message` or
+        :py:meth:`expire_messages` this is rebuilt.
+        """
+        self._ensure_indexes_synced()
+        index = getattr(self, "_digest_index", None)
+        if index is None:
+            index = self._digest_index = {}
+            for message in self.messages:
+                self._add_to_digest_index(message, engine)
+
+        return index
+
+    def get_lsh_candidates(
+        self, message: Message, engine: "SimilarityEngine"
+    ) -> List[Message]:
+        """
+        Returns the current messages which share at
+        least one MinHash LSH band with the given message.
+
+        Parameters
+        ----------
+        message : Message
+            The message to find likely near duplicates for
+        engine : SimilarityEngine
+            The engine used to build any missing processed content
+
+        Returns
+        -------
+        List[Message]
+            The candidates, oldest first
+        """
+        self._ensure_indexes_synced()
+        index = getattr(self, "_lsh_index", None)
+        if index is None:
+            index = self._lsh_index = {}
+            for message_obj in self.messages:
+                self._add_to_lsh_index(message_obj, engine)
+
+        candidates: Dict[int, Message] = {}
+        for key in message.get_band_keys(engine):
+            for message_obj in index.get(key, ()):
+                candidates[id(message_obj)] = message_obj
+
+        return sorted(candidates.values(), key=lambda m: m.creation_time)
+
+    def get_channel_messages(self, channel_id: int) -> Deque[Message]:
+        """
+        Returns this members current messages
+        which were sent in the given channel.
+
+        Parameters
+        ----------
+        channel_id : int
+            The channel to get messages for
+
+        Returns
+        -------
+        Deque[Message]
+            The messages, oldest first
+
+        Notes
+        -----
+        The returned deque is used internally,
+        so should not be modified.
+        """
+        self._ensure_indexes_synced()
+        index = getattr(self, "_channel_index", None)
+        if index is None:
+            index = self._channel_index = {}
+            for message in self.messages:
+                index.setdefault(message.channel_id, deque()).append(message)
+
+        return index.get(channel_id, deque())
+
+    def track_message(self, message: Message, engine: "SimilarityEngine") -> None:
+        """Add a newly stored message to any built indexes."""
+        if getattr(self, "_index_source", None) is not self.messages:
+            return
+
+        if isinstance(self.messages, CompactMessages) and self.messages:
+            # Index the stored view rather then the full message
+            message = self.messages[-1]
+
+        if getattr(self, "_digest_index", None) is not None:
+            self._add_to_digest_index(message, engine)
+
+        if getattr(self, "_lsh_index", None) is not None:
+            self._add_to_lsh_index(message, engine)
+
+        if getattr(self, "_channel_index", None) is not None:
+            self._channel_index.setdefault(message.channel_id, deque()).append(message)
+
+        self._mark_indexes_synced()
+
+    def expire_messages(self, cutoff: datetime.datetime) -> List[Message]:
+        """
+        Removes every message created at or before ``cutoff``,
+        also removing them from any built indexes.
+
+        Parameters
+        ----------
+        cutoff : datetime.datetime
+            The newest creation time which counts as expired
+
+        Returns
+        -------
+        List[Message]
+            The removed messages, oldest first
+
+        Notes
+        -----
+        As messages are stored in the order they are sent
+        this stops at the first message which is still valid,
+        so only expired messages are ever looked at.
+        """
+        self._ensure_indexes_synced()
+
+        expired_count = 0
+        for message in self.messages:
+            if message.creation_time > cutoff:
+                break
+
+            expired_count += 1
+
+        if not expired_count:
+            return []
+
+        expired = self.messages[:expired_count]
+        del self.messages[:expired_count]
+
+        digest_index = getattr(self, "_digest_index", None)
+        lsh_index = getattr(self, "_lsh_index", None)
+        channel_index = getattr(self, "_channel_index", None)
+        for message in expired:
+            if digest_index is not None and message.processed_content:
+                self._remove_from_bucket(
+                    digest_index, message.processed_content.digest, message
+                )
+
+            if lsh_index is not None:
+                for key in getattr(message, "_band_keys", None) or ():
+                    self._remove_from_bucket(lsh_index, key, message)
+
+            if channel_index is not None:
+                self._remove_from_bucket(channel_index, message.channel_id, message)
+
+        self._mark_indexes_synced()
+        return expired
+
+    def _add_to_digest_index(
+        self, message: Message, engine: "SimilarityEngine"
+    ) -> None:
+        digest = message.get_processed_content(engine).digest
+        self._digest_index.setdefault(digest, deque()).append(message)
+
+    def _add_to_lsh_index(self, message: Message, engine: "SimilarityEngine") -> None:
+        for key in message.get_band_keys(engine):
+            self._lsh_index.setdefault(key, deque()).append(message)
+
+    @staticmethod
+    def _remove_from_bucket(index: Dict[Any, Deque[Message]], key, message: Message):
+        bucket = index.get(key)
+        if not bucket:
+            # This message was never indexed
+            return
+
+        if bucket[0] is message:
+            # Messages expire oldest first, so this is almost always the case
+            bucket.popleft()
+        else:
+            try:
+                bucket.remove(message)
+            except ValueError:
+                return
+
+        if not bucket:
+            index.pop(key)
+
+    def _ensure_indexes_synced(self) -> None:
+        if getattr(
+            self, "_index_source", None
+        ) is not self.messages or self._index_size != len(self.messages):
+            # Something else changed messages, rebuild when next needed
+            self._digest_index = None
+            self._lsh_index = None
+            self._channel_index = None
+            self._mark_indexes_synced()
+
+    def _mark_indexes_synced(self) -> None:
+        self._index_source = self.messages
+        self._index_size = len(self.messages)
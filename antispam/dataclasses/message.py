@@ -21,14 +21,53 @@ FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
 import datetime
+import hashlib
+from typing import TYPE_CHECKING, Optional, Tuple
 
 import attr
 
 from antispam.util import get_aware_time
 
+if TYPE_CHECKING:  # pragma: no cover
+    from antispam.abc import SimilarityEngine
+
+
+@attr.s(slots=True, frozen=True)
+class ProcessedContent:
+    """The normalized form of a messages content, as used for comparisons"""
+
+    # The normalized tokens, sorted
+    tokens: Tuple[str, ...] = attr.ib()
+    # The sorted tokens joined back together,
+    # this is what similarity engines compare
+    content: str = attr.ib()
+    length: int = attr.ib()
+    # A digest of content, equal digests mean
+    # the messages are exact duplicates of each other
+    digest: bytes = attr.ib()
+
+    @classmethod
+    def from_processed(cls, processed: str) -> "ProcessedContent":
+        return cls(
+            tokens=tuple(processed.split()),
+            content=processed,
+            length=len(processed),
+            digest=hashlib.blake2b(processed.encode("utf-8"), digest_size=16).digest(),
+        )
+
+
+class _DerivedMessageData:
+    """Storage for data derived from a Message's content.
+
+    This lives outside of the attrs fields so that it is never
+    persisted by cache backends, instead being rebuilt when first needed.
+    """
+
+    __slots__ = ("_processed_content", "_band_keys")
+
 
 @attr.s(slots=True)
-class Message:
+class Message(_DerivedMessageData):
     """A simplistic dataclass representing a Message"""
 
     id: int = attr.ib()
@@ -38,3 +77,56 @@ class Message:
     content: str = attr.ib()
     creation_time: datetime.datetime = attr.ib(default=attr.Factory(get_aware_time))
     is_duplicate: bool = attr.ib(default=False)
+
+    @property
+    def processed_content(self) -> Optional[ProcessedContent]:
+        """The normalized content for this message, if it has been built yet."""
+        return getattr(self, "_processed_content", None)
+
+    def get_processed_content(self, engine: "SimilarityEngine") -> ProcessedContent:
+        """
+        Returns the normalized content for this message,
+        building it with the given engine on first usage.
+
+        Parameters
+        ----------
+        engine : SimilarityEngine
+            The engine used to normalize the content
+
+        Returns
+        -------
+        ProcessedContent
+            The normalized content
+        """
+        processed = getattr(self, "_processed_content", None)
+        if processed is None:
+            processed = ProcessedContent.from_processed(engine.process(self.content))
+            self._processed_content = processed
+
+        return processed
+
+    def get_band_keys(self, engine: "SimilarityEngine") -> Tuple[int, ...]:
+        """
+        Returns the MinHash LSH band keys for this message,
+        building them on first usage.
+
+        Parameters
+        ----------
+        engine : SimilarityEngine
+            The engine used to normalize the content
+
+        Returns
+        -------
+        Tuple[int, ...]
+            One bucket key per band
+        """
+        keys = getattr(self, "_band_keys", None)
+        if keys is None:
+            from antispam.engines.minhash import band_keys, minhash_signature
+
+            keys = band_keys(
+                minhash_signature(self.get_processed_content(engine).content)
+            )
+            self._band_keys = keys
+
+        return keys
@@ -0,0 +1,83 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+from typing import TYPE_CHECKING
+
+import attr
+
+if TYPE_CHECKING:  # pragma: no cover
+    from antispam.metrics import MetricsRegistry
+
+
+@attr.s(slots=True)
+class OffloadMetrics:
+    """
+    How much similarity work has been offloaded to
+    :py:attr:`antispam.AntiSpamHandler.executor`
+
+    Parameters
+    ----------
+    inline_batches : int
+        How many messages were scored on the event loop
+        as they were below ``offload_threshold``
+    offloaded_batches : int
+        How many messages were scored within the executor
+    offloaded_comparisons : int
+        How many individual comparisons the executor made
+    offloaded_characters : int
+        The combined content length of every offloaded batch
+    offloaded_seconds : float
+        How long was spent awaiting the executor in total
+    """
+
+    inline_batches: int = attr.ib(default=0)
+    offloaded_batches: int = attr.ib(default=0)
+    offloaded_comparisons: int = attr.ib(default=0)
+    offloaded_characters: int = attr.ib(default=0)
+    offloaded_seconds: float = attr.ib(default=0.0)
+
+    def register_metrics(self, registry: "MetricsRegistry") -> None:
+        """Render these on ``registry``, read from here whenever it is rendered."""
+        registry.counter(
+            "antispam_offload_batches",
+            "Messages scored, by whether it was within the executor",
+            ("offloaded",),
+            function=lambda: {
+                ("false",): self.inline_batches,
+                ("true",): self.offloaded_batches,
+            },
+        )
+        registry.counter(
+            "antispam_offload_comparisons",
+            "Comparisons made within the executor",
+            function=lambda: {(): self.offloaded_comparisons},
+        )
+        registry.counter(
+            "antispam_offload_characters",
+            "The combined content length of every offloaded message",
+            function=lambda: {(): self.offloaded_characters},
+        )
+        registry.counter(
+            "antispam_offload_seconds",
+            "Time spent awaiting the executor",
+            function=lambda: {(): self.offloaded_seconds},
+        )
@@ -231,6 +231,22 @@ class Options:
         Track spam as per channel, rather then per guild.
         I.e. False implies spam is tracked as ``Per Member Per Guild``
         True implies ``Per Member Per Channel``
+    use_lsh : bool
+        Default: ``False``
+
+        Only score messages which share a MinHash band with the
+        new message, rather then every message the member has sent.
+        This makes near duplicate detection much cheaper for members
+        with large message windows, at the cost of occasionally
+        missing a heavily modified duplicate.
+    scheduling_weight : int
+        Default: ``1``
+
+        How many of this guilds messages are propagated for each
+        message from a guild with a weight of ``1`` while messages are
+        queued with :py:meth:`antispam.AntiSpamHandler.submit`.
+        Guilds share workers fairly by weight, so one busy
+        guild can't hold up every other guild.
     addons : Dict
         Default: ``Empty Dict``
 
@@ -391,6 +407,10 @@ class Options:
     per_channel_spam: bool = attr.ib(
         default=False, validator=attr.validators.instance_of(bool)
     )  # False implies per_user_per_guild
+    use_lsh: bool = attr.ib(default=False, validator=attr.validators.instance_of(bool))
+    scheduling_weight: int = attr.ib(
+        default=1, validator=attr.validators.instance_of(int)
+    )
 
     # TODO Implement this
     # Catches 5 people saying the same thing
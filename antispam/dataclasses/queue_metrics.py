@@ -0,0 +1,143 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import attr
+
+from antispam.dataclasses.histogram import Histogram
+from antispam.dataclasses.latency_histogram import LatencyHistogram
+
+if TYPE_CHECKING:  # pragma: no cover
+    from antispam.metrics import MetricsRegistry
+
+DEPTH_BOUNDS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+@attr.s(slots=True)
+class GuildQueueMetrics:
+    """
+    How long a single guilds submitted messages have taken
+
+    Parameters
+    ----------
+    submitted : int
+        How many messages have been submitted
+    processed : int
+        How many messages workers have propagated
+    wait_seconds : float
+        How long messages waited before a worker started on them in total
+    max_wait_seconds : float
+        The longest a single message waited
+    propagate_seconds : float
+        How long propagating messages took in total
+    """
+
+    submitted: int = attr.ib(default=0)
+    processed: int = attr.ib(default=0)
+    wait_seconds: float = attr.ib(default=0.0)
+    max_wait_seconds: float = attr.ib(default=0.0)
+    propagate_seconds: float = attr.ib(default=0.0)
+
+
+@attr.s(slots=True)
+class QueueMetrics:
+    """
+    How messages submitted with
+    :py:meth:`antispam.AntiSpamHandler.submit` have been handled
+
+    Parameters
+    ----------
+    submitted : int
+        How many messages have been submitted
+    processed : int
+        How many messages workers have propagated
+    dropped : int
+        How many messages were dropped to make space
+        under :py:attr:`OverflowPolicy.DROP_OLDEST`
+    skipped_plugins : int
+        How many messages were propagated without after invoke
+        plugins under :py:attr:`OverflowPolicy.SKIP_PLUGINS`
+    depth : Histogram
+        How many messages were already waiting in
+        the queue a message was submitted to
+    wait_seconds : LatencyHistogram
+        How long messages waited before a worker started on them
+    guilds : Dict[Optional[int], GuildQueueMetrics]
+        The same accounting for each guild,
+        direct messages are under ``None``
+    """
+
+    submitted: int = attr.ib(default=0)
+    processed: int = attr.ib(default=0)
+    dropped: int = attr.ib(default=0)
+    skipped_plugins: int = attr.ib(default=0)
+    depth: Histogram = attr.ib(factory=lambda: Histogram(DEPTH_BOUNDS))
+    wait_seconds: LatencyHistogram = attr.ib(factory=LatencyHistogram)
+    guilds: Dict[Optional[int], GuildQueueMetrics] = attr.ib(factory=dict)
+
+    def register_metrics(self, registry: "MetricsRegistry") -> None:
+        """Render these on ``registry``, read from here whenever it is rendered."""
+        for attribute, documentation in (
+            ("submitted", "Messages submitted to the ingestion queue"),
+            ("processed", "Submitted messages propagated by a worker"),
+            ("dropped", "Submitted messages dropped to make space"),
+            ("skipped_plugins", "Submitted messages propagated without plugins"),
+        ):
+            registry.counter(
+                f"antispam_queue_{attribute}",
+                documentation,
+                function=lambda attribute=attribute: {(): getattr(self, attribute)},
+            )
+
+        registry.histogram(
+            "antispam_queue_depth",
+            "Messages already waiting in the queue a message was submitted to",
+            function=lambda: {(): self.depth},
+        )
+        registry.summary(
+            "antispam_queue_wait_seconds",
+            "How long submitted messages waited for a worker",
+            function=lambda: {(): self.wait_seconds},
+        )
+
+        def guilds(attribute: str) -> Dict[Tuple[str, ...], float]:
+            values: Dict[Tuple[str, ...], float] = {}
+            for guild_id, guild in self.guilds.items():
+                # Direct messages have no guild
+                label = ("dm" if guild_id is None else registry.guild_label(guild_id),)
+                values[label] = values.get(label, 0) + getattr(guild, attribute)
+
+            return values
+
+        for attribute, documentation in (
+            ("submitted", "Messages submitted to the ingestion queue, by guild"),
+            ("processed", "Submitted messages propagated by a worker, by guild"),
+            ("wait_seconds", "Time submitted messages waited for a worker, by guild"),
+            ("propagate_seconds", "Time workers spent propagating, by guild"),
+        ):
+            registry.counter(
+                f"antispam_queue_guild_{attribute}",
+                documentation,
+                ("guild",),
+                function=lambda attribute=attribute: guilds(attribute),
+            )
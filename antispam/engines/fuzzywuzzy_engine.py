@@ -0,0 +1,46 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+from fuzzywuzzy import fuzz
+
+from antispam.abc import SimilarityEngine
+
+
+class FuzzyWuzzyEngine(SimilarityEngine):
+    """
+    The original ``fuzzywuzzy.fuzz.token_sort_ratio`` based engine.
+
+    This is kept as a reference implementation, it will
+    always produce the same scores as previous versions
+    of this package. It does not take advantage of
+    ``score_cutoff`` to exit early.
+    """
+
+    def process(self, content: str) -> str:
+        # noinspection PyProtectedMember
+        return fuzz._process_and_sort(content, force_ascii=True, full_process=True)
+
+    def compare(self, first: str, second: str, score_cutoff: float = 0) -> float:
+        return fuzz.ratio(first, second)
+
+    def ratio(self, first: str, second: str, score_cutoff: float = 0) -> float:
+        return fuzz.token_sort_ratio(first, second)
@@ -0,0 +1,85 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+from typing import Set, Tuple
+
+# MinHash signatures over character shingles, used to find
+# candidate near duplicates without comparing every pair.
+#
+# This uses one permutation hashing, every shingle is hashed
+# once and placed in a bin, keeping the minimum per bin. Bins
+# are then grouped into bands and two messages sharing any
+# band key are likely to be similar, so are worth scoring.
+#
+# These rely on ``hash`` and as such are only stable within
+# a single process, they are never persisted.
+
+SHINGLE_SIZE = 3
+BANDS = 16
+ROWS_PER_BAND = 4
+BINS = BANDS * ROWS_PER_BAND
+
+_EMPTY_BIN = -1
+_MASK = (1 << 64) - 1
+
+
+def shingle(content: str, size: int = SHINGLE_SIZE) -> Set[int]:
+    """Returns the hashed character shingles for some content."""
+    if len(content) <= size:
+        return {hash(content) & _MASK} if content else set()
+
+    return {hash(content[i : i + size]) & _MASK for i in range(len(content) - size + 1)}
+
+
+def minhash_signature(content: str) -> Tuple[int, ...]:
+    """
+    Returns the MinHash signature for some content,
+    or an empty tuple if there is nothing to hash.
+    """
+    hashes = shingle(content)
+    if not hashes:
+        return ()
+
+    signature = [_EMPTY_BIN] * BINS
+    for value in hashes:
+        index = value % BINS
+        value //= BINS
+        if signature[index] == _EMPTY_BIN or value < signature[index]:
+            signature[index] = value
+
+    return tuple(signature)
+
+
+def band_keys(signature: Tuple[int, ...]) -> Tuple[int, ...]:
+    """
+    Splits a signature into one bucket key per band.
+
+    Bands without any shingles in them are skipped, otherwise
+    all short messages would share those buckets.
+    """
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND : (band + 1) * ROWS_PER_BAND]
+        if rows and any(row != _EMPTY_BIN for row in rows):
+            keys.append(hash((band, rows)))
+
+    return tuple(keys)
@@ -0,0 +1,57 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+from rapidfuzz import fuzz, utils
+
+from antispam.abc import SimilarityEngine
+
+
+class RapidFuzzEngine(SimilarityEngine):
+    """
+    The default similarity engine, backed by ``rapidfuzz``.
+
+    Scores are equivalent to ``token_sort_ratio``, however,
+    pairs which cannot possibly reach ``score_cutoff`` based
+    on their lengths alone are rejected before any scoring
+    happens, and scoring itself is allowed to exit early.
+
+    Notes
+    -----
+    Scores are returned as floats rather then being
+    rounded like ``fuzzywuzzy`` does, so results that
+    sit right on ``message_duplicate_accuracy`` can differ
+    from :py:class:`antispam.engines.FuzzyWuzzyEngine`.
+    """
+
+    def process(self, content: str) -> str:
+        return " ".join(sorted(utils.default_process(content).split()))
+
+    def compare(self, first: str, second: str, score_cutoff: float = 0) -> float:
+        total_length = len(first) + len(second)
+        if total_length and score_cutoff:
+            # The best possible outcome is the shorter
+            # string being entirely contained in the longer one
+            upper_bound = 200 * min(len(first), len(second)) / total_length
+            if upper_bound < score_cutoff:
+                return 0
+
+        return fuzz.ratio(first, second, score_cutoff=score_cutoff)
@@ -0,0 +1,170 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+import sys
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+def _entry_size() -> int:
+    """A rough estimate of the memory used per cached score."""
+    digest = bytes(16)
+    key = (digest, digest)
+    value = (100.0, 100)
+    # The OrderedDict has both a hash table slot and a linked list node per entry
+    return (
+        sys.getsizeof(key)
+        + 2 * sys.getsizeof(digest)
+        + sys.getsizeof(value)
+        + sys.getsizeof(value[0])
+        + 100
+    )
+
+
+class ScoreCache:
+    """
+    A bounded least recently used cache of similarity scores,
+    keyed by the pair of :py:attr:`ProcessedContent.digest` compared.
+
+    During raids the same few messages get compared over and
+    over again, this means each pair only gets scored once.
+
+    Notes
+    -----
+    Scores depend on the :py:class:`SimilarityEngine` used,
+    so a cache should only ever be used with one engine.
+    """
+
+    __slots__ = ("max_entries", "hits", "misses", "evictions", "_scores")
+
+    ENTRY_SIZE: int = _entry_size()
+
+    def __init__(self, *, max_bytes: int = 8 * 1024 * 1024):
+        """
+        Parameters
+        ----------
+        max_bytes : int
+            Roughly how much memory this cache can use before
+            evicting the least recently used scores.
+
+            Set to ``0`` to disable caching.
+
+            Defaults to 8MB
+        """
+        if max_bytes < 0:
+            raise ValueError("Expected `max_bytes` to not be negative")
+
+        self.max_entries: int = max_bytes // self.ENTRY_SIZE
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        # (digest, digest) -> (score, score_cutoff)
+        self._scores: OrderedDict[
+            Tuple[bytes, bytes], Tuple[float, float]
+        ] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    @staticmethod
+    def _key(first: bytes, second: bytes) -> Tuple[bytes, bytes]:
+        # Scores are symmetric, so store each pair once
+        return (first, second) if first <= second else (second, first)
+
+    def get(self, first: bytes, second: bytes, score_cutoff: float) -> Optional[float]:
+        """
+        Returns the cached score between two digests.
+
+        Parameters
+        ----------
+        first : bytes
+            The digest of the first content
+        second : bytes
+            The digest of the second content
+        score_cutoff : float
+            The cutoff this score is needed for
+
+        Returns
+        -------
+        Optional[float]
+            The score, or ``None`` if it is not cached.
+        """
+        key = self._key(first, second)
+        score = self._lookup(key, score_cutoff)
+        if score is None:
+            self.misses += 1
+            return None
+
+        self._scores.move_to_end(key)
+        self.hits += 1
+        return score
+
+    def peek(self, first: bytes, second: bytes, score_cutoff: float) -> Optional[float]:
+        """
+        The same as :py:meth:`get`, without
+        updating the counters or recency.
+        """
+        return self._lookup(self._key(first, second), score_cutoff)
+
+    def _lookup(self, key: Tuple[bytes, bytes], score_cutoff: float) -> Optional[float]:
+        entry = self._scores.get(key)
+        if entry is None:
+            return None
+
+        score, cached_cutoff = entry
+        # A score of 0 only means it was below the cutoff it was made
+        # with, so is only useful if this cutoff is at least as high
+        if score or score_cutoff >= cached_cutoff:
+            return score
+
+        return None
+
+    def set(
+        self, first: bytes, second: bytes, score_cutoff: float, score: float
+    ) -> None:
+        """
+        Caches the score between two digests.
+
+        Parameters
+        ----------
+        first : bytes
+            The digest of the first content
+        second : bytes
+            The digest of the second content
+        score_cutoff : float
+            The cutoff this score was made with
+        score : float
+            The score
+        """
+        if not self.max_entries:
+            return
+
+        key = self._key(first, second)
+        self._scores[key] = (score, score_cutoff)
+        self._scores.move_to_end(key)
+        if len(self._scores) > self.max_entries:
+            self._scores.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Removes every cached score, keeping the counters."""
+        self._scores.clear()
@@ -0,0 +1,120 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+from functools import lru_cache
+from hashlib import blake2b
+from itertools import combinations
+from typing import Tuple
+
+# 64 bit SimHash fingerprints over character shingles, where
+# near identical content ends up only a few bits apart.
+#
+# Rather then summing 64 weights per shingle, every shingle hash
+# is spread into 64 lanes of a single large int once (and cached)
+# so building a fingerprint is a handful of int additions.
+#
+# Unlike the MinHash signatures these use blake2b, so they
+# are stable between processes.
+
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 4
+BLOCKS = 4
+BLOCK_BITS = FINGERPRINT_BITS // BLOCKS
+
+_BLOCK_MASK = (1 << BLOCK_BITS) - 1
+
+_LANE_BITS = 16
+_LANE_MASK = (1 << _LANE_BITS) - 1
+
+
+@lru_cache(maxsize=65536)
+def _spread_shingle(shingle: str) -> int:
+    value = int.from_bytes(
+        blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+    spread = 0
+    for bit in range(FINGERPRINT_BITS):
+        if value >> bit & 1:
+            spread |= 1 << (bit * _LANE_BITS)
+
+    return spread
+
+
+def simhash(content: str, size: int = SHINGLE_SIZE) -> int:
+    """Returns the 64 bit SimHash fingerprint for some content."""
+    if len(content) <= size:
+        shingles = {content} if content else set()
+    else:
+        shingles = {content[i : i + size] for i in range(len(content) - size + 1)}
+
+    if not shingles:
+        return 0
+
+    # Each lane counts up to _LANE_MASK shingles, so longer
+    # content is summed in chunks which fit before being added up
+    shingles = list(shingles)
+    counts = [0] * FINGERPRINT_BITS
+    for start in range(0, len(shingles), _LANE_MASK):
+        total = 0
+        for shingle in shingles[start : start + _LANE_MASK]:
+            total += _spread_shingle(shingle)
+
+        for bit in range(FINGERPRINT_BITS):
+            counts[bit] += total >> (bit * _LANE_BITS) & _LANE_MASK
+
+    # A bit is set when the majority of shingles had it set
+    threshold = len(shingles) / 2
+    fingerprint = 0
+    for bit, count in enumerate(counts):
+        if count > threshold:
+            fingerprint |= 1 << bit
+
+    return fingerprint
+
+
+def hamming_distance(first: int, second: int) -> int:
+    """Returns how many bits differ between two fingerprints."""
+    return bin(first ^ second).count("1")
+
+
+def block_values(fingerprint: int) -> Tuple[int, ...]:
+    """Splits a fingerprint into :py:data:`BLOCKS` equally sized blocks."""
+    return tuple(
+        fingerprint >> (block * BLOCK_BITS) & _BLOCK_MASK for block in range(BLOCKS)
+    )
+
+
+@lru_cache(maxsize=None)
+def flip_masks(radius: int) -> Tuple[int, ...]:
+    """
+    Returns every mask which flips at most ``radius`` bits of a block.
+
+    Two fingerprints within ``distance`` bits of each other must
+    differ by at most ``distance // BLOCKS`` bits in one of their
+    blocks, so looking up each block xor'd with these
+    finds every possible match.
+    """
+    return tuple(
+        sum(1 << bit for bit in bits)
+        for size in range(radius + 1)
+        for bits in combinations(range(BLOCK_BITS), size)
+    )
@@ -22,4 +22,5 @@ DEALINGS IN THE SOFTWARE.
 """
 from antispam.enums.ignored_types import IgnoreType
 from antispam.enums.library import Library
+from antispam.enums.overflow_policy import OverflowPolicy
 from antispam.enums.reset_type import ResetType
@@ -0,0 +1,42 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+from enum import Enum
+
+
+class OverflowPolicy(Enum):
+    """
+    This enum should be used with the following methods:
+
+    - :py:meth:`antispam.AntiSpamHandler.start`
+
+    It decides what happens when a message is submitted
+    while the queue it belongs to is already full.
+    """
+
+    #: Wait for space in the queue before returning
+    BLOCK = 0
+    #: Drop the oldest waiting message to make space
+    DROP_OLDEST = 1
+    #: Wait for space like ``BLOCK``, and skip after invoke
+    #: plugins while the queue is backed up to catch up faster
+    SKIP_PLUGINS = 2
@@ -85,28 +85,12 @@ class FactoryBuilder:
 
     @staticmethod
     def clean_old_messages(member: Member, current_time, options):
-        def _is_still_valid(message_obj):
-            """
-            Given a message, figure out if it hasn't
-            expired yet based on timestamps
-            """
-            difference = current_time - message_obj.creation_time
-            offset = datetime.timedelta(milliseconds=options.message_interval)
-
-            if difference >= offset:
-                return False
-            return True
-
-        current_messages = []
-        outstanding_messages = []
-
-        for message in member.messages:
-            if _is_still_valid(message):
-                current_messages.append(message)
-            else:
-                outstanding_messages.append(message)
-
-        member.messages = current_messages
+        # Stored messages aren't guaranteed to be in order,
+        # which expire_messages relies on
+        member.messages.sort(key=lambda message: message.creation_time)
+        member.expire_messages(
+            current_time - datetime.timedelta(milliseconds=options.message_interval)
+        )
 
     @staticmethod
     async def get_all_members_as_list(cache: Cache, guild_id: int):
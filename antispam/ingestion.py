@@ -0,0 +1,283 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional
+
+import attr
+
+from antispam.abc.cache import get_guild_options
+from antispam.dataclasses import GuildQueueMetrics, QueueMetrics
+from antispam.enums import OverflowPolicy
+from antispam.exceptions import GuildNotFound
+
+if TYPE_CHECKING:  # pragma: no cover
+    from antispam import AntiSpamHandler
+
+log = logging.getLogger(__name__)
+
+
+@attr.s(slots=True)
+class QueueItem:
+    message = attr.ib()
+    future: asyncio.Future = attr.ib()
+    # None for direct messages
+    guild_id: Optional[int] = attr.ib()
+    weight: int = attr.ib()
+    submitted_at: float = attr.ib(factory=time.perf_counter)
+
+
+class FairQueue(asyncio.Queue):
+    """
+    A queue which serves guilds fairly using deficit round robin.
+
+    Every guild with messages waiting gets its own first in
+    first out queue, and guilds take turns being served. Each
+    turn a guild is served as many messages as its weight.
+    """
+
+    def _init(self, maxsize: int) -> None:
+        # Guild id -> waiting items, in the order guilds take turns
+        self._queue: "OrderedDict[Optional[int], Deque[QueueItem]]" = OrderedDict()
+        # How many more messages a guild can be served this turn
+        self._deficits: Dict[Optional[int], int] = {}
+        self._weights: Dict[Optional[int], int] = {}
+        self._size: int = 0
+
+    def qsize(self) -> int:
+        return self._size
+
+    def weight_of(self, guild_id: Optional[int]) -> Optional[int]:
+        """The weight of a guild with messages waiting, otherwise ``None``"""
+        return self._weights.get(guild_id)
+
+    def _put(self, item: QueueItem) -> None:
+        waiting = self._queue.get(item.guild_id)
+        if waiting is None:
+            waiting = self._queue[item.guild_id] = deque()
+            self._deficits[item.guild_id] = 0
+
+        self._weights[item.guild_id] = max(item.weight, 1)
+        waiting.append(item)
+        self._size += 1
+
+    def _get(self) -> QueueItem:
+        guild_id, waiting = next(iter(self._queue.items()))
+        # A guild starting its turn gets its weight to spend
+        deficit = self._deficits[guild_id] or self._weights[guild_id]
+        self._deficits[guild_id] = deficit - 1
+        item = self._pop(guild_id, waiting)
+        if guild_id in self._queue and not self._deficits[guild_id]:
+            self._queue.move_to_end(guild_id)
+
+        return item
+
+    def drop_oldest(self) -> QueueItem:
+        """
+        Removes the oldest message from the guild with the most
+        messages waiting, so a busy guild only ever drops its own.
+        """
+        guild_id = max(self._queue, key=lambda key: len(self._queue[key]))
+        return self._pop(guild_id, self._queue[guild_id])
+
+    def _pop(self, guild_id: Optional[int], waiting: Deque[QueueItem]) -> QueueItem:
+        item = waiting.popleft()
+        self._size -= 1
+        if not waiting:
+            del self._queue[guild_id]
+            del self._deficits[guild_id]
+            del self._weights[guild_id]
+
+        return item
+
+
+class IngestionQueue:
+    """
+    Bounded queues of messages waiting to be propagated,
+    each drained by its own worker.
+
+    Messages are partitioned across workers by their author,
+    so messages from the same member are always propagated
+    in the order they were submitted. Within each queue
+    guilds are served fairly, see :py:class:`FairQueue`
+
+    You shouldn't need to create this yourself,
+    see :py:meth:`antispam.AntiSpamHandler.start`
+    """
+
+    __slots__ = (
+        "handler",
+        "overflow_policy",
+        "metrics",
+        "_queues",
+        "_workers",
+        "_backed_up_depth",
+    )
+
+    def __init__(
+        self,
+        handler: "AntiSpamHandler",
+        *,
+        workers: int,
+        max_queue_size: int,
+        overflow_policy: OverflowPolicy,
+    ):
+        if workers < 1:
+            raise ValueError("Expected `workers` to be at least 1")
+
+        if max_queue_size < 1:
+            raise ValueError("Expected `max_queue_size` to be at least 1")
+
+        if not isinstance(overflow_policy, OverflowPolicy):
+            raise ValueError("Expected `overflow_policy` of type OverflowPolicy")
+
+        self.handler: "AntiSpamHandler" = handler
+        self.overflow_policy: OverflowPolicy = overflow_policy
+        self.metrics: QueueMetrics = QueueMetrics()
+        self._queues: List[FairQueue] = [
+            FairQueue(maxsize=max_queue_size) for _ in range(workers)
+        ]
+        self._workers: List[asyncio.Task] = []
+        # A queue at least half full is considered backed up
+        self._backed_up_depth: int = max(max_queue_size // 2, 1)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self) -> None:
+        self._workers = [
+            asyncio.create_task(self._work(queue)) for queue in self._queues
+        ]
+
+    async def stop(self, *, drain: bool = True) -> None:
+        if drain:
+            await asyncio.gather(*(queue.join() for queue in self._queues))
+
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        # Anything left was never going to be propagated
+        for queue in self._queues:
+            while not queue.empty():
+                queue.get_nowait().future.cancel()
+                queue.task_done()
+
+    async def submit(self, message) -> asyncio.Future:
+        lib_handler = self.handler.lib_handler
+        guild_id: Optional[int] = (
+            None
+            if lib_handler.is_dm(message)
+            else await lib_handler.get_guild_id(message)
+        )
+        queue = self._queues[hash(message.author.id) % len(self._queues)]
+        weight = queue.weight_of(guild_id)
+        if weight is None:
+            # Only looked up as a guild starts having messages waiting
+            weight = await self._get_weight(guild_id)
+
+        self.metrics.submitted += 1
+        self.metrics.depth.observe(queue.qsize())
+        self._guild_metrics(guild_id).submitted += 1
+
+        future = asyncio.get_running_loop().create_future()
+        if self.overflow_policy is OverflowPolicy.DROP_OLDEST and queue.full():
+            queue.drop_oldest().future.cancel()
+            queue.task_done()
+            self.metrics.dropped += 1
+            log.debug("Dropped the oldest queued message to make space")
+
+        await queue.put(QueueItem(message, future, guild_id, weight))
+        return future
+
+    async def _get_weight(self, guild_id: Optional[int]) -> int:
+        if guild_id is None:
+            return self.handler.options.scheduling_weight
+
+        try:
+            options = await get_guild_options(self.handler.cache, guild_id)
+        except GuildNotFound:
+            return self.handler.options.scheduling_weight
+
+        return options.scheduling_weight
+
+    def _guild_metrics(self, guild_id: Optional[int]) -> GuildQueueMetrics:
+        guild_metrics = self.metrics.guilds.get(guild_id)
+        if guild_metrics is None:
+            guild_metrics = self.metrics.guilds[guild_id] = GuildQueueMetrics()
+
+        return guild_metrics
+
+    async def _work(self, queue: FairQueue) -> None:
+        while True:
+            item: QueueItem = await queue.get()
+            future = item.future
+            try:
+                if future.cancelled():
+                    # Nobody is waiting on this anymore
+                    continue
+
+                started_at = time.perf_counter()
+                waited = started_at - item.submitted_at
+                self.metrics.wait_seconds.record(waited)
+                guild_metrics = self._guild_metrics(item.guild_id)
+                guild_metrics.wait_seconds += waited
+                guild_metrics.max_wait_seconds = max(
+                    guild_metrics.max_wait_seconds, waited
+                )
+
+                skip_plugins: bool = (
+                    self.overflow_policy is OverflowPolicy.SKIP_PLUGINS
+                    and queue.qsize() >= self._backed_up_depth
+                )
+                if skip_plugins:
+                    self.metrics.skipped_plugins += 1
+
+                try:
+                    result = await self.handler._propagate(
+                        item.message,
+                        core=self.handler.core,
+                        cache=self.handler.cache,
+                        skip_plugins=skip_plugins,
+                    )
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+
+                self.metrics.processed += 1
+                guild_metrics.processed += 1
+                guild_metrics.propagate_seconds += time.perf_counter() - started_at
+            finally:
+                if not future.done():
+                    # The worker was stopped part way through
+                    future.cancel()
+
+                queue.task_done()
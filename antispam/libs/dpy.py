@@ -49,6 +49,8 @@ log = logging.getLogger(__name__)
 
 
 class DPY(Base, Lib):
+    supports_propagate_data = True
+
     def __init__(self, handler):
         self.handler = handler
         self.bot = self.handler.bot
@@ -198,13 +200,16 @@ class DPY(Base, Lib):
                 .replace("uFEFF", "")
             )
 
-        return Message(
+        created_message = Message(
             id=message.id,
             channel_id=message.channel.id,
             guild_id=message.guild.id,
             author_id=message.author.id,
             content=content,
         )
+        # Built once here rather then on every comparison
+        created_message.get_processed_content(self.handler.similarity_engine)
+        return created_message
 
     async def send_guild_log(
         self,
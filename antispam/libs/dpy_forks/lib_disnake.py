@@ -35,6 +35,10 @@ log = logging.getLogger(__name__)
 
 # noinspection DuplicatedCode
 class Disnake(BaseFork):
+    # check_message_can_be_propagated is
+    # overridden for the disnake namespace
+    supports_propagate_data = False
+
     async def timeout_member(
         self, member: disnake.Member, original_message, until: datetime.timedelta
     ) -> None:
@@ -57,6 +57,8 @@ log = logging.getLogger(__name__)
 
 
 class Hikari(Base, Lib):
+    supports_propagate_data = True
+
     def __init__(self, handler: AntiSpamHandler):
         self.handler = handler
 
@@ -215,13 +217,16 @@ class Hikari(Base, Lib):
                 .replace("uFEFF", "")
             )
 
-        return Message(
+        created_message = Message(
             id=message.id,
             channel_id=message.channel_id,
             guild_id=message.guild_id,
             author_id=message.author.id,
             content=content,
         )
+        # Built once here rather then on every comparison
+        created_message.get_processed_content(self.handler.similarity_engine)
+        return created_message
 
     async def send_guild_log(
         self,
@@ -2,6 +2,7 @@ import logging
 
 from antispam.libs.shared.substitute_args import SubstituteArgs  # isort: skip
 from antispam.libs.shared.base import Base
+from antispam.libs.shared.propagation_filter import PropagationFilter
 from antispam.libs.shared.timed_cache import TimedCache
 
 __all__ = ("SubstituteArgs", "Base", "TimedCache")
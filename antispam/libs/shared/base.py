@@ -8,8 +8,13 @@ from typing import Dict, Union, TYPE_CHECKING, Optional, cast, List
 from unittest.mock import AsyncMock
 
 from antispam import PropagateFailure, GuildNotFound
+from antispam.abc.cache import get_guild_options
 from antispam.dataclasses.propagate_data import PropagateData
 from antispam.libs.shared import SubstituteArgs
+from antispam.libs.shared.propagation_filter import (
+    PropagationFilter,
+    watch_ignored_sets,
+)
 
 if TYPE_CHECKING:
     from antispam import AntiSpamHandler
@@ -20,6 +25,13 @@ log = logging.getLogger(__name__)
 class Base:
     """A base Library feature class which implements shared functionality."""
 
+    #: Whether :py:meth:`get_propagate_data` runs the same checks as
+    #: ``check_message_can_be_propagated``, so the handler can call it
+    #: rather then raising and catching ``PropagateFailure`` for every
+    #: ignored message. Subclasses which override
+    #: ``check_message_can_be_propagated`` should leave this ``False``.
+    supports_propagate_data: bool = False
+
     def __init__(self, handler: AntiSpamHandler):
         self.handler = handler
 
@@ -412,13 +424,32 @@ class Base:
         return await self.transform_message(content, message, warn_count, kick_count)
 
     async def check_message_can_be_propagated(self, message) -> PropagateData:
+        propagate_data = await self.get_propagate_data(message)
+        if not isinstance(propagate_data, PropagateData):
+            raise PropagateFailure(data=propagate_data)
+
+        return propagate_data
+
+    async def get_propagate_data(self, message) -> Union[PropagateData, Dict[str, str]]:
+        """The same as ``check_message_can_be_propagated``,
+        however returns what ``propagate`` should return
+        rather then raising ``PropagateFailure``
+
+        Parameters
+        ----------
+        message
+            Your libraries message object
+
+        Returns
+        -------
+        Union[PropagateData, Dict[str, str]]
+            ``PropagateData`` if the message should be propagated
+        """
         message_type = self.get_expected_message_type()
         if not isinstance(message, (message_type, AsyncMock)):
-            raise PropagateFailure(
-                data={
-                    "status": f"Expected message of type {message_type.__class__.__name__}"
-                }
-            )
+            return {
+                "status": f"Expected message of type {message_type.__class__.__name__}"
+            }
 
         guild_id = self.get_guild_id_from_message(message)
         author_id = self.get_author_id_from_message(message)
@@ -431,76 +462,68 @@ class Base:
                 message_id,
                 author_id,
             )
-            raise PropagateFailure(data={"status": "Ignoring messages from dm's"})
+            return {"status": "Ignoring messages from dm's"}
 
-        channel_id = self.get_channel_id_from_message(message)
-        author_name = self.get_author_name_from_message(message)
         bot_id = self.get_bot_id_from_message(message)
-        is_bot_message = self.check_if_message_is_from_a_bot(message)
         guild_id = cast(int, guild_id)
 
         # The bot is immune to spam
         if author_id == bot_id:
             log.debug("Message(id=%s) was from myself", message_id)
-            raise PropagateFailure(
-                data={"status": "Ignoring messages from myself (the bot)"}
-            )
+            return {"status": "Ignoring messages from myself (the bot)"}
+
+        propagation_filter = await self.get_propagation_filter(guild_id)
+        ignored = propagation_filter.check(
+            author_id=author_id,
+            channel_id=self.get_channel_id_from_message(message),
+            is_bot=self.check_if_message_is_from_a_bot(message),
+            role_ids=self.get_role_ids_for_message_author(message)
+            if propagation_filter.has_ignored_roles
+            else (),
+        )
+        if ignored is not None:
+            log.debug("Message(id=%s) is ignored: %s", message_id, ignored["status"])
+            return ignored
 
-        try:
-            guild_options = await self.handler.get_guild_options(guild_id)
-        except GuildNotFound:
-            from antispam import Options
+        has_perms = await self.does_author_have_kick_and_ban_perms(message)
 
-            guild_options = Options()
+        return PropagateData(
+            guild_id=guild_id,
+            member_name=self.get_author_name_from_message(message),
+            member_id=author_id,
+            has_perms_to_make_guild=has_perms,
+        )
 
-        # Return if ignored bot
-        if (
-            self.handler.options.ignore_bots or guild_options.ignore_bots
-        ) and is_bot_message:
-            log.debug(
-                "I ignore bots, and this is a bot message with author(id=%s)",
-                author_id,
-            )
-            raise PropagateFailure(data={"status": "Ignoring messages from bots"})
+    async def get_propagation_filter(self, guild_id: int) -> PropagationFilter:
+        """Returns the ignore rules for a guild,
+        only building them if they aren't already cached
 
-        # Return if ignored guild
-        if guild_id in self.handler.options.ignored_guilds:
-            log.debug("Ignored Guild(id=%s)", guild_id)
-            raise PropagateFailure(data={"status": f"Ignoring this guild: {guild_id}"})
+        Parameters
+        ----------
+        guild_id : int
+            The guild to get ignore rules for
 
-        # Return if ignored member
+        Returns
+        -------
+        PropagationFilter
+            The merged ignore rules for this guild
+        """
+        propagation_filters = self.handler.propagation_filters
+        propagation_filter = propagation_filters.get(guild_id)
         if (
-            author_id in self.handler.options.ignored_members
-            or author_id in guild_options.ignored_members
+            propagation_filter is None
+            or propagation_filter.options is not self.handler.options
         ):
-            log.debug("The Member(id=%s) who sent this message is ignored", author_id)
-            raise PropagateFailure(
-                data={"status": f"Ignoring this member: {author_id}"}
+            try:
+                guild_options = await get_guild_options(self.handler.cache, guild_id)
+            except GuildNotFound:
+                guild_options = None
+
+            # So changing them in place drops what is compiled from them
+            watch_ignored_sets(self.handler.options, propagation_filters)
+            propagation_filter = PropagationFilter.from_options(
+                guild_id, self.handler.options, guild_options
             )
+            propagation_filters[guild_id] = propagation_filter
 
-        # Return if ignored channel
-        if channel_id in self.handler.options.ignored_channels:
-            log.debug("channel(id=%s) is ignored", channel_id)
-            raise PropagateFailure(
-                data={"status": f"Ignoring this channel: {channel_id}"}
-            )
-
-        # Return if member has an ignored role
-        user_roles = self.get_role_ids_for_message_author(message)
-        for item in user_roles:
-            if item in self.handler.options.ignored_roles:
-                log.debug(
-                    "Ignoring Member(id=%s) as they have an ignored Role(id%s)",
-                    author_id,
-                    item,
-                )
-                raise PropagateFailure(data={"status": f"Ignoring this role: {item}"})
-
-        has_perms = await self.does_author_have_kick_and_ban_perms(message)
-
-        return PropagateData(
-            guild_id=guild_id,
-            member_name=author_name,
-            member_id=author_id,
-            has_perms_to_make_guild=has_perms,
-        )
+        return propagation_filter
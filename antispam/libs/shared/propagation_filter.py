@@ -0,0 +1,239 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterable, Optional
+
+import attr
+
+if TYPE_CHECKING:  # pragma: no cover
+    from antispam import Options
+
+
+class WatchedSet(set):
+    """
+    One of the handler wide ignore sets, which drops every
+    compiled :py:class:`PropagationFilter` whenever it is
+    changed in place, the same as ``add_ignored_item`` does.
+
+    Copies are plain sets.
+    """
+
+    __slots__ = ("_filters",)
+
+    def __init__(self, items: Iterable[int], filters: Dict[int, "PropagationFilter"]):
+        super().__init__(items)
+        self._filters: Dict[int, PropagationFilter] = filters
+
+    def __reduce__(self):
+        return set, (list(self),)
+
+    def add(self, item) -> None:
+        super().add(item)
+        self._filters.clear()
+
+    def discard(self, item) -> None:
+        super().discard(item)
+        self._filters.clear()
+
+    def remove(self, item) -> None:
+        super().remove(item)
+        self._filters.clear()
+
+    def pop(self):
+        item = super().pop()
+        self._filters.clear()
+        return item
+
+    def clear(self) -> None:
+        super().clear()
+        self._filters.clear()
+
+    def update(self, *others) -> None:
+        super().update(*others)
+        self._filters.clear()
+
+    def difference_update(self, *others) -> None:
+        super().difference_update(*others)
+        self._filters.clear()
+
+    def intersection_update(self, *others) -> None:
+        super().intersection_update(*others)
+        self._filters.clear()
+
+    def symmetric_difference_update(self, other) -> None:
+        super().symmetric_difference_update(other)
+        self._filters.clear()
+
+    def __ior__(self, other):
+        result = super().__ior__(other)
+        self._filters.clear()
+        return result
+
+    def __iand__(self, other):
+        result = super().__iand__(other)
+        self._filters.clear()
+        return result
+
+    def __isub__(self, other):
+        result = super().__isub__(other)
+        self._filters.clear()
+        return result
+
+    def __ixor__(self, other):
+        result = super().__ixor__(other)
+        self._filters.clear()
+        return result
+
+
+def watch_ignored_sets(
+    options: "Options", filters: Dict[int, "PropagationFilter"]
+) -> None:
+    """
+    Replaces the ignore sets on ``options`` with :py:class:`WatchedSet`,
+    so changing them in place drops the filters compiled from them.
+
+    Parameters
+    ----------
+    options : Options
+        The handler wide options
+    filters : Dict[int, PropagationFilter]
+        The compiled filters, ``AntiSpamHandler.propagation_filters``
+    """
+    for name in (
+        "ignored_members",
+        "ignored_channels",
+        "ignored_roles",
+        "ignored_guilds",
+    ):
+        items = getattr(options, name)
+        if not isinstance(items, WatchedSet) or items._filters is not filters:
+            setattr(options, name, WatchedSet(items, filters))
+
+
+@attr.s(slots=True, frozen=True)
+class PropagationFilter:
+    """
+    The ignore rules for a single guild.
+
+    The handler wide ignore sets, and the guilds own ignored
+    members, are compiled into frozensets so checking a message
+    needs no cache lookups. Like before filters were compiled, a
+    guilds own options only add to the ignored members and whether
+    bots are ignored, channels and roles are only ignored handler wide.
+
+    Build these with :py:meth:`PropagationFilter.from_options`
+    """
+
+    guild_id: int = attr.ib()
+    options: "Options" = attr.ib(eq=False)
+    ignore_bots: bool = attr.ib(default=False)
+    ignored_guild: bool = attr.ib(default=False)
+    ignored_members: FrozenSet[int] = attr.ib(default=frozenset())
+    ignored_channels: FrozenSet[int] = attr.ib(default=frozenset())
+    ignored_roles: FrozenSet[int] = attr.ib(default=frozenset())
+
+    @classmethod
+    def from_options(
+        cls,
+        guild_id: int,
+        options: "Options",
+        guild_options: Optional["Options"] = None,
+    ) -> "PropagationFilter":
+        """
+        Parameters
+        ----------
+        guild_id : int
+            The guild this filter is for
+        options : Options
+            The handler wide options
+        guild_options : Optional[Options]
+            The guilds own options, the default
+            options are used if it has none
+        """
+        if guild_options is None:
+            from antispam import Options
+
+            guild_options = Options()
+
+        return cls(
+            guild_id=guild_id,
+            options=options,
+            ignore_bots=guild_options.ignore_bots,
+            ignored_guild=guild_id in options.ignored_guilds,
+            ignored_members=frozenset(options.ignored_members).union(
+                guild_options.ignored_members
+            ),
+            ignored_channels=frozenset(options.ignored_channels),
+            ignored_roles=frozenset(options.ignored_roles),
+        )
+
+    @property
+    def has_ignored_roles(self) -> bool:
+        """If checking a message needs the authors roles"""
+        return bool(self.ignored_roles)
+
+    def check(
+        self,
+        *,
+        author_id: int,
+        channel_id: int,
+        is_bot: bool,
+        role_ids: Iterable[int] = (),
+    ) -> Optional[Dict[str, str]]:
+        """
+        Check a message against the ignore rules.
+
+        Parameters
+        ----------
+        author_id : int
+            Who sent the message
+        channel_id : int
+            Where the message was sent
+        is_bot : bool
+            If the message was sent by a bot
+        role_ids : Iterable[int]
+            The roles the author has
+
+        Returns
+        -------
+        Optional[Dict[str, str]]
+            ``None`` if the message should be propagated, otherwise
+            what :py:meth:`antispam.AntiSpamHandler.propagate` returns
+        """
+        if is_bot and (self.ignore_bots or self.options.ignore_bots):
+            return {"status": "Ignoring messages from bots"}
+
+        if self.ignored_guild:
+            return {"status": f"Ignoring this guild: {self.guild_id}"}
+
+        if author_id in self.ignored_members:
+            return {"status": f"Ignoring this member: {author_id}"}
+
+        if channel_id in self.ignored_channels:
+            return {"status": f"Ignoring this channel: {channel_id}"}
+
+        for role_id in role_ids:
+            # The first of the authors roles which is ignored
+            if role_id in self.ignored_roles:
+                return {"status": f"Ignoring this role: {role_id}"}
+
+        return None
@@ -0,0 +1,149 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+from antispam.dataclasses import LockMetrics
+
+
+class MemberLocks:
+    """
+    Serializes work on the same member, while letting
+    different members be processed at the same time.
+
+    Rather then keeping a lock per member forever, members
+    are striped across a fixed number of locks by their
+    guild and member id. Members which share a lock will
+    wait on each other, so more shards means less
+    contention at the cost of memory.
+    """
+
+    __slots__ = ("shards", "metrics", "_locks")
+
+    def __init__(self, *, shards: int = 256):
+        """
+        Parameters
+        ----------
+        shards : int
+            How many locks members are striped across.
+
+            Defaults to ``256``
+        """
+        if shards < 1:
+            raise ValueError("Expected `shards` to be at least 1")
+
+        self.shards: int = shards
+        self.metrics: LockMetrics = LockMetrics()
+        # Created on first use so they belong to the running event loop
+        self._locks: List[Optional[asyncio.Lock]] = [None] * shards
+
+    def _get_index(self, guild_id: int, member_id: int) -> int:
+        return hash((guild_id, member_id)) % self.shards
+
+    def _get_lock(self, guild_id: int, member_id: int) -> asyncio.Lock:
+        return self._get_lock_at(self._get_index(guild_id, member_id))
+
+    def _get_lock_at(self, index: int) -> asyncio.Lock:
+        lock = self._locks[index]
+        if lock is None:
+            lock = self._locks[index] = asyncio.Lock()
+
+        return lock
+
+    async def _acquire(self, lock: asyncio.Lock) -> None:
+        metrics = self.metrics
+        metrics.acquisitions += 1
+        if not lock.locked():
+            await lock.acquire()
+            return
+
+        metrics.contended_acquisitions += 1
+        metrics.waiting += 1
+        start = time.perf_counter()
+        try:
+            await lock.acquire()
+        finally:
+            metrics.waiting -= 1
+            waited = time.perf_counter() - start
+            metrics.wait_seconds += waited
+            metrics.max_wait_seconds = max(metrics.max_wait_seconds, waited)
+
+    @asynccontextmanager
+    async def hold(self, guild_id: int, member_id: int) -> AsyncIterator[None]:
+        """
+        Hold the lock for a member until the block exits.
+
+        Parameters
+        ----------
+        guild_id : int
+            The guild the member is in
+        member_id : int
+            The member to lock
+
+        Notes
+        -----
+        Locks are not re-entrant, holding the lock for a
+        member again within the block will never finish.
+        """
+        lock = self._get_lock(guild_id, member_id)
+        await self._acquire(lock)
+        try:
+            yield
+        finally:
+            lock.release()
+
+    @asynccontextmanager
+    async def hold_many(
+        self, members: Iterable[Tuple[int, int]]
+    ) -> AsyncIterator[None]:
+        """
+        Hold the locks for several members until the block exits.
+
+        Members which share a lock only acquire it once, and
+        locks are always acquired in the same order so callers
+        holding overlapping members can't deadlock each other.
+
+        Parameters
+        ----------
+        members : Iterable[Tuple[int, int]]
+            The ``(guild_id, member_id)`` of each member to lock
+
+        Notes
+        -----
+        Locks are not re-entrant, holding the lock for any of
+        these members again within the block will never finish.
+        """
+        indexes = sorted({self._get_index(*member) for member in members})
+        acquired: List[asyncio.Lock] = []
+        try:
+            for index in indexes:
+                lock = self._get_lock_at(index)
+                await self._acquire(lock)
+                acquired.append(lock)
+
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
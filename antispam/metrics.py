@@ -0,0 +1,592 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import logging
+import math
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
+
+from antispam.dataclasses import CorePayload, Histogram, LatencyHistogram
+
+if TYPE_CHECKING:  # pragma: no cover
+    from antispam import AntiSpamHandler
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+SECONDS_BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+QUANTILES = (0.5, 0.9, 0.99)
+
+#: A sample's name suffix, its labels and its value
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+
+    return (
+        "{"
+        + ",".join(
+            '{}="{}"'.format(
+                name,
+                str(value)
+                .replace("\\", "\\\\")
+                .replace('"', '\\"')
+                .replace("\n", "\\n"),
+            )
+            for name, value in labels.items()
+        )
+        + "}"
+    )
+
+
+class Metric:
+    """
+    A family of values sharing a name, one for each set of label values.
+
+    Rather then being updated, a metric can be given a ``function``
+    which returns its values whenever it is rendered. This suits
+    values something else already keeps track of.
+    """
+
+    __slots__ = ("name", "documentation", "labels", "_values", "_function")
+
+    type: str = "unknown"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        *,
+        function: Optional[Callable[[], Dict[Tuple[str, ...], object]]] = None,
+    ):
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labels: Tuple[str, ...] = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._function = function
+
+    def _check_labels(self, labels: Tuple[str, ...]) -> None:
+        if len(labels) != len(self.labels):
+            raise ValueError(
+                f"Expected {len(self.labels)} label values for {self.name}, "
+                f"got {len(labels)}"
+            )
+
+    def values(self) -> Dict[Tuple[str, ...], object]:
+        """Label values mapped to the value for them"""
+        if self._function is not None:
+            return self._function()
+
+        return self._values
+
+    def samples(self) -> Iterator[Sample]:
+        """Every sample making up this metric, for rendering"""
+        for label_values, value in self.values().items():
+            yield "", dict(zip(self.labels, label_values)), value
+
+
+class CounterMetric(Metric):
+    """A total which only ever goes up"""
+
+    __slots__ = ()
+
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """
+        Increase the counter for some label values.
+
+        Parameters
+        ----------
+        labels : str
+            A value for each of this metrics labels, in order
+        amount : float
+            How much to increase it by
+
+            Defaults to ``1``
+        """
+        self._check_labels(labels)
+        if amount < 0:
+            raise ValueError("Expected `amount` to not be negative")
+
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[Sample]:
+        for _, labels, value in super().samples():
+            yield "_total", labels, value
+
+
+class GaugeMetric(Metric):
+    """A value which can go up and down"""
+
+    __slots__ = ()
+
+    type = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        """
+        Set the gauge for some label values.
+
+        Parameters
+        ----------
+        value : float
+            The new value
+        labels : str
+            A value for each of this metrics labels, in order
+        """
+        self._check_labels(labels)
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Increase the gauge for some label values, ``amount`` can be negative."""
+        self._check_labels(labels)
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class HistogramMetric(Metric):
+    """Values counted into fixed buckets"""
+
+    __slots__ = ("bounds",)
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        *,
+        bounds: Tuple[float, ...] = SECONDS_BOUNDS,
+        function: Optional[Callable[[], Dict[Tuple[str, ...], Histogram]]] = None,
+    ):
+        super().__init__(name, documentation, labels, function=function)
+        self.bounds: Tuple[float, ...] = tuple(bounds)
+
+    def observe(self, value: float, *labels: str) -> None:
+        """
+        Count a value for some label values.
+
+        Parameters
+        ----------
+        value : float
+            The value to count
+        labels : str
+            A value for each of this metrics labels, in order
+        """
+        self._check_labels(labels)
+        histogram = self._values.get(labels)
+        if histogram is None:
+            histogram = self._values[labels] = Histogram(self.bounds)
+
+        histogram.observe(value)
+
+    def samples(self) -> Iterator[Sample]:
+        for _, labels, histogram in super().samples():
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                yield "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+
+            yield "_bucket", {**labels, "le": "+Inf"}, histogram.count
+            yield "_count", labels, histogram.count
+            yield "_sum", labels, histogram.sum
+
+
+class SummaryMetric(Metric):
+    """Quantiles of durations kept in a :py:class:`LatencyHistogram`"""
+
+    __slots__ = ()
+
+    type = "summary"
+
+    def samples(self) -> Iterator[Sample]:
+        for _, labels, histogram in super().samples():
+            for quantile in QUANTILES:
+                yield "", {
+                    **labels,
+                    "quantile": _format_value(quantile),
+                }, histogram.value_at_percentile(quantile * 100)
+
+            yield "_count", labels, histogram.count
+            yield "_sum", labels, histogram.total / 1_000_000_000
+
+
+class MetricsRegistry:
+    """
+    Holds metrics and renders them in the OpenMetrics
+    text format, which Prometheus can scrape.
+
+    Metrics are labelled by guild up until ``max_guild_labels``
+    different guilds have been seen, after which any other
+    guilds are all counted under the ``other`` guild label.
+    """
+
+    __slots__ = ("max_guild_labels", "_metrics", "_guild_labels")
+
+    def __init__(self, *, max_guild_labels: int = 100):
+        """
+        Parameters
+        ----------
+        max_guild_labels : int
+            How many guilds get their own label.
+
+            Defaults to ``100``
+        """
+        if max_guild_labels < 0:
+            raise ValueError("Expected `max_guild_labels` to not be negative")
+
+        self.max_guild_labels: int = max_guild_labels
+        self._metrics: Dict[str, Metric] = {}
+        self._guild_labels: Set[int] = set()
+
+    def _register(self, cls: Type[Metric], name: str, *args, **kwargs) -> Metric:
+        metric = self._metrics.get(name)
+        if (
+            metric is not None
+            and type(metric) is cls
+            and kwargs.get("function") is None
+            and metric._function is None
+        ):
+            # Share it with anything else updating this metric
+            return metric
+
+        metric = self._metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        *,
+        function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None,
+    ) -> CounterMetric:
+        """
+        Get or create a counter.
+
+        Parameters
+        ----------
+        name : str
+            The name of the counter, without a ``_total`` suffix
+        documentation : str
+            What the counter counts
+        labels : Tuple[str, ...]
+            The names of this counters labels
+        function : Optional[Callable[[], Dict[Tuple[str, ...], float]]]
+            Returns label values mapped to the counters
+            value for them, whenever it is rendered.
+            This replaces any existing counter of the same name.
+
+        Returns
+        -------
+        CounterMetric
+            The counter
+        """
+        return self._register(
+            CounterMetric, name, documentation, labels, function=function
+        )
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        *,
+        function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None,
+    ) -> GaugeMetric:
+        """
+        Get or create a gauge, taking the same arguments as :py:meth:`counter`
+
+        Returns
+        -------
+        GaugeMetric
+            The gauge
+        """
+        return self._register(
+            GaugeMetric, name, documentation, labels, function=function
+        )
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        *,
+        bounds: Tuple[float, ...] = SECONDS_BOUNDS,
+        function: Optional[Callable[[], Dict[Tuple[str, ...], Histogram]]] = None,
+    ) -> HistogramMetric:
+        """
+        Get or create a histogram, taking the same arguments as :py:meth:`counter`
+
+        Parameters
+        ----------
+        bounds : Tuple[float, ...]
+            The inclusive upper bound of each bucket, in ascending order.
+            Ignored when ``function`` is given.
+
+        Returns
+        -------
+        HistogramMetric
+            The histogram
+        """
+        return self._register(
+            HistogramMetric,
+            name,
+            documentation,
+            labels,
+            bounds=bounds,
+            function=function,
+        )
+
+    def summary(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        *,
+        function: Callable[[], Dict[Tuple[str, ...], LatencyHistogram]],
+    ) -> SummaryMetric:
+        """
+        Create a summary of durations someone else records,
+        taking the same arguments as :py:meth:`counter`
+
+        Returns
+        -------
+        SummaryMetric
+            The summary
+        """
+        return self._register(
+            SummaryMetric, name, documentation, labels, function=function
+        )
+
+    def unregister(self, name: str) -> None:
+        """Stop rendering a metric, doing nothing if it doesn't exist."""
+        self._metrics.pop(name, None)
+
+    def guild_label(self, guild_id: int) -> str:
+        """
+        Get the label value to use for a guild.
+
+        Parameters
+        ----------
+        guild_id : int
+            The guild
+
+        Returns
+        -------
+        str
+            The guilds id, or ``other`` once too
+            many guilds have their own label
+        """
+        if guild_id in self._guild_labels:
+            return str(guild_id)
+
+        if len(self._guild_labels) < self.max_guild_labels:
+            self._guild_labels.add(guild_id)
+            return str(guild_id)
+
+        return "other"
+
+    def render(self) -> str:
+        """
+        Render every metric.
+
+        Returns
+        -------
+        str
+            The metrics in the OpenMetrics text format
+        """
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            for suffix, labels, value in metric.samples():
+                lines.append(
+                    f"{metric.name}{suffix}{_format_labels(labels)} "
+                    f"{_format_value(value)}"
+                )
+
+        lines.append("# EOF\n")
+        return "\n".join(lines)
+
+    async def start_server(
+        self, host: str = "127.0.0.1", port: int = 9100
+    ) -> asyncio.AbstractServer:
+        """
+        Serve the rendered metrics over HTTP at ``/metrics``
+
+        Parameters
+        ----------
+        host : str
+            The interface to listen on
+
+            Defaults to ``127.0.0.1``
+        port : int
+            The port to listen on
+
+            Defaults to ``9100``
+
+        Returns
+        -------
+        asyncio.AbstractServer
+            The server, call ``close()`` on it to stop serving
+        """
+        return await asyncio.start_server(self._serve, host, port)
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request = await reader.readline()
+            # Skip the headers, nothing in them changes the response
+            while (await reader.readline()).strip():
+                pass
+
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] in ("GET", "HEAD"):
+                path = parts[1].split("?", 1)[0]
+            else:
+                path = None
+
+            if path == "/metrics":
+                status = "200 OK"
+                body = self.render().encode()
+                content_type = CONTENT_TYPE
+            else:
+                status = "404 Not Found"
+                body = b"Not Found\n"
+                content_type = "text/plain; charset=utf-8"
+
+            writer.write(
+                (
+                    f"HTTP/1.1 {status}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode()
+            )
+            if parts and parts[0] != "HEAD":
+                writer.write(body)
+
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            log.debug("Metrics client disconnected early")
+        finally:
+            writer.close()
+
+
+class HandlerMetrics:
+    """
+    The metrics an :py:class:`antispam.AntiSpamHandler` updates,
+    along with those for its member locks, offloading, stage
+    timings and, once started, its ingestion queue.
+    """
+
+    __slots__ = ("registry", "messages", "punishments")
+
+    def __init__(self, registry: MetricsRegistry, handler: "AntiSpamHandler"):
+        self.registry: MetricsRegistry = registry
+        self.messages: CounterMetric = registry.counter(
+            "antispam_messages",
+            "Messages propagated through the core checks",
+            ("guild",),
+        )
+        self.punishments: CounterMetric = registry.counter(
+            "antispam_punishments",
+            "Messages members were punished for, by punishment",
+            ("guild", "type"),
+        )
+
+        def tracked() -> Dict[Tuple[str, ...], float]:
+            from antispam.caches import MemoryCache
+
+            cache = handler.cache
+            if not isinstance(cache, MemoryCache):
+                # Counting would mean reading the whole cache
+                return {}
+
+            members = messages = 0
+            for guild in cache.cache.values():
+                members += len(guild.members)
+                for member in guild.members.values():
+                    messages += len(member.messages)
+
+            return {
+                ("guilds",): len(cache.cache),
+                ("members",): members,
+                ("messages",): messages,
+            }
+
+        registry.gauge(
+            "antispam_tracked",
+            "Guilds, members and messages currently held in the cache",
+            ("kind",),
+            function=tracked,
+        )
+        # These are updated by whatever they measure, so are read when rendered
+        handler.member_locks.metrics.register_metrics(registry)
+        handler.offload_metrics.register_metrics(registry)
+        if handler.stage_timings is not None:
+            handler.stage_timings.register_metrics(registry)
+
+    def observe(self, guild_id: int, payload: CorePayload) -> None:
+        """Count a message the core checks returned ``payload`` for."""
+        guild = self.registry.guild_label(guild_id)
+        self.messages.inc(guild)
+        if not payload.member_should_be_punished_this_message:
+            return
+
+        if payload.member_was_timed_out:
+            punishment = "timeout"
+        elif payload.member_was_banned:
+            punishment = "ban"
+        elif payload.member_was_kicked:
+            punishment = "kick"
+        elif payload.member_was_warned:
+            punishment = "warn"
+        else:
+            punishment = "none"
+
+        self.punishments.inc(guild, punishment)
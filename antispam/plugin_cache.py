@@ -23,6 +23,7 @@ DEALINGS IN THE SOFTWARE.
 from typing import Any
 
 from antispam import AntiSpamHandler
+from antispam.abc.cache import get_guild_metadata
 from antispam.dataclasses import Guild, Member
 from antispam.exceptions import (
     GuildAddonNotFound,
@@ -156,7 +157,7 @@ class PluginCache:
             The given guild could not be found
             in the cache or it has no stored data
         """
-        guild = await self.cache.get_guild(guild_id=guild_id)
+        guild = await get_guild_metadata(self.cache, guild_id)
         try:
             addon_data = guild.addons[self.key]
         except KeyError:
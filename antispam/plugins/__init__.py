@@ -22,6 +22,7 @@ DEALINGS IN THE SOFTWARE.
 """
 from antispam.plugins.admin_logs import AdminLogs
 from antispam.plugins.anti_mass_mention import AntiMassMention, MassMentionPunishment
+from antispam.plugins.anti_raid import AntiRaid, RaidPunishment
 from antispam.plugins.anti_spam_tracker import AntiSpamTracker
 from antispam.plugins.max_message_limiter import MaxMessageLimiter
 from antispam.plugins.stats import Stats
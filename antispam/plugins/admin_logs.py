@@ -26,6 +26,7 @@ from pathlib import Path
 from typing import Any, Union, Callable, Optional
 
 from antispam import AntiSpamHandler, CorePayload, LogicError
+from antispam.abc.cache import get_guild_metadata
 from antispam.base_plugin import BasePlugin
 from antispam.dataclasses import Guild, Member
 
@@ -37,6 +38,9 @@ class AdminLogs(BasePlugin):
     regard to evidence collection on automated punishments.
     """
 
+    concurrent_safe = True
+    only_punished = True
+
     def __init__(
         self,
         handler: AntiSpamHandler,
@@ -126,7 +130,7 @@ class AdminLogs(BasePlugin):
             else:
                 punishment_type = self._punishment_type or "Unknown Punishment"
 
-        guild: Guild = await self.handler.cache.get_guild(guild_id)
+        guild: Guild = await get_guild_metadata(self.handler.cache, guild_id)
         if not self.save_all_transcripts and not guild.log_channel_id:
             log.debug(
                 "Failing to save transcript as %s does not have a log channel set",
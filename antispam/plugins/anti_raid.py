@@ -0,0 +1,394 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Set, Tuple, Union
+
+import attr
+
+from antispam import AntiSpamHandler
+from antispam.base_plugin import BasePlugin
+from antispam.dataclasses import CorePayload
+from antispam.engines.simhash import (
+    BLOCKS,
+    block_values,
+    flip_masks,
+    hamming_distance,
+    simhash,
+)
+
+log = logging.getLogger(__name__)
+
+
+@attr.s
+class RaidPunishment:
+    # noinspection PyUnresolvedReferences
+    """
+    This dataclass is what is dispatched when
+    near identical content is being sent by lots of members.
+
+    Parameters
+    ----------
+    guild_id : int
+        The associated guilds id
+    channel_id : int
+        The channel the latest message was sent in
+    member_ids : List[int]
+        The members newly found sending content in this cluster,
+        in the order they first did so. The first punishment for a
+        cluster has every member in it, later ones only have members
+        who joined since. Members are included again if all of their
+        messages in the cluster expire and they then rejoin it.
+    fingerprint : int
+        The SimHash fingerprint of the latest message
+
+    Notes
+    -----
+    You shouldn't be making instances of this.
+    """
+
+    guild_id: int = attr.ib()
+    channel_id: int = attr.ib()
+    member_ids: List[int] = attr.ib()
+    fingerprint: int = attr.ib()
+
+
+class Cluster:
+    """
+    Near identical fingerprints, and the members who sent them.
+    """
+
+    __slots__ = ("members", "reported", "unreported", "values")
+
+    def __init__(self):
+        # Member id -> how many of their fingerprints are in this
+        # cluster, in the order members first joined it
+        self.members: Dict[int, int] = {}
+        # Members already returned in a RaidPunishment
+        self.reported: Set[int] = set()
+        # Members not yet returned, in the order they joined
+        self.unreported: Dict[int, None] = {}
+        # Fingerprint -> how many times it is in this cluster
+        self.values: Dict[int, int] = {}
+
+    def add(self, fingerprint: Fingerprint) -> None:
+        self.values[fingerprint.fingerprint] = (
+            self.values.get(fingerprint.fingerprint, 0) + 1
+        )
+        count = self.members.get(fingerprint.member_id, 0)
+        self.members[fingerprint.member_id] = count + 1
+        if not count and fingerprint.member_id not in self.reported:
+            self.unreported[fingerprint.member_id] = None
+
+    def remove(self, fingerprint: Fingerprint) -> bool:
+        """Removes a fingerprint, returning whether it was the last of its value"""
+        count = self.members[fingerprint.member_id] - 1
+        if count:
+            self.members[fingerprint.member_id] = count
+        else:
+            # No longer part of the cluster, so can be reported again
+            del self.members[fingerprint.member_id]
+            self.reported.discard(fingerprint.member_id)
+            self.unreported.pop(fingerprint.member_id, None)
+
+        count = self.values[fingerprint.fingerprint] - 1
+        if count:
+            self.values[fingerprint.fingerprint] = count
+            return False
+
+        del self.values[fingerprint.fingerprint]
+        return True
+
+    def merge(self, other: Cluster) -> None:
+        """Moves everything in ``other`` into this cluster"""
+        for member_id, count in other.members.items():
+            self.members[member_id] = self.members.get(member_id, 0) + count
+
+        for value, count in other.values.items():
+            self.values[value] = self.values.get(value, 0) + count
+
+        self.reported.update(other.reported)
+        for member_id in other.unreported:
+            self.unreported[member_id] = None
+
+        for member_id in self.reported.intersection(self.unreported):
+            del self.unreported[member_id]
+
+    def take_unreported(self) -> List[int]:
+        """Returns the members not yet reported, marking them as reported"""
+        member_ids = list(self.unreported)
+        self.reported.update(member_ids)
+        self.unreported.clear()
+        return member_ids
+
+
+@attr.s(slots=True)
+class Fingerprint:
+    timestamp: float = attr.ib()
+    fingerprint: int = attr.ib()
+    member_id: int = attr.ib()
+    blocks: Tuple[int, ...] = attr.ib()
+
+
+class GuildWindow:
+    """The fingerprints sent within a guild during the time period."""
+
+    __slots__ = ("fingerprints", "index", "clusters", "latest")
+
+    def __init__(self):
+        self.fingerprints: Deque[Fingerprint] = deque()
+        # One index per fingerprint block, block value -> the
+        # distinct fingerprints with it, oldest first
+        self.index: List[Dict[int, Dict[int, None]]] = [{} for _ in range(BLOCKS)]
+        # Fingerprint -> the cluster it is in
+        self.clusters: Dict[int, Cluster] = {}
+        self.latest: float = 0
+
+    def add(
+        self, fingerprint: Fingerprint, max_distance: int, min_members: int
+    ) -> Cluster:
+        """
+        Adds a fingerprint to the cluster of the fingerprints
+        within ``max_distance`` bits of it, returning that cluster.
+        """
+        cluster = self.clusters.get(fingerprint.fingerprint)
+        if cluster is None:
+            cluster = self._find_cluster(fingerprint, max_distance, min_members)
+            self.clusters[fingerprint.fingerprint] = cluster
+            for index, value in zip(self.index, fingerprint.blocks):
+                index.setdefault(value, {})[fingerprint.fingerprint] = None
+
+        cluster.add(fingerprint)
+        self.fingerprints.append(fingerprint)
+        return cluster
+
+    def _find_cluster(
+        self, fingerprint: Fingerprint, max_distance: int, min_members: int
+    ) -> Cluster:
+        """
+        Finds the clusters with a fingerprint near the given one,
+        merging them together. This stops early once the cluster
+        has ``min_members`` members, as it is already a raid.
+        """
+        found: Optional[Cluster] = None
+        masks = flip_masks(max_distance // BLOCKS)
+        for index, value in zip(self.index, fingerprint.blocks):
+            for mask in masks:
+                # Newest first, as these are the most likely to be a raid
+                for other in reversed(index.get(value ^ mask, {})):
+                    cluster = self.clusters[other]
+                    if cluster is found or (
+                        hamming_distance(fingerprint.fingerprint, other) > max_distance
+                    ):
+                        continue
+
+                    if found is None:
+                        found = cluster
+                    else:
+                        found = self._merge(found, cluster)
+
+                    if len(found.members) >= min_members:
+                        return found
+
+        return found or Cluster()
+
+    def _merge(self, first: Cluster, second: Cluster) -> Cluster:
+        if len(first.values) < len(second.values):
+            first, second = second, first
+
+        first.merge(second)
+        for value in second.values:
+            self.clusters[value] = first
+
+        return first
+
+    def expire(self, cutoff: float) -> None:
+        """Removes every fingerprint sent at or before ``cutoff``"""
+        while self.fingerprints and self.fingerprints[0].timestamp <= cutoff:
+            fingerprint = self.fingerprints.popleft()
+            if not self.clusters[fingerprint.fingerprint].remove(fingerprint):
+                continue
+
+            # The last time this fingerprint was seen
+            del self.clusters[fingerprint.fingerprint]
+            for index, value in zip(self.index, fingerprint.blocks):
+                bucket = index[value]
+                del bucket[fingerprint.fingerprint]
+                if not bucket:
+                    index.pop(value)
+
+
+class AntiRaid(BasePlugin):
+    """
+    Catches lots of members each sending the same content,
+    which per member duplicate detection never sees.
+
+    Each message is given a SimHash fingerprint and added to the
+    cluster of near identical fingerprints sent in the guild
+    within ``time_period``. Once ``min_members``
+    different members are in a cluster, a :py:class:`RaidPunishment`
+    is returned for them, and then for each member who joins after.
+
+    .. code-block:: python
+        :linenos:
+
+        data = await AntiSpamHandler.propagate(message)
+        return_item: Union[dict, RaidPunishment] = data.after_invoke_extensions["AntiRaid"]
+
+        if isinstance(return_item, RaidPunishment):
+            # Punish return_item.member_ids
+
+    Notes
+    -----
+    Fingerprints are stored in memory only,
+    they are not persisted by your cache.
+    """
+
+    concurrent_safe = True
+
+    def __init__(
+        self,
+        handler: AntiSpamHandler,
+        *,
+        min_members: int = 5,
+        time_period: int = 10000,
+        max_distance: int = 7,
+    ):
+        """
+
+        Parameters
+        ----------
+        handler : AntiSpamHandler
+            Our AntiSpamHandler instance
+        min_members : int
+            How many different members need to send
+            near identical content before it is a raid
+            *Inclusive*
+        time_period : int
+            The time period valid for fingerprints
+            *Is in milliseconds*
+        max_distance : int
+            How many bits two fingerprints can differ
+            by while still being treated as the same content.
+
+            Larger values catch more heavily modified content,
+            but are slower.
+        """
+        super().__init__(is_pre_invoke=False)
+        if min_members < 2:
+            raise ValueError("Expected `min_members` to be at least 2")
+
+        if time_period < 1:
+            raise ValueError("Expected `time_period` to be positive")
+
+        if not 0 <= max_distance < 32:
+            raise ValueError("Expected `max_distance` to be between 0 and 31")
+
+        self.handler = handler
+        self.min_members = min_members
+        self.time_period = time_period
+        self.max_distance = max_distance
+
+        # Least recently used first, so idle guilds can be evicted
+        self._windows: OrderedDict[int, GuildWindow] = OrderedDict()
+
+        log.info("Plugin ready for usage")
+
+    def _evict_idle_windows(self, cutoff: float) -> None:
+        """
+        Drops the windows of guilds without any messages
+        since ``cutoff``, as all of their clusters have expired.
+        """
+        while self._windows:
+            guild_id, window = next(iter(self._windows.items()))
+            if window.latest > cutoff:
+                break
+
+            del self._windows[guild_id]
+
+    async def propagate(
+        self, message, data: Optional[CorePayload] = None
+    ) -> Union[dict, RaidPunishment]:
+        """
+        Fingerprints a message and checks it against
+        other messages recently sent in the guild
+
+        Parameters
+        ----------
+        message
+            The message to interact with
+        data : Optional[CorePayload]
+            Unused
+
+        Returns
+        -------
+        dict
+            A dictionary explaining what
+            actions have been taken
+        RaidPunishment
+            The members who are raiding
+        """
+        content = self.handler.similarity_engine.process(message.content or "")
+        if not content:
+            return {"action": "No action taken"}
+
+        guild_id = await self.handler.lib_handler.get_guild_id(message)
+        created_at = message.created_at.timestamp() * 1000
+        self._evict_idle_windows(created_at - self.time_period)
+        window = self._windows.get(guild_id)
+        if window is None:
+            window = self._windows[guild_id] = GuildWindow()
+        else:
+            self._windows.move_to_end(guild_id)
+
+        # Kept in order so that expiry only ever looks at the oldest
+        timestamp = max(created_at, window.latest)
+        window.latest = timestamp
+        window.expire(timestamp - self.time_period)
+
+        value = simhash(content)
+        fingerprint = Fingerprint(
+            timestamp=timestamp,
+            fingerprint=value,
+            member_id=message.author.id,
+            blocks=block_values(value),
+        )
+        cluster = window.add(fingerprint, self.max_distance, self.min_members)
+        if len(cluster.members) < self.min_members or not cluster.unreported:
+            return {"action": "No action taken"}
+
+        member_ids = cluster.take_unreported()
+
+        log.info(
+            "Dispatching raid punishment for %s members in Guild(id=%s)",
+            len(member_ids),
+            guild_id,
+        )
+        return RaidPunishment(
+            guild_id=guild_id,
+            channel_id=await self.handler.lib_handler.get_channel_id(message),
+            member_ids=member_ids,
+            fingerprint=value,
+        )
@@ -73,6 +73,9 @@ class AntiSpamTracker(BasePlugin):
         The underlying cache mechanism for data storage
     """
 
+    concurrent_safe = True
+    only_punished = True
+
     __slots__ = [
         "member_tracking",
         "valid_global_interval",
@@ -161,6 +164,10 @@ class AntiSpamTracker(BasePlugin):
         await self.update_cache(message, data)
         return {"status": "Cache updated"}
 
+    def skipped_return(self, message, data: CorePayload) -> dict:
+        """What ``propagate`` returns for messages which don't update the cache"""
+        return {"status": "Cache updated"}
+
     async def update_cache(self, message, data: CorePayload) -> None:
         """
         Takes the data returned from `propagate`
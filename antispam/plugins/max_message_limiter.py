@@ -35,6 +35,8 @@ class MaxMessageLimiter(BasePlugin):
     This is also guild wide.
     """
 
+    concurrent_safe = True
+
     def __init__(
         self,
         handler: AntiSpamHandler,
@@ -76,14 +78,13 @@ class MaxMessageLimiter(BasePlugin):
             # If they don't exist they haven't exceeded limits
             return None
 
+        cutoff = get_aware_time() - datetime.timedelta(
+            milliseconds=self.message_interval
+        )
         messages_in_channel = [
             m
-            for m in member.messages
-            if m.channel_id == message.channel.id
-            and (
-                m.creation_time + datetime.timedelta(milliseconds=self.message_interval)
-            )
-            >= get_aware_time()
+            for m in member.get_channel_messages(message.channel.id)
+            if m.creation_time >= cutoff
         ]
 
         if len(messages_in_channel) < self.hard_cap:
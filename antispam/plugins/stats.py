@@ -21,11 +21,12 @@ FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 DEALINGS IN THE SOFTWARE.
 """
 import logging
-from typing import Dict
+from typing import Dict, Tuple
 
 from antispam import AntiSpamHandler
 from antispam.base_plugin import BasePlugin
 from antispam.dataclasses import CorePayload
+from antispam.metrics import MetricsRegistry
 
 log = logging.getLogger(__name__)
 
@@ -44,6 +45,8 @@ class Stats(BasePlugin):
     to make this work even better.
     """
 
+    concurrent_safe = True
+
     injectable_nonce = "Issa me, Mario!"  # For our `propagate` check
 
     def __init__(self, anti_spam_handler: AntiSpamHandler):
@@ -57,9 +60,52 @@ class Stats(BasePlugin):
             "members": {},
         }
         self.handler = anti_spam_handler
+        if anti_spam_handler.metrics is not None:
+            self._register_metrics(anti_spam_handler.metrics.registry)
 
         log.debug("Plugin ready for usage")
 
+    def _register_metrics(self, registry: MetricsRegistry) -> None:
+        # Read from self.data when rendered, as load_from_dict replaces it
+        def plugin_calls() -> Dict[Tuple[str, ...], float]:
+            return {
+                (invoke, plugin): calls["calls"]
+                for invoke in ("pre", "after")
+                for plugin, calls in self.data[f"{invoke}_invoke_calls"].items()
+            }
+
+        def guilds(key: str) -> Dict[Tuple[str, ...], float]:
+            values: Dict[Tuple[str, ...], float] = {}
+            for guild_id, guild in self.data["guilds"].items():
+                label = (registry.guild_label(int(guild_id)),)
+                values[label] = values.get(label, 0) + guild[key]
+
+            return values
+
+        registry.counter(
+            "antispam_stats_propagate_calls",
+            "Messages the Stats plugin has seen",
+            function=lambda: {(): self.data["propagate_calls"]},
+        )
+        registry.counter(
+            "antispam_stats_plugin_calls",
+            "Times each plugin has been registered while Stats saw a message",
+            ("invoke", "plugin"),
+            function=plugin_calls,
+        )
+        registry.counter(
+            "antispam_stats_guild_calls",
+            "Messages the Stats plugin has seen, by guild",
+            ("guild",),
+            function=lambda: guilds("calls"),
+        )
+        registry.counter(
+            "antispam_stats_guild_punished",
+            "Messages members should be punished for, by guild",
+            ("guild",),
+            function=lambda: guilds("total_messages_punished"),
+        )
+
     async def propagate(self, message, data: CorePayload) -> dict:
         log.info("Updating statistics on_propagate")
         for invoker in self.handler.pre_invoke_plugins.keys():
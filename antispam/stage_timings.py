@@ -0,0 +1,138 @@
+"""
+The MIT License (MIT)
+
+Copyright (c) 2020-Current Skelmis
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+DEALINGS IN THE SOFTWARE.
+"""
+import time
+from typing import TYPE_CHECKING, Dict
+
+from antispam.dataclasses import LatencyHistogram
+
+if TYPE_CHECKING:  # pragma: no cover
+    from antispam.metrics import MetricsRegistry
+
+
+class StageTimings:
+    """
+    How long each stage of propagating a message takes.
+
+    Stages are named after what they time:
+
+    - ``filter``: Checking the message should be propagated
+    - ``guild_load``: Fetching the guild from the cache
+    - ``member_load``: Fetching the member from the cache
+    - ``clean_up``: Removing the members outdated messages
+    - ``create_message``: Turning the message into a ``Message``
+    - ``ratios``: Comparing the message to the members others
+    - ``cache_write``: Storing the message in the cache
+    - ``punishment``: Punishing the member, including any Discord calls
+    - ``pre_invoke:<name>`` and ``after_invoke:<name>``:
+      Each plugin, by its registered name
+
+    Nothing is timed unless an instance is passed
+    to :py:class:`antispam.AntiSpamHandler`, other then after
+    invoke plugins, see ``AntiSpamHandler.plugin_timings``.
+    """
+
+    __slots__ = ("precision", "_histograms")
+
+    def __init__(self, *, precision: int = 7):
+        """
+        Parameters
+        ----------
+        precision : int
+            How many significant bits of each duration are
+            kept, see :py:class:`antispam.dataclasses.LatencyHistogram`
+
+            Defaults to ``7``
+        """
+        if precision < 1:
+            raise ValueError("Expected `precision` to be at least 1")
+
+        self.precision: int = precision
+        self._histograms: Dict[str, LatencyHistogram] = {}
+
+    def record(self, stage: str, start: float) -> float:
+        """
+        Record a stage as having run from ``start`` until now.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage
+        start : float
+            When the stage started, from ``time.perf_counter()``
+
+        Returns
+        -------
+        float
+            Now, so the next stage can start from it
+        """
+        now = time.perf_counter()
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            histogram = self._histograms[stage] = LatencyHistogram(self.precision)
+
+        histogram.record(now - start)
+        return now
+
+    def get(self, stage: str) -> LatencyHistogram:
+        """
+        Get the durations recorded for a stage.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage
+
+        Returns
+        -------
+        LatencyHistogram
+            The stages durations, which is empty
+            if the stage has never been timed
+        """
+        return self._histograms.get(stage) or LatencyHistogram(self.precision)
+
+    def get_all(self) -> Dict[str, LatencyHistogram]:
+        """
+        Get the durations recorded for every stage.
+
+        Returns
+        -------
+        Dict[str, LatencyHistogram]
+            Stage names mapped to their durations
+        """
+        return dict(self._histograms)
+
+    def reset(self) -> None:
+        """Forget the durations recorded for every stage."""
+        self._histograms.clear()
+
+    def register_metrics(self, registry: "MetricsRegistry") -> None:
+        """Render these on ``registry``, read from here whenever it is rendered."""
+        registry.summary(
+            "antispam_stage_seconds",
+            "How long each stage of propagating a message takes, "
+            "guild_load, member_load and cache_write are cache operations",
+            ("stage",),
+            function=lambda: {
+                (stage,): histogram for stage, histogram in self._histograms.items()
+            },
+        )
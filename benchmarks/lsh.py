@@ -0,0 +1,96 @@
+"""
+Measures how many near duplicates MinHash LSH candidate
+selection finds compared to scoring every pair, and how long each takes.
+
+Run with ``python -m benchmarks.lsh``
+"""
+
+import random
+import time
+from typing import List, Set, Tuple
+
+from antispam.engines import RapidFuzzEngine
+from antispam.engines.minhash import band_keys, minhash_signature
+
+from .similarity import WORDS
+
+
+def perturb(content: str, rng: random.Random) -> str:
+    """Small edits spammers use to dodge exact matching."""
+    characters = list(content)
+    for _ in range(rng.randint(0, 3)):
+        position = rng.randrange(len(characters))
+        action = rng.random()
+        if action < 0.4:
+            characters.insert(position, rng.choice("!?.* "))
+        elif action < 0.7:
+            characters[position] = characters[position].upper()
+        else:
+            characters.pop(position)
+
+    return "".join(characters)
+
+
+def build_corpus(size: int, seed: int = 0) -> List[str]:
+    """Unique chatter with perturbed copies of a few spam messages mixed in."""
+    rng = random.Random(seed)
+    spam = [" ".join(rng.choices(WORDS, k=rng.randint(5, 40))) for _ in range(10)]
+    corpus = []
+    for _ in range(size):
+        if rng.random() < 0.3:
+            corpus.append(perturb(rng.choice(spam), rng))
+        else:
+            corpus.append(" ".join(rng.choices(WORDS, k=rng.randint(1, 60))))
+
+    return corpus
+
+
+def exhaustive(processed: List[str], engine, score_cutoff: int) -> Set[Tuple[int, int]]:
+    matches = set()
+    for i, first in enumerate(processed):
+        for j in range(i):
+            if engine.compare(first, processed[j], score_cutoff) >= score_cutoff:
+                matches.add((j, i))
+
+    return matches
+
+
+def with_lsh(processed: List[str], engine, score_cutoff: int) -> Set[Tuple[int, int]]:
+    matches = set()
+    buckets = {}
+    for i, first in enumerate(processed):
+        candidates = set()
+        keys = band_keys(minhash_signature(first))
+        for key in keys:
+            candidates.update(buckets.get(key, ()))
+
+        for j in candidates:
+            if engine.compare(first, processed[j], score_cutoff) >= score_cutoff:
+                matches.add((j, i))
+
+        for key in keys:
+            buckets.setdefault(key, []).append(i)
+
+    return matches
+
+
+def main():
+    engine = RapidFuzzEngine()
+    processed = [engine.process(content) for content in build_corpus(2000)]
+
+    start = time.perf_counter()
+    expected = exhaustive(processed, engine, 90)
+    exhaustive_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = with_lsh(processed, engine, 90)
+    lsh_time = time.perf_counter() - start
+
+    recall = len(found & expected) / len(expected) if expected else 1
+    print(f"Exhaustive: {exhaustive_time:>8.3f}s ({len(expected)} duplicates)")
+    print(f"       LSH: {lsh_time:>8.3f}s ({len(found)} duplicates)")
+    print(f"    Recall: {recall:>8.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Measures the bytes used per tracked message when stored
+as a list of Message compared to CompactMessages.
+
+Run with ``python -m benchmarks.memory``
+"""
+
+import gc
+import random
+import tracemalloc
+from typing import Callable, List
+
+from antispam.dataclasses import CompactMessages, Message
+from antispam.engines import RapidFuzzEngine
+from antispam.util import get_aware_time
+
+from .similarity import WORDS
+
+MEMBERS = 2000
+MESSAGES_PER_MEMBER = 10
+
+
+def build_messages(engine: RapidFuzzEngine, seed: int = 0) -> List[List[Message]]:
+    """Roughly a third of messages are spam repeated by the same member."""
+    rng = random.Random(seed)
+    members = []
+    for member_id in range(MEMBERS):
+        spam = " ".join(rng.choices(WORDS, k=rng.randint(2, 20)))
+        messages = []
+        for message_id in range(MESSAGES_PER_MEMBER):
+            content = (
+                spam
+                if rng.random() < 0.3
+                else " ".join(rng.choices(WORDS, k=rng.randint(1, 30)))
+            )
+            message = Message(
+                id=rng.getrandbits(62),
+                channel_id=rng.getrandbits(62),
+                guild_id=rng.getrandbits(62),
+                author_id=member_id,
+                content=content,
+                creation_time=get_aware_time(),
+            )
+            # As done by the lib handlers
+            message.get_processed_content(engine)
+            messages.append(message)
+
+        members.append(messages)
+
+    return members
+
+
+def measure(store: Callable[[List[Message]], object]) -> float:
+    engine = RapidFuzzEngine()
+    gc.collect()
+    tracemalloc.start()
+    stored = [store(messages) for messages in build_messages(engine)]
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert len(stored) == MEMBERS
+    return size / (MEMBERS * MESSAGES_PER_MEMBER)
+
+
+def to_compact(messages: List[Message]) -> CompactMessages:
+    for message in messages:
+        # A single guild per member, as when stored by a cache
+        message.guild_id = 1
+
+    return CompactMessages(messages)
+
+
+def main():
+    print(f"   List: {measure(list):>8.1f} bytes per message")
+    print(f"Compact: {measure(to_compact):>8.1f} bytes per message")
+
+
+if __name__ == "__main__":
+    main()
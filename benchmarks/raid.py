@@ -0,0 +1,85 @@
+"""
+Measures the per message cost of the AntiRaid plugin
+at 1k messages a second, with a raid part way through,
+and then during a raid of identical content which lasts
+longer then the time period.
+
+Run with ``python -m benchmarks.raid``
+"""
+
+import asyncio
+import datetime
+import random
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from antispam import AntiSpamHandler
+from antispam.enums import Library
+from antispam.plugins import AntiRaid, RaidPunishment
+
+from .lsh import perturb
+from .similarity import WORDS
+
+
+async def main():
+    rng = random.Random(0)
+    handler = AntiSpamHandler(Mock(), Library.DPY)
+    plugin = AntiRaid(handler)
+    raid = " ".join(rng.choices(WORDS, k=15))
+
+    messages = []
+    start = datetime.datetime.now()
+    for i in range(20000):
+        is_raid = 10000 <= i < 10300
+        messages.append(
+            SimpleNamespace(
+                content=perturb(raid, rng)
+                if is_raid
+                else " ".join(rng.choices(WORDS, k=rng.randint(1, 30))),
+                created_at=start + datetime.timedelta(milliseconds=i),
+                author=SimpleNamespace(id=i),
+                guild=SimpleNamespace(id=1),
+                channel=SimpleNamespace(id=1),
+            )
+        )
+
+    flagged = set()
+    timings = []
+    for message in messages:
+        now = time.perf_counter()
+        result = await plugin.propagate(message)
+        timings.append(time.perf_counter() - now)
+        if isinstance(result, RaidPunishment):
+            flagged.update(result.member_ids)
+
+    timings.sort()
+    print(f"  Mean: {sum(timings) / len(timings) * 1e6:>8.1f}us")
+    print(f"   p99: {timings[int(len(timings) * 0.99)] * 1e6:>8.1f}us")
+    print(f"   Max: {timings[-1] * 1e6:>8.1f}us")
+    print(f"Caught: {len(flagged & set(range(10000, 10300)))}/300 raiders")
+    print(f"  Otherwise flagged: {len(flagged - set(range(10000, 10300)))}")
+
+    plugin = AntiRaid(handler)
+    timings = []
+    for i in range(20000):
+        message = SimpleNamespace(
+            content=raid,
+            created_at=start + datetime.timedelta(milliseconds=i),
+            author=SimpleNamespace(id=i),
+            guild=SimpleNamespace(id=1),
+            channel=SimpleNamespace(id=1),
+        )
+        now = time.perf_counter()
+        await plugin.propagate(message)
+        timings.append(time.perf_counter() - now)
+
+    # Once the window is full
+    timings = sorted(timings[10000:])
+    print("Sustained raid")
+    print(f"  Mean: {sum(timings) / len(timings) * 1e6:>8.1f}us")
+    print(f"   p99: {timings[int(len(timings) * 0.99)] * 1e6:>8.1f}us")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+Measures how long fetching every member of a guild takes when members
+are found with KEYS and fetched one GET at a time, compared to the
+MEMBERS:{guild_id} id sets RedisCache scans and fetches in pipelined batches.
+
+Uses fakeredis, so times are relative rather then what a real
+Redis server would give. Run with ``python -m benchmarks.redis_cache``
+"""
+
+import asyncio
+import time
+from typing import List, Tuple
+
+import orjson as json
+from attr import asdict
+from fakeredis import FakeAsyncRedis
+
+from antispam import AntiSpamHandler
+from antispam.caches.redis import RedisCache
+from antispam.dataclasses import Guild, Member, Message
+from antispam.enums import Library
+
+GUILDS = 3
+MEMBERS_PER_GUILD = 10_000
+
+
+async def fill(redis: FakeAsyncRedis) -> None:
+    async with redis.pipeline(transaction=False) as pipe:
+        for guild_id in range(GUILDS):
+            pipe.set(f"GUILD:{guild_id}", json.dumps(asdict(Guild(guild_id))))
+            pipe.sadd("GUILDS", guild_id)
+            for member_id in range(MEMBERS_PER_GUILD):
+                member = Member(
+                    member_id,
+                    guild_id,
+                    messages=[Message(1, 1, guild_id, member_id, "Hello world")],
+                )
+                pipe.set(
+                    f"MEMBER:{guild_id}:{member_id}",
+                    json.dumps(asdict(member, recurse=True)),
+                )
+                pipe.sadd(f"MEMBERS:{guild_id}", member_id)
+
+        await pipe.execute()
+
+
+async def with_keys(cache: RedisCache, guild_id: int) -> List[Member]:
+    """How RedisCache used to get a guilds members"""
+    members = []
+    for key in await cache.redis.keys(f"MEMBER:{guild_id}:*"):
+        member_id = int(key.decode("utf-8").split(":")[2])
+        members.append(await cache.get_member(member_id, guild_id))
+
+    return members
+
+
+async def with_id_sets(cache: RedisCache, guild_id: int) -> List[Member]:
+    return [member async for member in cache._get_all_members(guild_id)]
+
+
+async def measure(cache: RedisCache, fetch) -> Tuple[float, int]:
+    round_trips = 0
+    execute_command = cache.redis.execute_command
+    pipeline = cache.redis.pipeline
+
+    def counting(method):
+        def wrapper(*args, **kwargs):
+            nonlocal round_trips
+            round_trips += 1
+            return method(*args, **kwargs)
+
+        return wrapper
+
+    cache.redis.execute_command = counting(execute_command)
+    cache.redis.pipeline = counting(pipeline)
+    start = time.perf_counter()
+    for guild_id in range(GUILDS):
+        members = await fetch(cache, guild_id)
+        assert len(members) == MEMBERS_PER_GUILD
+
+    elapsed = time.perf_counter() - start
+    cache.redis.execute_command = execute_command
+    cache.redis.pipeline = pipeline
+    return elapsed / GUILDS, round_trips // GUILDS
+
+
+async def run():
+    redis = FakeAsyncRedis()
+    await fill(redis)
+    cache = RedisCache(AntiSpamHandler(None, Library.DPY), redis)
+
+    print(f"{MEMBERS_PER_GUILD} members per guild")
+    for name, fetch in (("KEYS + GET", with_keys), ("SSCAN + pipeline", with_id_sets)):
+        seconds, round_trips = await measure(cache, fetch)
+        print(
+            f"{name:>16}: {seconds * 1000:>8.1f}ms, {round_trips:>6} round trips per guild"
+        )
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
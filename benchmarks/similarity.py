@@ -0,0 +1,61 @@
+"""
+Compares the throughput of the built in similarity engines.
+
+Run with ``python -m benchmarks.similarity``
+"""
+
+import random
+import string
+import time
+from typing import List, Tuple
+
+from antispam.abc import SimilarityEngine
+from antispam.engines import FuzzyWuzzyEngine, RapidFuzzEngine
+
+WORDS = [
+    "".join(random.choices(string.ascii_lowercase, k=random.randint(2, 9)))
+    for _ in range(500)
+]
+
+
+def build_corpus(size: int, seed: int = 0) -> List[str]:
+    """A mix of unique chatter and repeated spam of varying lengths."""
+    rng = random.Random(seed)
+    spam = [" ".join(rng.choices(WORDS, k=rng.randint(2, 40))) for _ in range(10)]
+    corpus = []
+    for _ in range(size):
+        if rng.random() < 0.3:
+            corpus.append(rng.choice(spam))
+        else:
+            corpus.append(" ".join(rng.choices(WORDS, k=rng.randint(1, 60))))
+
+    return corpus
+
+
+def run(
+    engine: SimilarityEngine, corpus: List[str], score_cutoff: int
+) -> Tuple[float, int]:
+    pairs = 0
+    matches = 0
+    start = time.perf_counter()
+    for i, first in enumerate(corpus):
+        for second in corpus[i + 1 :]:
+            pairs += 1
+            if engine.ratio(first, second, score_cutoff) >= score_cutoff:
+                matches += 1
+
+    return pairs / (time.perf_counter() - start), matches
+
+
+def main():
+    corpus = build_corpus(400)
+    for engine in (FuzzyWuzzyEngine(), RapidFuzzEngine()):
+        pairs_per_second, matches = run(engine, corpus, 90)
+        print(
+            f"{engine.__class__.__name__:>18}: {pairs_per_second:>12,.0f} pairs/sec "
+            f"({matches} duplicates)"
+        )
+
+
+if __name__ == "__main__":
+    main()
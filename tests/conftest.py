@@ -5,6 +5,7 @@ from unittest.mock import Mock
 import pytest
 from attr import asdict
 from discord.ext import commands  # noqa
+from fakeredis import FakeAsyncRedis
 
 from antispam import AntiSpamHandler, PluginCache, Options
 from antispam.caches import MemoryCache
@@ -19,7 +20,7 @@ from antispam.plugins import AdminLogs, AntiMassMention, AntiSpamTracker, Stats
 from examples.custom_multistage_punishments.AntiSpamTrackerSubclass import (
     MyCustomTracker,
 )
-from tests.mocks import MockedMember, MockedRedis
+from tests.mocks import MockedMember
 from tests.mocks.mock_document import MockedDocument
 
 
@@ -132,7 +133,7 @@ def create_example_tracker_subclass(create_handler) -> MyCustomTracker:
 
 @pytest.fixture()
 def create_redis_cache(create_handler) -> RedisCache:
-    return RedisCache(create_handler, MockedRedis())
+    return RedisCache(create_handler, FakeAsyncRedis())
 
 
 @pytest.fixture(scope="session")
@@ -3,4 +3,3 @@ from .mock_role import MockedRole
 from .mocked_guild import MockedGuild
 from .mocked_member import MockedMember
 from .mocked_message import MockedMessage
-from .mocked_redis import MockedRedis
@@ -0,0 +1,176 @@
+import datetime
+import random
+import string
+from hashlib import blake2b
+
+import pytest
+
+from antispam.engines.simhash import (
+    block_values,
+    flip_masks,
+    hamming_distance,
+    simhash,
+)
+from antispam.plugins import AntiRaid, RaidPunishment
+from antispam.plugins.anti_raid import Fingerprint, GuildWindow
+
+from .mocks import MockedMessage
+
+
+class TestAntiRaid:
+    def test_simhash(self):
+        first = simhash("join my server for free nitro giveaways every day")
+        assert first == simhash("join my server for free nitro giveaways every day")
+        assert (
+            hamming_distance(
+                first, simhash("join my server for free nitro giveaway every day")
+            )
+            <= 7
+        )
+        assert (
+            hamming_distance(
+                first, simhash("what did everyone think of the game last night")
+            )
+            > 7
+        )
+        assert simhash("") == 0
+
+    def test_simhash_long_content(self):
+        def reference(content, size=4):
+            shingles = {content[i : i + size] for i in range(len(content) - size + 1)}
+            counts = [0] * 64
+            for shingle in shingles:
+                value = int.from_bytes(
+                    blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"
+                )
+                for bit in range(64):
+                    counts[bit] += value >> bit & 1
+
+            return sum(1 << bit for bit in range(64) if counts[bit] > len(shingles) / 2)
+
+        # Enough shingles for more then 65535 to set the same bit
+        rng = random.Random(0)
+        content = "".join(rng.choice(string.ascii_letters) for _ in range(150000))
+        assert len({content[i : i + 4] for i in range(len(content) - 3)}) > 2 * 65535
+        assert simhash(content) == reference(content)
+
+    def test_flip_masks(self):
+        assert flip_masks(0) == (0,)
+        assert len(flip_masks(1)) == 17
+
+    def test_init_raises(self, create_handler):
+        with pytest.raises(ValueError):
+            AntiRaid(create_handler, min_members=1)
+
+        with pytest.raises(ValueError):
+            AntiRaid(create_handler, time_period=0)
+
+        with pytest.raises(ValueError):
+            AntiRaid(create_handler, max_distance=32)
+
+    @pytest.mark.asyncio
+    async def test_propagate(self, create_handler):
+        plugin = AntiRaid(create_handler, min_members=3)
+        for author_id in range(1, 3):
+            message = MockedMessage(
+                author_id=author_id, message_content="Free nitro, click here!"
+            ).to_mock()
+            assert await plugin.propagate(message) == {"action": "No action taken"}
+
+        # The same member again doesn't make a raid
+        message = MockedMessage(
+            author_id=2, message_content="free nitro click here"
+        ).to_mock()
+        assert await plugin.propagate(message) == {"action": "No action taken"}
+
+        message = MockedMessage(
+            author_id=3, message_content="FREE NITRO click here!!"
+        ).to_mock()
+        assert await plugin.propagate(message) == RaidPunishment(
+            guild_id=123456789,
+            channel_id=98987,
+            member_ids=[1, 2, 3],
+            fingerprint=simhash(
+                create_handler.similarity_engine.process("free nitro click here")
+            ),
+        )
+
+    @pytest.mark.asyncio
+    async def test_propagate_reports_new_members(self, create_handler):
+        plugin = AntiRaid(create_handler, min_members=2)
+        results = [
+            await plugin.propagate(
+                MockedMessage(author_id=author_id, message_content="Raid").to_mock()
+            )
+            for author_id in (1, 2, 2, 3)
+        ]
+
+        assert results[0] == {"action": "No action taken"}
+        assert results[1].member_ids == [1, 2]
+        # Only members not already reported are returned
+        assert results[2] == {"action": "No action taken"}
+        assert results[3].member_ids == [3]
+
+        window = plugin._windows[123456789]
+        assert len(window.clusters) == 1
+        assert list(window.clusters[results[1].fingerprint].members) == [1, 2, 3]
+
+    def test_window_merges_clusters(self):
+        window = GuildWindow()
+        first = Fingerprint(1, 0b0, 1, block_values(0b0))
+        second = Fingerprint(2, 0b11, 2, block_values(0b11))
+        # Close enough to both of the others
+        bridge = Fingerprint(3, 0b1, 3, block_values(0b1))
+
+        assert window.add(first, 1, 5) is not window.add(second, 1, 5)
+        cluster = window.add(bridge, 1, 5)
+        assert sorted(cluster.members) == [1, 2, 3]
+        assert set(window.clusters.values()) == {cluster}
+
+        window.expire(2)
+        assert list(cluster.members) == [3]
+        assert list(window.clusters) == [0b1]
+
+    @pytest.mark.asyncio
+    async def test_propagate_expires(self, create_handler):
+        plugin = AntiRaid(create_handler, min_members=2, time_period=1000)
+        message = MockedMessage(author_id=1, message_content="Raid").to_mock()
+        message.created_at = datetime.datetime.now() - datetime.timedelta(seconds=5)
+        await plugin.propagate(message)
+
+        message = MockedMessage(author_id=2, message_content="Raid").to_mock()
+        assert await plugin.propagate(message) == {"action": "No action taken"}
+
+        window = plugin._windows[123456789]
+        assert len(window.fingerprints) == 1
+        assert all(len(index) == 1 for index in window.index)
+
+    @pytest.mark.asyncio
+    async def test_idle_windows_are_evicted(self, create_handler):
+        plugin = AntiRaid(create_handler, min_members=2, time_period=1000)
+        message = MockedMessage(
+            author_id=1, guild_id=1, message_content="Raid"
+        ).to_mock()
+        message.created_at = datetime.datetime.now() - datetime.timedelta(seconds=5)
+        await plugin.propagate(message)
+        assert list(plugin._windows) == [1]
+
+        # Guild 1 has had nothing since, so all of its clusters have expired
+        await plugin.propagate(
+            MockedMessage(author_id=2, guild_id=2, message_content="Raid").to_mock()
+        )
+        assert list(plugin._windows) == [2]
+
+        await plugin.propagate(
+            MockedMessage(author_id=3, guild_id=3, message_content="Raid").to_mock()
+        )
+        assert list(plugin._windows) == [2, 3]
+
+    @pytest.mark.asyncio
+    async def test_propagate_ignores_empty(self, create_handler):
+        plugin = AntiRaid(create_handler, min_members=2)
+        for author_id in range(1, 4):
+            message = MockedMessage(author_id=author_id, message_content="").to_mock()
+            assert await plugin.propagate(message) == {"action": "No action taken"}
+
+        assert plugin._windows == {}
@@ -1,13 +1,15 @@
+import asyncio
 import json
 import os.path
 from typing import Optional
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
 
 import discord
 import nextcord
 import pytest
 from attr import asdict
 from discord.ext import commands  # noqa
+from fakeredis import FakeAsyncRedis
 from hypothesis import given
 from hypothesis import strategies as st
 from hypothesis.strategies import text
@@ -21,9 +23,13 @@ from antispam import (
     PluginError,
     PropagateFailure,
 )
-from antispam.base_plugin import BasePlugin
+from antispam.abc import Cache
+from antispam.anti_spam_handler import build_plugin_stages
+from antispam.base_plugin import BasePlugin, GuildSet
 from antispam.caches import MemoryCache
+from antispam.caches.batch_cache import BatchCache
 from antispam.caches.mongo import MongoCache
+from antispam.caches.redis import RedisCache
 from antispam.dataclasses import CorePayload, Guild, Member, Message
 from antispam.enums import IgnoreType, Library, ResetType
 from antispam.libs.dpy import DPY
@@ -31,7 +37,8 @@ from antispam.libs.dpy_forks.lib_disnake import Disnake
 from antispam.libs.dpy_forks.lib_enhanced_dpy import EnhancedDPY
 from antispam.libs.dpy_forks.lib_nextcord import Nextcord
 from antispam.libs.lib_hikari import Hikari
-from antispam.plugins import Stats as StatsPlugin
+from antispam.plugins import AntiSpamTracker, Stats as StatsPlugin
+from antispam.stage_timings import StageTimings
 from .conftest import MockClass
 
 from .mocks import MockedMember, MockedMessage
@@ -80,6 +87,13 @@ class TestAntiSpamHandler:
         with pytest.raises(ValueError):
             AntiSpamHandler(create_bot, Library.DPY, cache=1)
 
+    def test_executor_typing(self, create_handler):
+        with pytest.raises(ValueError):
+            AntiSpamHandler(create_handler.bot, Library.DPY, executor=1)
+
+        with pytest.raises(ValueError):
+            AntiSpamHandler(create_handler.bot, Library.DPY, offload_threshold=-1)
+
     def test_add_ignored_item(self, create_handler):
         """Tests the handler adds ignored items correctly"""
         # ensure they start empty
@@ -552,6 +566,290 @@ class TestAntiSpamHandler:
         assert return_data["status"] == "Ignoring this channel: 98987"
         create_handler.options.ignored_channels.discard(98987)
 
+    @pytest.mark.asyncio
+    async def test_propagation_filter(self, create_handler):
+        await create_handler.propagate(MockedMessage().to_mock())
+        propagation_filter = create_handler.propagation_filters[123456789]
+        assert not propagation_filter.ignored_channels
+
+        # Cached between messages
+        await create_handler.propagate(
+            MockedMessage(message_id=2, author_id=2).to_mock()
+        )
+        assert create_handler.propagation_filters[123456789] is propagation_filter
+
+        await create_handler.add_guild_options(
+            123456789, Options(ignored_members={12345})
+        )
+        assert 123456789 not in create_handler.propagation_filters
+
+        return_data = await create_handler.propagate(MockedMessage().to_mock())
+        assert return_data == {"status": "Ignoring this member: 12345"}
+
+        create_handler.add_ignored_item(1, IgnoreType.ROLE)
+        assert not create_handler.propagation_filters
+
+        # Changing the handlers options in place drops the filters too
+        await create_handler.propagate(MockedMessage(message_id=3).to_mock())
+        create_handler.options.ignored_channels.add(98987)
+        assert not create_handler.propagation_filters
+        create_handler.options.ignored_channels.discard(98987)
+
+        await create_handler.remove_guild_options(123456789)
+        return_data = await create_handler.propagate(MockedMessage().to_mock())
+        assert isinstance(return_data, CorePayload)
+
+    @pytest.mark.asyncio
+    async def test_minimal_custom_cache(self, create_handler):
+        class MinimalCache:
+            """Only what the Cache Protocol requires, without subclassing it"""
+
+            def __init__(self, handler):
+                self.handler = handler
+                self.inner = MemoryCache(handler)
+
+            async def initialize(self, *args, **kwargs):
+                pass
+
+            async def get_guild(self, guild_id):
+                return await self.inner.get_guild(guild_id)
+
+            async def set_guild(self, guild):
+                await self.inner.set_guild(guild)
+
+            async def delete_guild(self, guild_id):
+                await self.inner.delete_guild(guild_id)
+
+            async def get_member(self, member_id, guild_id):
+                return await self.inner.get_member(member_id, guild_id)
+
+            async def set_member(self, member):
+                await self.inner.set_member(member)
+
+            async def delete_member(self, member_id, guild_id):
+                await self.inner.delete_member(member_id, guild_id)
+
+            async def add_message(self, message):
+                await self.inner.add_message(message)
+
+            async def reset_member_count(self, member_id, guild_id, reset_type):
+                await self.inner.reset_member_count(member_id, guild_id, reset_type)
+
+            async def get_all_guilds(self):
+                async for guild in self.inner.get_all_guilds():
+                    yield guild
+
+            async def get_all_members(self, guild_id):
+                async for member in self.inner.get_all_members(guild_id):
+                    yield member
+
+            async def drop(self):
+                await self.inner.drop()
+
+        cache = MinimalCache(create_handler)
+        assert isinstance(cache, Cache)
+        create_handler.set_cache(cache)
+
+        results = [
+            await create_handler.propagate(MockedMessage(message_id=i).to_mock())
+            for i in range(5)
+        ]
+        assert results[-1].member_was_warned is True
+
+        await create_handler.add_guild_options(123456789, Options(warn_threshold=5))
+        options = await create_handler.get_guild_options(123456789)
+        assert options.warn_threshold == 5
+
+    @pytest.mark.asyncio
+    async def test_propagate_many(self, create_handler):
+        messages = [
+            MockedMessage(message_id=i, message_content="Spam spam").to_mock()
+            for i in range(5)
+        ]
+        messages.insert(1, MockedMessage(author_id=5).to_mock())
+
+        results = await create_handler.propagate_many(messages)
+
+        assert len(results) == 6
+        assert results[1] == CorePayload()
+        assert results[-1].member_was_warned is True
+        member = await create_handler.cache.get_member(12345, 123456789)
+        assert len(member.messages) == 5
+
+    @pytest.mark.asyncio
+    async def test_propagate_many_round_trips(self, create_handler):
+        async def ingest(batch: bool) -> FakeAsyncRedis:
+            redis = FakeAsyncRedis()
+            # Every command is either sent alone or in a pipeline
+            redis.execute_command = MagicMock(wraps=redis.execute_command)
+            redis.pipeline = MagicMock(wraps=redis.pipeline)
+            create_handler.set_cache(RedisCache(create_handler, redis))
+
+            messages = [
+                MockedMessage(message_id=i, author_id=i % 2).to_mock()
+                for i in range(10)
+            ]
+            if batch:
+                await create_handler.propagate_many(messages)
+            else:
+                for message in messages:
+                    await create_handler.propagate(message)
+
+            return redis
+
+        sequential = await ingest(batch=False)
+        batched = await ingest(batch=True)
+
+        assert (
+            batched.execute_command.call_count + batched.pipeline.call_count
+            < sequential.execute_command.call_count + sequential.pipeline.call_count
+        )
+
+    @pytest.mark.asyncio
+    async def test_propagate_many_only_loads_needed_members(self, create_handler):
+        redis = FakeAsyncRedis()
+        create_handler.set_cache(RedisCache(create_handler, redis))
+        await create_handler.cache.set_guild(Guild(123456789, Options()))
+        for member_id in range(10):
+            await create_handler.cache.set_member(Member(member_id, 123456789))
+
+        cache = create_handler.cache
+        cache.get_member = AsyncMock(wraps=cache.get_member)
+        redis.get = MagicMock(wraps=redis.get)
+        await create_handler.propagate_many(
+            [MockedMessage(message_id=i).to_mock() for i in range(3)]
+        )
+
+        keys = {call.args[0] for call in redis.get.call_args_list}
+        assert keys == {"GUILD:123456789"}
+        members = {call.args for call in cache.get_member.call_args_list}
+        assert members == {(12345, 123456789)}
+
+    @pytest.mark.asyncio
+    async def test_propagate_many_flush_round_trips(self, create_handler):
+        redis = FakeAsyncRedis()
+        create_handler.set_cache(RedisCache(create_handler, redis))
+        cache = create_handler.cache
+        await cache.set_guild(Guild(123456789, Options()))
+        for method in ("get_member", "set_member", "get_members", "set_members"):
+            setattr(cache, method, AsyncMock(wraps=getattr(cache, method)))
+
+        redis.pipeline = MagicMock(wraps=redis.pipeline)
+        flushed = []
+        original_flush = BatchCache.flush
+
+        async def flush(batch_cache):
+            start = redis.pipeline.call_count
+            await original_flush(batch_cache)
+            flushed.append(redis.pipeline.call_count - start)
+
+        with patch.object(BatchCache, "flush", flush):
+            await create_handler.propagate_many(
+                [MockedMessage(message_id=i, author_id=i).to_mock() for i in range(20)]
+            )
+
+        # Every member is read and written back in one round trip each
+        assert flushed == [2]
+        assert cache.get_member.call_count == 20
+        assert cache.set_member.call_count == 0
+        assert cache.get_members.call_count == 1
+        assert cache.set_members.call_count == 1
+        for member_id in range(20):
+            member = await cache.get_member(member_id, 123456789)
+            assert [message.id for message in member.messages] == [member_id]
+
+    @pytest.mark.asyncio
+    async def test_batch_cache_flushes_concurrently(self, create_handler):
+        in_flight = []
+        peak = []
+
+        class SlowCache(MemoryCache):
+            async def set_member(self, member: Member) -> None:
+                in_flight.append(member.id)
+                peak.append(len(in_flight))
+                await asyncio.sleep(0)
+                await super().set_member(member)
+                in_flight.remove(member.id)
+
+        wrapped = SlowCache(create_handler)
+        await wrapped.set_guild(Guild(1, Options()))
+        wrapped.get_member = AsyncMock(wraps=wrapped.get_member)
+        batch = BatchCache(create_handler, wrapped)
+        for member_id in range(10):
+            await batch.add_message(Message(member_id, 2, 1, member_id, "Hello"))
+
+        peak.clear()
+        await batch.flush()
+
+        assert max(peak) == 10
+        # Once to load each member, then once more when flushing
+        assert wrapped.get_member.call_count == 20
+        for member_id in range(10):
+            member = await wrapped.get_member(member_id, 1)
+            assert [message.id for message in member.messages] == [member_id]
+
+    @pytest.mark.asyncio
+    async def test_propagate_many_matches_propagate(self):
+        async def ingest(batch: bool):
+            bot = MockedMember(mock_type="bot").to_mock()
+            bot.get_guild = Mock()
+            handler = AntiSpamHandler(
+                bot, Library.DPY, options=Options(use_timeouts=False)
+            )
+            handler.set_cache(RedisCache(handler, FakeAsyncRedis()))
+            handler.register_plugin(AntiSpamTracker(handler, 3))
+
+            messages = [MockedMessage(message_id=i).to_mock() for i in range(6)]
+            if batch:
+                results = await handler.propagate_many(messages)
+            else:
+                results = [await handler.propagate(message) for message in messages]
+
+            member = await handler.cache.get_member(12345, 123456789)
+            return results, member
+
+        sequential, sequential_member = await ingest(batch=False)
+        batched, batched_member = await ingest(batch=True)
+
+        assert [r.member_was_warned for r in batched] == [
+            r.member_was_warned for r in sequential
+        ]
+        assert [r.member_duplicate_count for r in batched] == [
+            r.member_duplicate_count for r in sequential
+        ]
+        assert batched_member.warn_count == sequential_member.warn_count
+        assert [m.id for m in batched_member.messages] == [
+            m.id for m in sequential_member.messages
+        ]
+        assert len(batched_member.addons["AntiSpamTracker"]) == len(
+            sequential_member.addons["AntiSpamTracker"]
+        )
+
+    @pytest.mark.asyncio
+    async def test_propagate_many_holds_locks(self, create_handler):
+        create_handler.set_cache(RedisCache(create_handler, FakeAsyncRedis()))
+        messages = [MockedMessage(message_id=i).to_mock() for i in range(3)]
+
+        batch = asyncio.create_task(create_handler.propagate_many(messages[:2]))
+        await asyncio.sleep(0)
+        await create_handler.propagate(messages[2])
+        await batch
+
+        member = await create_handler.cache.get_member(12345, 123456789)
+        assert [m.id for m in member.messages] == [0, 1, 2]
+        assert create_handler.member_locks.metrics.contended_acquisitions == 1
+
+    @pytest.mark.asyncio
+    async def test_propagate_many_exceptions(self, create_handler):
+        message = MockedMessage().to_mock()
+        create_handler._propagate_member = AsyncMock(side_effect=ValueError)
+
+        with pytest.raises(ValueError):
+            await create_handler.propagate_many([message])
+
+        results = await create_handler.propagate_many([message], return_exceptions=True)
+        assert isinstance(results[0], ValueError)
+
     @pytest.mark.asyncio
     async def test_propagate_guild_ignore(self):
         bot = AsyncMock()
@@ -822,6 +1120,207 @@ class TestAntiSpamHandler:
 
         assert test.propagate.call_count == 1
 
+    def test_build_plugin_stages(self):
+        def plugin(name, *, safe=True, depends_on=()):
+            return type(
+                name,
+                (BasePlugin,),
+                {"concurrent_safe": safe, "depends_on": depends_on},
+            )(False)
+
+        a, b, c = plugin("A"), plugin("B", depends_on=("A",)), plugin("C")
+        serial = plugin("Serial", safe=False)
+        plugins = {"a": a, "b": b, "c": c, "serial": serial}
+
+        stages = build_plugin_stages(plugins)
+        assert [[name for name, _ in stage] for stage in stages] == [
+            ["a"],
+            ["b", "c"],
+            ["serial"],
+        ]
+
+        # Unregistered dependencies are ignored
+        assert build_plugin_stages({"b": b}) == [[("b", b)]]
+
+        with pytest.raises(PluginError):
+            build_plugin_stages(
+                {
+                    "x": plugin("X", depends_on=("y",)),
+                    "y": plugin("Y", depends_on=("x",)),
+                }
+            )
+
+    @pytest.mark.asyncio
+    async def test_concurrent_after_invoke_plugins(self, create_handler):
+        events = []
+
+        class Slow(BasePlugin):
+            concurrent_safe = True
+
+            async def propagate(self, message, data=None):
+                events.append(f"{self.__class__.__name__} start")
+                await asyncio.sleep(0.01)
+                events.append(f"{self.__class__.__name__} end")
+                return self.__class__.__name__
+
+        class Second(Slow):
+            pass
+
+        class Third(Slow):
+            depends_on = ("slow",)
+
+            async def propagate(self, message, data=None):
+                assert data.after_invoke_extensions == {
+                    "Slow": "Slow",
+                    "Second": "Second",
+                }
+                return await super().propagate(message, data)
+
+        create_handler.register_plugin(Slow(False))
+        create_handler.register_plugin(Second(False))
+        create_handler.register_plugin(Third(False))
+
+        return_data = await create_handler.propagate(MockedMessage().to_mock())
+
+        assert events[:2] == ["Slow start", "Second start"]
+        assert events[-2:] == ["Third start", "Third end"]
+        assert list(return_data.after_invoke_extensions) == ["Slow", "Second", "Third"]
+        # Plugins are timed without stage_timings being set
+        assert create_handler.stage_timings is None
+        assert create_handler.plugin_timings.get("after_invoke:slow").count == 1
+        assert create_handler.plugin_timings.get("after_invoke:third").max > 0
+
+        create_handler.stage_timings = StageTimings()
+        await create_handler.propagate(MockedMessage(message_id=2).to_mock())
+        assert create_handler.plugin_timings is create_handler.stage_timings
+        assert create_handler.stage_timings.get("after_invoke:second").count == 1
+
+    @pytest.mark.asyncio
+    async def test_after_invoke_plugin_subscriptions(self, create_handler):
+        calls = []
+
+        class Everything(BasePlugin):
+            async def propagate(self, message, data=None):
+                calls.append(self.__class__.__name__)
+
+        class Punished(Everything):
+            only_punished = True
+
+        class Mentions(Everything):
+            def is_subscribed_to(self, message, data) -> bool:
+                return bool(message.mentions)
+
+        everything = Everything(False)
+        create_handler.register_plugin(everything)
+        create_handler.register_plugin(Punished(False))
+        create_handler.register_plugin(Mentions(False))
+
+        return_data = await create_handler.propagate(MockedMessage().to_mock())
+        assert calls == ["Everything"]
+        # Skipped plugins still have an entry
+        assert return_data.after_invoke_extensions == {
+            "Everything": None,
+            "Punished": None,
+            "Mentions": None,
+        }
+
+        # Changing the sets in place after the first message is respected
+        everything.blacklisted_guilds.add(123456789)
+        calls.clear()
+        await create_handler.propagate(
+            MockedMessage(message_id=2, author_id=2).to_mock()
+        )
+        assert calls == []
+
+        everything.blacklisted_guilds.discard(123456789)
+        everything.subscribed_guilds = {1}
+        calls.clear()
+        await create_handler.propagate(
+            MockedMessage(message_id=3, author_id=3).to_mock()
+        )
+        assert calls == []
+
+        everything.subscribed_guilds.add(123456789)
+        calls.clear()
+        await create_handler.propagate(
+            MockedMessage(message_id=4, author_id=4).to_mock()
+        )
+        assert calls == ["Everything"]
+
+    def test_guild_set(self):
+        guilds = GuildSet({1, 2})
+        other = GuildSet({1, 2})
+        assert guilds == {1, 2} and {1, 2} == guilds
+        assert guilds.version == 0
+
+        guilds.add(3)
+        guilds.add(3)
+        assert guilds.version == 1
+        # Each set counts only its own changes
+        assert other.version == 0
+
+        guilds.discard(4)
+        guilds.remove(1)
+        guilds |= {5}
+        guilds.update({6}, {7})
+        guilds.difference_update({6, 7})
+        assert guilds == {2, 3, 5}
+        assert guilds.version == 7
+
+        plugin = BasePlugin()
+        version = plugin.guilds_version
+        plugin.blacklisted_guilds.add(1)
+        assert plugin.guilds_version != version
+
+        version = plugin.guilds_version
+        plugin.subscribed_guilds = {1}
+        assert isinstance(plugin.subscribed_guilds, GuildSet)
+        assert plugin.guilds_version != version
+
+    @pytest.mark.asyncio
+    async def test_pre_invoke_plugin_subscriptions(self, create_handler):
+        calls = []
+
+        class Pre(BasePlugin):
+            async def propagate(self, message, data=None):
+                calls.append(message.id)
+
+        plugin = Pre()
+        create_handler.register_plugin(plugin)
+
+        # Pre invoke plugins also follow subscribed_guilds
+        plugin.subscribed_guilds = {1}
+        await create_handler.propagate(MockedMessage(message_id=1).to_mock())
+        assert calls == []
+
+        plugin.subscribed_guilds.add(123456789)
+        await create_handler.propagate(MockedMessage(message_id=2).to_mock())
+        assert calls == [2]
+
+        plugin.blacklisted_guilds.add(123456789)
+        await create_handler.propagate(MockedMessage(message_id=3).to_mock())
+        assert calls == [2]
+
+    @pytest.mark.asyncio
+    async def test_after_invoke_plugin_skipped_returns(self, create_handler):
+        class NoInit(BasePlugin):
+            def __init__(self):
+                # Doesn't call super().__init__()
+                self.is_pre_invoke = False
+
+            async def propagate(self, message, data=None):
+                return 1
+
+        create_handler.options.no_punish = True
+        create_handler.register_plugin(NoInit())
+        create_handler.register_plugin(AntiSpamTracker(create_handler, 3))
+
+        return_data = await create_handler.propagate(MockedMessage().to_mock())
+        assert return_data.after_invoke_extensions == {
+            "NoInit": 1,
+            "AntiSpamTracker": {"status": "Cache updated"},
+        }
+
     @pytest.mark.asyncio
     async def test_invalid_message(self, create_handler):
         """Tests InvalidMessage gets raised right"""
@@ -860,6 +1359,22 @@ class TestAntiSpamHandler:
         with pytest.raises(UnsupportedAction):
             await ash.propagate(MockedMessage().to_mock())
 
+    @pytest.mark.asyncio
+    async def test_lib_check_override(self, create_handler):
+        assert create_handler.lib_handler.supports_propagate_data
+
+        class Custom(DPY):
+            # Overrides the checks, so must not opt in
+            supports_propagate_data = False
+
+            async def check_message_can_be_propagated(self, message):
+                raise PropagateFailure(data={"status": "Custom"})
+
+        create_handler.lib_handler = Custom(create_handler)
+        return_data = await create_handler.propagate(MockedMessage().to_mock())
+        assert return_data == {"status": "Custom"}
+        assert not Disnake.supports_propagate_data
+
     @pytest.mark.asyncio
     async def test_get_options(self, create_handler):
         options = await create_handler.get_options()
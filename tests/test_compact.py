@@ -0,0 +1,150 @@
+import datetime
+
+import attr
+import pytest
+
+from antispam.caches import MemoryCache
+from antispam.dataclasses import CompactMessage, CompactMessages, Member, Message
+
+NOW = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def create_message(message_id, content="Hello world", seconds=0, **kwargs):
+    return Message(
+        message_id,
+        kwargs.pop("channel_id", 1),
+        kwargs.pop("guild_id", 1),
+        kwargs.pop("author_id", 1),
+        content,
+        NOW + datetime.timedelta(seconds=seconds),
+        **kwargs,
+    )
+
+
+class TestCompactMessages:
+    def test_view(self, create_handler):
+        messages = CompactMessages(engine=create_handler.similarity_engine)
+        messages.append(create_message(1, "Hello WORLD", is_duplicate=True))
+
+        view = messages[0]
+        assert isinstance(view, CompactMessage)
+        assert view == create_message(1, "hello world", is_duplicate=True)
+        assert view.creation_time == NOW
+        assert attr.asdict(view)["content"] == "hello world"
+
+        view.is_duplicate = False
+        assert messages[0].is_duplicate is False
+
+    def test_processed_content_is_shared(self, create_handler):
+        messages = CompactMessages(engine=create_handler.similarity_engine)
+        messages.append(create_message(1, "Hello WORLD"))
+        messages.append(create_message(2, "hello world"))
+        messages.append(create_message(3, "Something else"))
+
+        # Not rebuilt on each access, and shared between equal messages
+        assert messages[0].processed_content is messages[0].processed_content
+        assert messages[0].processed_content is messages[1].processed_content
+        assert messages[2].processed_content.content == "else something"
+        assert messages[0].get_processed_content(create_handler.similarity_engine) is (
+            messages[1].processed_content
+        )
+
+        del messages[0]
+        assert messages[0].processed_content.content == "hello world"
+
+    def test_requires_engine(self):
+        with pytest.raises(ValueError):
+            CompactMessages([create_message(1)])
+
+    def test_same_member(self, create_handler):
+        messages = CompactMessages(engine=create_handler.similarity_engine)
+        messages.append(create_message(1))
+        with pytest.raises(ValueError):
+            messages.append(create_message(2, author_id=2))
+
+    def test_delete(self, create_handler):
+        messages = CompactMessages(
+            [create_message(i, seconds=i) for i in range(4)],
+            engine=create_handler.similarity_engine,
+        )
+        messages[1].is_duplicate = True
+        removed = messages[1]
+
+        del messages[1]
+        assert [m.id for m in messages] == [0, 2, 3]
+        assert not any(m.is_duplicate for m in messages)
+        # Removed views keep working
+        assert removed.id == 1
+        assert removed.is_duplicate is True
+
+        messages[2].is_duplicate = True
+        del messages[:2]
+        assert [m.id for m in messages] == [3]
+        assert messages[0].is_duplicate is True
+        assert len(messages._interned) == 1
+
+    def test_delete_oldest_is_deferred(self, create_handler):
+        messages = CompactMessages(
+            [create_message(i, seconds=i) for i in range(8)],
+            engine=create_handler.similarity_engine,
+        )
+        messages[3].is_duplicate = True
+        views = list(messages)
+
+        # Storage is only compacted once half of it is removed
+        del messages[0]
+        del messages[0]
+        assert len(messages._ids) == 8
+        assert len(messages) == 6
+        assert [m.id for m in messages] == [2, 3, 4, 5, 6, 7]
+        assert messages[1] is views[3] and messages[1].is_duplicate is True
+        assert messages[-1].id == 7
+        assert [m.id for m in messages[1:3]] == [3, 4]
+
+        messages.append(create_message(8, seconds=8))
+        del messages[:2]
+        assert len(messages._ids) == 9
+        assert [m.id for m in messages] == [4, 5, 6, 7, 8]
+
+        del messages[0]
+        assert len(messages._ids) == 4
+        assert [m.id for m in messages] == [5, 6, 7, 8]
+        assert not any(m.is_duplicate for m in messages)
+        assert views[3].id == 3 and views[3].is_duplicate is True
+
+        messages.sort(key=lambda m: m.id, reverse=True)
+        assert [m.id for m in messages] == [8, 7, 6, 5]
+        del messages[1]
+        assert [m.id for m in messages] == [8, 6, 5]
+
+    def test_insert_and_sort(self, create_handler):
+        messages = CompactMessages(
+            [create_message(i, seconds=i) for i in range(3)],
+            engine=create_handler.similarity_engine,
+        )
+        messages.insert(0, create_message(3, seconds=-1))
+        assert [m.id for m in messages] == [3, 0, 1, 2]
+
+        messages.sort(key=lambda m: m.creation_time, reverse=True)
+        assert [m.id for m in messages] == [2, 1, 0, 3]
+
+    def test_expire_messages(self, create_handler):
+        member = Member(1, 1)
+        member.messages = CompactMessages(
+            [create_message(i, seconds=i) for i in range(3)],
+            engine=create_handler.similarity_engine,
+        )
+        expired = member.expire_messages(NOW + datetime.timedelta(seconds=1))
+
+        assert [m.id for m in expired] == [0, 1]
+        assert [m.id for m in member.messages] == [2]
+
+    @pytest.mark.asyncio
+    async def test_memory_cache(self, create_handler):
+        cache = MemoryCache(create_handler, compact_messages=True)
+        await cache.add_message(create_message(1))
+        await cache.add_message(create_message(2, seconds=1))
+
+        member = await cache.get_member(1, 1)
+        assert isinstance(member.messages, CompactMessages)
+        assert [m.id for m in member.messages] == [1, 2]
@@ -1,5 +1,6 @@
 import datetime
-from unittest.mock import AsyncMock
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import AsyncMock, Mock, patch
 
 import nextcord
 import pytest
@@ -208,6 +209,202 @@ class TestCore:
         assert member.messages[3].is_duplicate is True
         assert member.messages[4].is_duplicate is True
 
+    def test_calculate_ratios_exact_matches_skip_engine(self, create_core):
+        member = Member(1, 1)
+        member.messages = [
+            Message(1, 1, 1, 1, "Spam tho", datetime.datetime.now()),
+            Message(2, 1, 1, 1, "spam THO!", datetime.datetime.now()),
+            Message(3, 1, 1, 1, "Something else", datetime.datetime.now()),
+        ]
+        message = Message(4, 1, 1, 1, "Spam tho", datetime.datetime.now())
+        compare = create_core.handler.similarity_engine.compare = Mock(return_value=0)
+
+        create_core._calculate_ratios(message, member, Guild(1))
+
+        assert member.duplicate_counter == 3
+        assert message.is_duplicate is True
+        assert member.messages[0].is_duplicate is True
+        assert member.messages[1].is_duplicate is True
+        assert member.messages[2].is_duplicate is False
+        # Only the non exact message needed scoring
+        assert compare.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_calculate_ratios_only_flags_counted_matches(self, create_core):
+        guild = Guild(1, Options(message_duplicate_count=3))
+        sent = datetime.datetime.now() - datetime.timedelta(minutes=1)
+        member = Member(1, 1)
+        member.messages = [Message(i, 1, 1, 1, "Spam", sent) for i in range(5)]
+        message = Message(5, 1, 1, 1, "Spam", datetime.datetime.now())
+
+        create_core._calculate_ratios(message, member, guild)
+
+        # More repeats then were needed to reach the threshold
+        assert member.duplicate_counter == 3
+        assert [m.is_duplicate for m in member.messages] == [True] * 2 + [False] * 3
+
+        await create_core.clean_up(member, datetime.datetime.now(), 1, guild)
+
+        # Expiring the repeats only takes back what they added
+        assert member.messages == []
+        assert member.duplicate_counter == 1
+
+    @pytest.mark.asyncio
+    async def test_clean_up_updates_digest_index(self, create_core):
+        engine = create_core.handler.similarity_engine
+        member = Member(1, 1)
+        member.messages = [
+            Message(
+                1,
+                1,
+                1,
+                1,
+                "Spam",
+                datetime.datetime.now() - datetime.timedelta(minutes=1),
+            ),
+            Message(2, 1, 1, 1, "Spam", datetime.datetime.now()),
+        ]
+        digest = member.messages[0].get_processed_content(engine).digest
+        assert len(member.get_digest_index(engine)[digest]) == 2
+
+        await create_core.clean_up(member, datetime.datetime.now(), 1, Guild(1))
+
+        index = member.get_digest_index(engine)
+        assert list(index[digest]) == [member.messages[0]]
+        assert member.messages[0].id == 2
+
+        new_message = Message(3, 1, 1, 1, "Spam", datetime.datetime.now())
+        member.messages.append(new_message)
+        member.track_message(new_message, engine)
+        assert index is member.get_digest_index(engine)
+        assert len(index[digest]) == 2
+
+    @pytest.mark.asyncio
+    async def test_score_in_executor(self, create_core):
+        member = Member(1, 1)
+        member.messages = [
+            Message(1, 1, 1, 1, "Hello world " * 20, datetime.datetime.now()),
+            Message(2, 1, 1, 1, "Something else", datetime.datetime.now()),
+        ]
+        message = Message(3, 1, 1, 1, "Hello world " * 21, datetime.datetime.now())
+        metrics = create_core.handler.offload_metrics
+        comparisons = create_core._get_comparisons(message, member, Guild(1))
+
+        # Not configured
+        assert (
+            await create_core._score_in_executor(message, Guild(1), comparisons) is None
+        )
+
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            create_core.handler.executor = executor
+            create_core.handler.offload_threshold = 1000
+            assert (
+                await create_core._score_in_executor(message, Guild(1), comparisons)
+                is None
+            )
+            assert metrics.inline_batches == 1
+
+            create_core.handler.offload_threshold = 100
+            scores = await create_core._score_in_executor(
+                message, Guild(1), comparisons
+            )
+
+        assert scores[id(member.messages[0])] >= 90
+        assert scores[id(member.messages[1])] == 0
+        assert metrics.offloaded_batches == 1
+        assert metrics.offloaded_comparisons == 2
+
+        create_core.handler.similarity_engine.compare = Mock(return_value=0)
+        # The comparisons aren't found again
+        with patch.object(type(create_core), "_get_comparisons") as get_comparisons:
+            create_core._calculate_ratios(
+                message, member, Guild(1), scores=scores, comparisons=comparisons
+            )
+
+        assert get_comparisons.call_count == 0
+        assert create_core.handler.similarity_engine.compare.call_count == 0
+        assert member.duplicate_counter == 2
+
+    @pytest.mark.asyncio
+    async def test_clean_up_per_channel_counters(self, create_core):
+        old = datetime.datetime.now() - datetime.timedelta(minutes=1)
+        member = Member(1, 1)
+        member.messages = [
+            Message(1, 1, 1, 1, "Spam", old, is_duplicate=True),
+            Message(2, 2, 1, 1, "Spam", old, is_duplicate=True),
+            Message(3, 2, 1, 1, "Spam", datetime.datetime.now(), is_duplicate=True),
+        ]
+        member.duplicate_channel_counter_dict = {1: 2, 2: 3}
+        guild = Guild(1, options=Options(per_channel_spam=True))
+
+        await create_core.clean_up(member, datetime.datetime.now(), 1, guild)
+
+        # Channel 1 has nothing left, channel 2 only lost one duplicate
+        assert member.duplicate_channel_counter_dict == {2: 2}
+        assert list(member.get_channel_messages(1)) == []
+        assert [m.id for m in member.get_channel_messages(2)] == [3]
+
+    def test_expire_messages(self):
+        now = datetime.datetime.now()
+        member = Member(1, 1)
+        messages = member.messages
+        member.messages.extend(
+            [
+                Message(1, 1, 1, 1, "Old", now - datetime.timedelta(minutes=2)),
+                Message(2, 1, 1, 1, "Old", now - datetime.timedelta(minutes=1)),
+                Message(3, 1, 1, 1, "New", now),
+            ]
+        )
+
+        expired = member.expire_messages(now - datetime.timedelta(seconds=30))
+
+        assert [m.id for m in expired] == [1, 2]
+        assert [m.id for m in member.messages] == [3]
+        # Evicted in place rather then rebuilt
+        assert member.messages is messages
+        assert member.expire_messages(now - datetime.timedelta(seconds=30)) == []
+
+    def test_calculate_ratios_lsh(self, create_core):
+        member = Member(1, 1)
+        member.messages = [
+            Message(
+                1,
+                1,
+                1,
+                1,
+                "Join my server for free nitro giveaways every day",
+                datetime.datetime.now(),
+            ),
+            Message(
+                2,
+                1,
+                1,
+                1,
+                "What did everyone think of the game last night?",
+                datetime.datetime.now(),
+            ),
+        ]
+        guild = Guild(1, options=Options(use_lsh=True))
+        message = Message(
+            3,
+            1,
+            1,
+            1,
+            "Join my server for free nitro giveaways every single day",
+            datetime.datetime.now(),
+        )
+        compare = Mock(wraps=create_core.handler.similarity_engine.compare)
+        create_core.handler.similarity_engine.compare = compare
+
+        create_core._calculate_ratios(message, member, guild)
+
+        assert member.duplicate_counter == 2
+        assert message.is_duplicate is True
+        assert member.messages[0].is_duplicate is True
+        assert member.messages[1].is_duplicate is False
+        # The unrelated message shares no bands so is never scored
+        assert compare.call_count == 1
+
     def test_calculate_ratios_per_channel(self, create_core):
         member = Member(1, 1)
         member.messages = [Message(1, 1, 1, 1, "Hello world", datetime.datetime.now())]
@@ -0,0 +1,138 @@
+import datetime
+from unittest.mock import Mock
+
+import pytest
+from attr import asdict
+from fuzzywuzzy import fuzz
+
+from antispam import AntiSpamHandler
+from antispam.dataclasses import Guild, Member, Message
+from antispam.engines import FuzzyWuzzyEngine, RapidFuzzEngine, ScoreCache
+from antispam.enums import Library
+
+from .mocks import MockedMember
+
+CONTENT = [
+    "Hello world",
+    "world hello!",
+    "Spam tho",
+    "SPAM THO",
+    "This is a test",
+    "Heres another message",
+    "My name is Ethan!",
+    "",
+    "a",
+    "a much much longer message than the others in this list",
+]
+
+
+class TestEngines:
+    def test_reference_engine_matches_fuzzywuzzy(self):
+        engine = FuzzyWuzzyEngine()
+        for first in CONTENT:
+            for second in CONTENT:
+                assert engine.ratio(first, second) == fuzz.token_sort_ratio(
+                    first, second
+                )
+                assert engine.compare(
+                    engine.process(first), engine.process(second)
+                ) == fuzz.token_sort_ratio(first, second)
+
+    def test_rapidfuzz_engine_close_to_reference(self):
+        engine = RapidFuzzEngine()
+        for first in CONTENT:
+            for second in CONTENT:
+                assert (
+                    abs(
+                        engine.ratio(first, second)
+                        - fuzz.token_sort_ratio(first, second)
+                    )
+                    <= 1
+                )
+
+    def test_rapidfuzz_score_cutoff(self):
+        engine = RapidFuzzEngine()
+        assert engine.ratio("Hello world", "world hello", 90) == 100
+        assert engine.ratio("Hello world", "My name is Ethan!", 90) == 0
+
+        # Rejected purely on length
+        assert engine.compare("a", "a much longer string", 90) == 0
+
+    def test_handler_engine_typing(self):
+        mock = MockedMember(mock_type="bot").to_mock()
+        with pytest.raises(ValueError):
+            AntiSpamHandler(mock, Library.DPY, similarity_engine=1)
+
+        handler = AntiSpamHandler(
+            mock, Library.DPY, similarity_engine=FuzzyWuzzyEngine()
+        )
+        assert isinstance(handler.similarity_engine, FuzzyWuzzyEngine)
+
+    def test_core_uses_reference_engine(self, create_core):
+        create_core.handler.similarity_engine = FuzzyWuzzyEngine()
+        member = Member(1, 1)
+        member.messages = [Message(1, 1, 1, 1, "Hello world", datetime.datetime.now())]
+        message = Message(2, 1, 1, 1, "world Hello", datetime.datetime.now())
+
+        create_core._calculate_ratios(message, member, Guild(1))
+
+        assert member.duplicate_counter == 2
+        assert message.is_duplicate is True
+
+    def test_processed_content_is_cached(self):
+        engine = RapidFuzzEngine()
+        message = Message(1, 1, 1, 1, "World  HELLO!")
+        assert message.processed_content is None
+
+        processed = message.get_processed_content(engine)
+        assert processed.content == "hello world"
+        assert processed.tokens == ("hello", "world")
+        assert processed.length == 11
+        assert message.get_processed_content(engine) is processed
+
+    def test_processed_content_is_not_persisted(self):
+        message = Message(1, 1, 1, 1, "Hello world")
+        message.get_processed_content(RapidFuzzEngine())
+
+        assert "_processed_content" not in asdict(message)
+        assert message == Message(1, 1, 1, 1, "Hello world", message.creation_time)
+
+    def test_score_cache(self):
+        cache = ScoreCache(max_bytes=ScoreCache.ENTRY_SIZE * 2)
+        assert cache.max_entries == 2
+        assert cache.get(b"a", b"b", 90) is None
+
+        cache.set(b"a", b"b", 90, 95)
+        # Pairs are stored either way round
+        assert cache.get(b"b", b"a", 90) == 95
+
+        # Below the cutoff it was made with, so unknown for lower ones
+        cache.set(b"a", b"c", 90, 0)
+        assert cache.get(b"a", b"c", 95) == 0
+        assert cache.get(b"a", b"c", 80) is None
+        assert cache.peek(b"a", b"c", 95) == 0
+
+        cache.set(b"a", b"d", 90, 100)
+        assert len(cache) == 2
+        assert cache.evictions == 1
+        assert cache.get(b"a", b"b", 90) is None
+        assert (cache.hits, cache.misses) == (2, 3)
+
+        with pytest.raises(ValueError):
+            ScoreCache(max_bytes=-1)
+
+    def test_core_uses_score_cache(self, create_core):
+        engine = create_core.handler.similarity_engine
+        engine.compare = Mock(wraps=engine.compare)
+        for member_id in (1, 2):
+            member = Member(member_id, 1)
+            member.messages = [
+                Message(1, 1, 1, member_id, "Hello world", datetime.datetime.now())
+            ]
+            message = Message(2, 1, 1, member_id, "Hello word", datetime.datetime.now())
+            create_core._calculate_ratios(message, member, Guild(1))
+            assert member.duplicate_counter == 2
+
+        # The second member reused the first members score
+        assert engine.compare.call_count == 1
+        assert create_core.handler.score_cache.hits == 1
@@ -0,0 +1,180 @@
+import asyncio
+
+import pytest
+
+from antispam import BasePlugin, CorePayload, UnsupportedAction
+from antispam.dataclasses import Histogram
+from antispam.dataclasses import Guild, Options
+from antispam.enums import OverflowPolicy
+from antispam.ingestion import FairQueue, QueueItem
+
+from .mocks import MockedMessage
+
+
+class CountingPlugin(BasePlugin):
+    def __init__(self):
+        super().__init__(is_pre_invoke=False)
+        self.calls = 0
+
+    async def propagate(self, message, data=None):
+        self.calls += 1
+        return {}
+
+
+class TestIngestion:
+    def test_histogram(self):
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 5, 10):
+            histogram.observe(value)
+
+        assert histogram.counts == [2, 2, 1]
+        assert histogram.count == 5
+        assert histogram.sum == 19
+
+        histogram.reset()
+        assert histogram.counts == [0, 0, 0]
+        assert histogram.count == 0
+
+    @pytest.mark.asyncio
+    async def test_fair_queue(self):
+        queue = FairQueue()
+        for i in range(4):
+            queue.put_nowait(QueueItem(i, None, guild_id=1, weight=2))
+        for i in range(2):
+            queue.put_nowait(QueueItem(i, None, guild_id=2, weight=1))
+
+        assert queue.qsize() == 6
+        assert queue.weight_of(1) == 2
+        served = [queue.get_nowait() for _ in range(6)]
+        assert [(item.guild_id, item.message) for item in served] == [
+            (1, 0),
+            (1, 1),
+            (2, 0),
+            (1, 2),
+            (1, 3),
+            (2, 1),
+        ]
+        assert queue.empty()
+        assert queue.weight_of(1) is None
+
+    @pytest.mark.asyncio
+    async def test_fair_queue_drop_oldest(self):
+        queue = FairQueue()
+        queue.put_nowait(QueueItem(0, None, guild_id=1, weight=1))
+        for i in range(3):
+            queue.put_nowait(QueueItem(i, None, guild_id=2, weight=1))
+
+        dropped = queue.drop_oldest()
+        assert (dropped.guild_id, dropped.message) == (2, 0)
+        assert queue.qsize() == 3
+
+    @pytest.mark.asyncio
+    async def test_submit_requires_start(self, create_handler):
+        with pytest.raises(UnsupportedAction):
+            await create_handler.submit(MockedMessage().to_mock())
+
+    @pytest.mark.asyncio
+    async def test_start_validates(self, create_handler):
+        with pytest.raises(ValueError):
+            await create_handler.start(workers=0)
+
+        with pytest.raises(ValueError):
+            await create_handler.start(max_queue_size=0)
+
+        with pytest.raises(ValueError):
+            await create_handler.start(overflow_policy=1)
+
+        await create_handler.start()
+        with pytest.raises(UnsupportedAction):
+            await create_handler.start()
+
+        await create_handler.stop()
+
+    @pytest.mark.asyncio
+    async def test_submit(self, create_handler):
+        await create_handler.start(workers=2, max_queue_size=2)
+        futures = [
+            await create_handler.submit(
+                MockedMessage(message_id=i, author_id=i % 2).to_mock()
+            )
+            for i in range(6)
+        ]
+        results = await asyncio.gather(*futures)
+        await create_handler.stop()
+
+        assert all(isinstance(result, CorePayload) for result in results)
+        member = await create_handler.cache.get_member(0, 123456789)
+        assert [message.id for message in member.messages] == [0, 2, 4]
+
+        metrics = create_handler.ingestion.metrics
+        assert metrics.submitted == 6
+        assert metrics.processed == 6
+        assert metrics.dropped == 0
+        assert metrics.depth.count == 6
+        assert metrics.wait_seconds.count == 6
+        assert metrics.guilds[123456789].processed == 6
+        assert metrics.guilds[123456789].propagate_seconds > 0
+
+    @pytest.mark.asyncio
+    async def test_guild_weight(self, create_handler):
+        await create_handler.cache.set_guild(
+            Guild(1, options=Options(scheduling_weight=3))
+        )
+        await create_handler.start(workers=1)
+        await create_handler.submit(MockedMessage(guild_id=1).to_mock())
+        await create_handler.submit(MockedMessage(message_id=2).to_mock())
+
+        queue = create_handler.ingestion._queues[0]
+        assert queue.weight_of(1) == 3
+        assert queue.weight_of(123456789) == 1
+        await create_handler.stop()
+
+    @pytest.mark.asyncio
+    async def test_drop_oldest(self, create_handler):
+        await create_handler.start(
+            workers=1, max_queue_size=1, overflow_policy=OverflowPolicy.DROP_OLDEST
+        )
+        # Workers don't get a chance to run between these
+        futures = [
+            await create_handler.submit(MockedMessage(message_id=i).to_mock())
+            for i in range(3)
+        ]
+        await create_handler.stop()
+
+        assert futures[0].cancelled()
+        assert futures[1].cancelled()
+        assert isinstance(futures[2].result(), CorePayload)
+        assert create_handler.ingestion.metrics.dropped == 2
+
+    @pytest.mark.asyncio
+    async def test_skip_plugins(self, create_handler):
+        plugin = CountingPlugin()
+        create_handler.register_plugin(plugin)
+        await create_handler.start(
+            workers=1, max_queue_size=2, overflow_policy=OverflowPolicy.SKIP_PLUGINS
+        )
+        futures = [
+            await create_handler.submit(MockedMessage(message_id=i).to_mock())
+            for i in range(4)
+        ]
+        await create_handler.stop()
+
+        assert all(not future.cancelled() for future in futures)
+        skipped = create_handler.ingestion.metrics.skipped_plugins
+        assert skipped > 0
+        assert plugin.calls == 4 - skipped
+
+    @pytest.mark.asyncio
+    async def test_stop_without_drain(self, create_handler):
+        await create_handler.start(workers=1)
+        futures = [
+            await create_handler.submit(MockedMessage(message_id=i).to_mock())
+            for i in range(3)
+        ]
+        await create_handler.stop(drain=False)
+
+        assert all(future.cancelled() for future in futures)
+        assert not create_handler.ingestion.running
+
+        with pytest.raises(UnsupportedAction):
+            await create_handler.submit(MockedMessage().to_mock())
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from antispam.member_locks import MemberLocks
+
+from .mocks import MockedMessage
+
+
+class TestMemberLocks:
+    def test_shards(self):
+        with pytest.raises(ValueError):
+            MemberLocks(shards=0)
+
+    @pytest.mark.asyncio
+    async def test_same_member_is_serialized(self):
+        locks = MemberLocks()
+        events = []
+
+        async def work(name: str):
+            async with locks.hold(1, 2):
+                events.append(f"{name} start")
+                await asyncio.sleep(0.01)
+                events.append(f"{name} end")
+
+        await asyncio.gather(work("a"), work("b"))
+
+        assert events == ["a start", "a end", "b start", "b end"]
+        assert locks.metrics.acquisitions == 2
+        assert locks.metrics.contended_acquisitions == 1
+        assert locks.metrics.waiting == 0
+        assert locks.metrics.wait_seconds > 0
+        assert locks.metrics.max_wait_seconds == locks.metrics.wait_seconds
+
+    @pytest.mark.asyncio
+    async def test_different_members_run_concurrently(self):
+        locks = MemberLocks(shards=2)
+        assert locks._get_lock(1, 1) is not locks._get_lock(1, 2)
+        events = []
+
+        async def work(member_id: int):
+            async with locks.hold(1, member_id):
+                events.append(f"{member_id} start")
+                await asyncio.sleep(0.01)
+                events.append(f"{member_id} end")
+
+        await asyncio.gather(work(1), work(2))
+
+        assert events == ["1 start", "2 start", "1 end", "2 end"]
+        assert locks.metrics.contended_acquisitions == 0
+
+    @pytest.mark.asyncio
+    async def test_released_on_error(self):
+        locks = MemberLocks()
+        with pytest.raises(RuntimeError):
+            async with locks.hold(1, 2):
+                raise RuntimeError
+
+        assert not locks._get_lock(1, 2).locked()
+
+    @pytest.mark.asyncio
+    async def test_hold_many(self):
+        locks = MemberLocks(shards=2)
+        events = []
+
+        async def batch(name: str, members):
+            async with locks.hold_many(members):
+                events.append(f"{name} start")
+                await asyncio.sleep(0.01)
+                events.append(f"{name} end")
+
+        # Members sharing a lock, listed in opposite orders
+        await asyncio.gather(
+            batch("a", [(1, 1), (1, 2), (1, 1)]), batch("b", [(1, 2), (1, 1)])
+        )
+
+        assert events == ["a start", "a end", "b start", "b end"]
+        assert locks.metrics.acquisitions == 4
+        assert not locks._get_lock(1, 1).locked()
+        assert not locks._get_lock(1, 2).locked()
+
+    @pytest.mark.asyncio
+    async def test_propagate_holds_lock(self, create_handler):
+        await asyncio.gather(
+            *(
+                create_handler.propagate(MockedMessage(message_id=i).to_mock())
+                for i in range(5)
+            )
+        )
+
+        assert create_handler.member_locks.metrics.acquisitions == 5
+        member = await create_handler.cache.get_member(12345, 123456789)
+        assert len(member.messages) == 5
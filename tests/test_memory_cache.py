@@ -1,6 +1,7 @@
 import pytest
 
 from antispam import GuildNotFound, MemberNotFound, Options
+from antispam.abc.cache import get_guild_options
 from antispam.dataclasses import Guild, Member, Message
 from antispam.enums import ResetType
 from antispam.factory import FactoryBuilder
@@ -22,6 +23,16 @@ class TestMemoryCache:
         val = await create_memory_cache.get_guild(1)
         assert val == 2
 
+    @pytest.mark.asyncio
+    async def test_get_guild_metadata(self, create_memory_cache):
+        with pytest.raises(GuildNotFound):
+            await get_guild_options(create_memory_cache, 1)
+
+        guild = Guild(1, Options(warn_threshold=5))
+        await create_memory_cache.set_guild(guild)
+        assert await create_memory_cache.get_guild_metadata(1) is guild
+        assert await get_guild_options(create_memory_cache, 1) is guild.options
+
     @pytest.mark.asyncio
     async def test_set_guild(self, create_memory_cache):
         assert create_memory_cache.cache == {}
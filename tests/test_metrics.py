@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from antispam import AntiSpamHandler
+from antispam.dataclasses import Histogram
+from antispam.enums import Library
+from antispam.metrics import CONTENT_TYPE, MetricsRegistry
+from antispam.plugins import Stats
+
+from .mocks import MockedMessage
+
+
+class TestMetrics:
+    def test_render(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("test_calls", "Calls", ("guild",))
+        counter.inc("1")
+        counter.inc("1", amount=2)
+        counter.inc('a"b')
+        registry.gauge("test_size", "Size", function=lambda: {(): 1.5})
+        histogram = registry.histogram("test_seconds", "Seconds", bounds=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(5)
+
+        assert registry.counter("test_calls", "Calls", ("guild",)) is counter
+        assert registry.render() == (
+            "# TYPE test_calls counter\n"
+            "# HELP test_calls Calls\n"
+            'test_calls_total{guild="1"} 3\n'
+            'test_calls_total{guild="a\\"b"} 1\n'
+            "# TYPE test_size gauge\n"
+            "# HELP test_size Size\n"
+            "test_size 1.5\n"
+            "# TYPE test_seconds histogram\n"
+            "# HELP test_seconds Seconds\n"
+            'test_seconds_bucket{le="0.1"} 1\n'
+            'test_seconds_bucket{le="1"} 1\n'
+            'test_seconds_bucket{le="+Inf"} 2\n'
+            "test_seconds_count 2\n"
+            "test_seconds_sum 5.05\n"
+            "# EOF\n"
+        )
+
+        with pytest.raises(ValueError):
+            counter.inc()
+
+        with pytest.raises(ValueError):
+            counter.inc("1", amount=-1)
+
+        registry.unregister("test_calls")
+        assert "test_calls" not in registry.render()
+
+    def test_function_histogram(self):
+        histogram = Histogram((1,))
+        histogram.observe(1)
+        registry = MetricsRegistry()
+        registry.histogram("test", "Test", function=lambda: {(): histogram})
+
+        assert 'test_bucket{le="1"} 1' in registry.render()
+
+    def test_guild_labels(self):
+        with pytest.raises(ValueError):
+            MetricsRegistry(max_guild_labels=-1)
+
+        registry = MetricsRegistry(max_guild_labels=2)
+        assert registry.guild_label(1) == "1"
+        assert registry.guild_label(2) == "2"
+        assert registry.guild_label(3) == "other"
+        assert registry.guild_label(1) == "1"
+
+    @pytest.mark.asyncio
+    async def test_handler_metrics(self, create_handler):
+        registry = MetricsRegistry()
+        handler = AntiSpamHandler(
+            create_handler.bot,
+            Library.DPY,
+            options=create_handler.options,
+            metrics=registry,
+        )
+        handler.register_plugin(Stats(handler))
+        assert handler.stage_timings is not None
+
+        for i in range(1, 7):
+            await handler.propagate(MockedMessage(message_id=i).to_mock())
+
+        text = registry.render()
+        assert 'antispam_messages_total{guild="123456789"} 6' in text
+        assert 'antispam_punishments_total{guild="123456789",type="warn"}' in text
+        assert 'antispam_tracked{kind="guilds"} 1' in text
+        assert 'antispam_tracked{kind="members"} 1' in text
+        assert 'antispam_stage_seconds_count{stage="guild_load"} 6' in text
+        assert 'antispam_member_lock_acquisitions_total{contended="false"} 6' in text
+        assert "antispam_stats_propagate_calls_total 6" in text
+        assert 'antispam_stats_guild_calls_total{guild="123456789"} 6' in text
+        assert (
+            'antispam_stats_plugin_calls_total{invoke="after",plugin="stats"}' in text
+        )
+        assert "antispam_member_lock_waiting 0" in text
+        assert 'antispam_offload_batches_total{offloaded="false"}' in text
+        assert "antispam_queue_submitted" not in text
+        assert text.endswith("# EOF\n")
+
+        await handler.start(workers=1)
+        await (await handler.submit(MockedMessage(message_id=7).to_mock()))
+        await handler.stop()
+
+        text = registry.render()
+        assert "antispam_queue_submitted_total 1" in text
+        assert "antispam_queue_wait_seconds_count 1" in text
+        assert 'antispam_queue_guild_processed_total{guild="123456789"} 1' in text
+        assert 'antispam_queue_depth_bucket{le="0"} 1' in text
+
+        with pytest.raises(ValueError):
+            AntiSpamHandler(create_handler.bot, Library.DPY, metrics=1)
+
+    @pytest.mark.asyncio
+    async def test_server(self):
+        registry = MetricsRegistry()
+        registry.counter("test", "Test").inc()
+        server = await registry.start_server(port=0)
+        port = server.sockets[0].getsockname()[1]
+
+        async def get(path: str) -> bytes:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            return response
+
+        try:
+            response = await get("/metrics")
+            assert response.startswith(b"HTTP/1.1 200 OK\r\n")
+            assert f"Content-Type: {CONTENT_TYPE}".encode() in response
+            assert response.endswith(registry.render().encode())
+
+            assert (await get("/")).startswith(b"HTTP/1.1 404 Not Found\r\n")
+        finally:
+            server.close()
+            await server.wait_closed()
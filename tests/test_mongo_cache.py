@@ -3,6 +3,7 @@ import datetime
 import pytest
 
 from antispam import GuildNotFound, Options, MemberNotFound
+from antispam.abc.cache import get_guild_options
 from antispam.dataclasses import Guild, Member, Message
 from antispam.enums import ResetType
 
@@ -19,6 +20,19 @@ class TestMongoCache:
         assert isinstance(r_1.options, Options)
         assert len(r_1.members) == 2
 
+    @pytest.mark.asyncio
+    async def test_get_guild_metadata(self, create_mongo_cache):
+        with pytest.raises(GuildNotFound):
+            await create_mongo_cache.get_guild_metadata(2)
+
+        r_1 = await create_mongo_cache.get_guild_metadata(1)
+        assert isinstance(r_1, Guild)
+        assert isinstance(r_1.options, Options)
+        assert not r_1.members
+
+        options = await get_guild_options(create_mongo_cache, 1)
+        assert isinstance(options, Options)
+
     @pytest.mark.asyncio
     async def test_set_guild(self, create_mongo_cache):
         with pytest.raises(GuildNotFound):
@@ -1,15 +1,27 @@
+import asyncio
 import datetime
+from unittest.mock import Mock
 
 import orjson as json
 
 import pytest
 from attr import asdict
-
-from antispam import GuildNotFound, MemberNotFound, Options
+from fakeredis import FakeAsyncRedis, FakeServer
+
+from antispam import (
+    AntiSpamHandler,
+    DuplicateObject,
+    GuildNotFound,
+    MemberNotFound,
+    Options,
+    UnsupportedAction,
+)
+from antispam.abc.cache import get_guild_options
 from antispam.caches.redis import RedisCache
 from antispam.dataclasses import Guild, Member, Message
-from antispam.enums import ResetType
+from antispam.enums import Library, ResetType
 from antispam.factory import FactoryBuilder
+from tests.mocks import MockedMessage
 
 
 class TestRedisCache:
@@ -23,19 +35,36 @@ class TestRedisCache:
         with pytest.raises(GuildNotFound):
             await create_redis_cache.get_guild(1)
 
-        create_redis_cache.redis.cache["GUILD:1"] = json.dumps(
-            asdict(Guild(1), recurse=True)
+        await create_redis_cache.redis.set(
+            "GUILD:1", json.dumps(asdict(Guild(1), recurse=True))
         )
 
         val = await create_redis_cache.get_guild(1)
         assert val
         assert isinstance(val, Guild)
 
+    @pytest.mark.asyncio
+    async def test_get_guild_metadata(self, create_redis_cache):
+        with pytest.raises(GuildNotFound):
+            await create_redis_cache.get_guild_metadata(1)
+
+        await create_redis_cache.set_guild(
+            Guild(1, Options(warn_threshold=5), log_channel_id=2)
+        )
+        await create_redis_cache.set_member(Member(1, 1))
+
+        guild = await create_redis_cache.get_guild_metadata(1)
+        assert guild.log_channel_id == 2
+        assert not guild.members
+
+        options = await get_guild_options(create_redis_cache, 1)
+        assert options == Options(warn_threshold=5)
+
     @pytest.mark.asyncio
     async def test_set_guild(self, create_redis_cache):
-        assert not create_redis_cache.redis.cache
+        assert not await create_redis_cache.redis.dbsize()
         await create_redis_cache.set_guild(Guild(1, Options()))
-        assert create_redis_cache.redis.cache
+        assert await create_redis_cache.redis.dbsize()
 
     @pytest.mark.asyncio
     async def test_get_member(self, create_redis_cache):
@@ -224,3 +253,459 @@ class TestRedisCache:
         assert isinstance(member.messages[0].creation_time, datetime.datetime)
         await create_redis_cache.set_member(member)
         assert isinstance(member.messages[0].creation_time, datetime.datetime)
+
+    @pytest.mark.asyncio
+    async def test_id_sets(self, create_redis_cache):
+        redis = create_redis_cache.redis
+        await create_redis_cache.set_guild(Guild(1, Options()))
+        await create_redis_cache.set_member(Member(1, 1))
+        await create_redis_cache.set_member(Member(2, 2))
+
+        assert await redis.smembers("GUILDS") == {b"1", b"2"}
+        assert await redis.smembers("MEMBERS:1") == {b"1"}
+
+        # Nothing should scan the keyspace
+        redis.keys = Mock(side_effect=AssertionError)
+        guilds = await FactoryBuilder.get_all_guilds_as_list(create_redis_cache)
+        assert [len(guild.members) for guild in guilds] == [1, 1]
+
+        await create_redis_cache.delete_member(1, 1)
+        assert not await redis.smembers("MEMBERS:1")
+
+        await create_redis_cache.delete_guild(2)
+        assert await redis.smembers("GUILDS") == {b"1"}
+        assert not await redis.exists("MEMBERS:2", "MEMBER:2:2")
+
+    @pytest.mark.asyncio
+    async def test_get_all_members_batches(self, create_handler):
+        cache = RedisCache(create_handler, FakeAsyncRedis(), batch_size=2)
+        for member_id in range(5):
+            await cache.set_member(Member(member_id, 1))
+
+        cache.redis.pipeline = Mock(wraps=cache.redis.pipeline)
+        members = await FactoryBuilder.get_all_members_as_list(cache, 1)
+
+        assert sorted(member.id for member in members) == list(range(5))
+        assert cache.redis.pipeline.call_count == 3
+
+        with pytest.raises(ValueError):
+            RedisCache(create_handler, FakeAsyncRedis(), batch_size=0)
+
+    @pytest.mark.asyncio
+    async def test_migrate(self, create_redis_cache):
+        redis = create_redis_cache.redis
+        # How guilds and members were stored before the id sets
+        await redis.set("GUILD:1", json.dumps(asdict(Guild(1), recurse=True)))
+        for member_id in range(3):
+            await redis.set(
+                f"MEMBER:1:{member_id}",
+                json.dumps(asdict(Member(member_id, 1), recurse=True)),
+            )
+
+        assert not await FactoryBuilder.get_all_guilds_as_list(create_redis_cache)
+
+        assert await create_redis_cache.migrate() == 4
+        assert await create_redis_cache.migrate() == 4
+
+        guilds = await FactoryBuilder.get_all_guilds_as_list(create_redis_cache)
+        assert len(guilds) == 1
+        assert len(guilds[0].members) == 3
+
+    @pytest.mark.asyncio
+    async def test_set_guild_only_writes_changes(self, create_redis_cache):
+        redis = create_redis_cache.redis
+        await create_redis_cache.set_guild(
+            Guild(
+                1,
+                Options(),
+                members={
+                    i: Member(i, 1, messages=[Message(i, 1, 1, i, "Hello world")])
+                    for i in range(1, 4)
+                },
+            )
+        )
+
+        guild = await create_redis_cache.get_guild(1)
+        guild.members[1].warn_count = 1
+        guild.members.pop(2)
+        guild.members[4] = Member(4, 1)
+        guild.log_channel_id = 5
+
+        # Changed behind the guilds back, so we can tell it isn't rewritten
+        await redis.set(
+            "MEMBER:1:3",
+            create_redis_cache._dump_member(Member(3, 1, addons={"Changed": True})),
+        )
+        await create_redis_cache.set_guild(guild)
+
+        stored = await create_redis_cache.get_guild(1)
+        assert stored.log_channel_id == 5
+        assert sorted(stored.members) == [1, 3, 4]
+        assert stored.members[1].warn_count == 1
+        assert stored.members[3].addons == {"Changed": True}
+        assert await redis.smembers("MEMBERS:1") == {b"1", b"3", b"4"}
+        assert not await redis.exists("MEMBER:1:2")
+
+        # Loaded members serialize the same as they were stored,
+        # so saving the guild again won't rewrite any of them
+        for member in stored.members.values():
+            assert create_redis_cache._queue_member(Mock(), member) is None
+
+    @pytest.mark.asyncio
+    async def test_set_guild_removes_unloaded_members(self, create_redis_cache):
+        await create_redis_cache.set_guild(
+            Guild(1, Options(), members={1: Member(1, 1), 2: Member(2, 1)})
+        )
+
+        # A new guild object doesn't know what is stored, so has to check
+        await create_redis_cache.set_guild(
+            Guild(1, Options(), members={2: Member(2, 1)})
+        )
+
+        guild = await create_redis_cache.get_guild(1)
+        assert list(guild.members) == [2]
+        with pytest.raises(MemberNotFound):
+            await create_redis_cache.get_member(1, 1)
+
+    @pytest.mark.asyncio
+    async def test_add_message_list(self, create_handler):
+        cache = RedisCache(create_handler, FakeAsyncRedis(), max_messages=2)
+        redis = cache.redis
+        await cache.set_guild(Guild(1, Options(message_interval=5000)))
+
+        redis.pipeline = Mock(wraps=redis.pipeline)
+        redis.execute_command = Mock(wraps=redis.execute_command)
+        for message_id in range(3):
+            await cache.add_message(Message(message_id, 2, 1, 4, "Content"))
+
+        # A single round trip per message
+        assert redis.pipeline.call_count == 3
+        assert redis.execute_command.call_count == 0
+
+        assert await redis.llen("MEMBER_MESSAGES:1:4") == 2
+        assert 4000 < await redis.pttl("MEMBER_MESSAGES:1:4") <= 5000
+
+        member = await cache.get_member(4, 1)
+        assert [message.id for message in member.messages] == [1, 2]
+        assert isinstance(member.messages[0].creation_time, datetime.datetime)
+
+        with pytest.raises(ValueError):
+            RedisCache(create_handler, FakeAsyncRedis(), max_messages=0)
+
+    @pytest.mark.asyncio
+    async def test_add_message_script(self, create_handler):
+        cache = RedisCache(create_handler, FakeAsyncRedis(), use_scripts=True)
+        redis = cache.redis
+        now = datetime.datetime.now(datetime.timezone.utc)
+        await cache.set_guild(Guild(1, Options(message_interval=5000)))
+
+        redis.pipeline = Mock(wraps=redis.pipeline)
+        redis.evalsha = Mock(wraps=redis.evalsha)
+        contents = ["Spam", "Other", "spam", "Spam"]
+        for message_id, content in enumerate(contents):
+            message = Message(
+                message_id,
+                2,
+                1,
+                4,
+                content,
+                creation_time=now + datetime.timedelta(seconds=message_id * 2),
+            )
+            duplicates = await cache.add_message_and_count_duplicates(message)
+
+        # A single round trip per message, other then the
+        # first which loads the script into Redis and retries
+        assert redis.pipeline.call_count == 0
+        assert redis.evalsha.call_count == 5
+        assert duplicates == 2
+        assert 4000 < await redis.pttl("MEMBER_MESSAGES:1:4") <= 5000
+
+        # The first message is older then the interval
+        member = await cache.get_member(4, 1)
+        assert [message.id for message in member.messages] == [1, 2, 3]
+        assert member.messages[0].creation_time == now + datetime.timedelta(seconds=2)
+
+        # Members and guilds are created if needed
+        assert (
+            await cache.add_message_and_count_duplicates(Message(1, 2, 5, 6, "Spam"))
+            == 1
+        )
+        assert await cache.get_guild(5)
+
+        with pytest.raises(UnsupportedAction):
+            await RedisCache(
+                create_handler, FakeAsyncRedis()
+            ).add_message_and_count_duplicates(Message(1, 2, 1, 4, "Spam"))
+
+    @pytest.mark.asyncio
+    async def test_add_message_script_then_set_member(self, create_handler):
+        cache = RedisCache(create_handler, FakeAsyncRedis(), use_scripts=True)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        await cache.set_guild(Guild(1, Options(message_interval=5000)))
+        for message_id in range(3):
+            await cache.add_message(
+                Message(
+                    message_id,
+                    2,
+                    1,
+                    4,
+                    f"Message {message_id}",
+                    creation_time=now + datetime.timedelta(seconds=message_id),
+                )
+            )
+
+        member = await cache.get_member(4, 1)
+        # Expired locally, and by the script when adding the next message
+        member.messages.pop(0)
+        await cache.add_message(
+            Message(
+                3,
+                2,
+                1,
+                4,
+                "Message 3",
+                creation_time=now + datetime.timedelta(seconds=5),
+            )
+        )
+        member.warn_count += 1
+        await cache.set_member(member)
+
+        member = await cache.get_member(4, 1)
+        assert [message.id for message in member.messages] == [1, 2, 3]
+        assert member.warn_count == 1
+
+    @pytest.mark.asyncio
+    async def test_add_message_and_get_window(self, create_handler):
+        cache = RedisCache(create_handler, FakeAsyncRedis(), use_scripts=True)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        await cache.set_guild(Guild(1, Options(message_interval=5000)))
+
+        results = []
+        for message_id, content in enumerate(["Spam", "Spam", "Other", "Spam"]):
+            message = Message(
+                message_id,
+                2,
+                1,
+                4,
+                content,
+                creation_time=now + datetime.timedelta(seconds=message_id * 2),
+            )
+            results.append(
+                await cache.add_message_and_get_window(
+                    message,
+                    cutoff=message.creation_time - datetime.timedelta(seconds=5),
+                    duplicate_count=3,
+                )
+            )
+
+        assert [amount for amount, _ in results] == [0, 1, 0, 1]
+        # The window excludes the message being added
+        amount, member = results[-1]
+        assert [message.id for message in member.messages] == [1, 2]
+        assert member.duplicate_counter == 2
+        assert [message.is_duplicate for message in member.messages] == [True, False]
+
+        # Message 0 expired, and lowered the counter as it was a duplicate
+        member = await cache.get_member(4, 1)
+        assert [message.id for message in member.messages] == [1, 2, 3]
+        assert member.duplicate_counter == 2
+
+        with pytest.raises(DuplicateObject):
+            await cache.add_message_and_get_window(
+                Message(3, 2, 1, 4, "Spam", creation_time=now),
+                cutoff=now - datetime.timedelta(seconds=5),
+                duplicate_count=3,
+            )
+
+        member.internal_is_in_guild = False
+        await cache.set_member(member)
+        amount, member = await cache.add_message_and_get_window(
+            Message(10, 2, 1, 4, "Spam"),
+            cutoff=now - datetime.timedelta(seconds=5),
+            duplicate_count=3,
+        )
+        assert amount == 0
+        assert 10 not in [
+            message.id for message in (await cache.get_member(4, 1)).messages
+        ]
+
+        with pytest.raises(UnsupportedAction):
+            await RedisCache(
+                create_handler, FakeAsyncRedis()
+            ).add_message_and_get_window(
+                Message(1, 2, 1, 4, "Spam"), cutoff=now, duplicate_count=3
+            )
+
+    @pytest.mark.asyncio
+    async def test_scripted_propagate(self, create_handler):
+        cache = RedisCache(create_handler, FakeAsyncRedis(), use_scripts=True)
+        create_handler.set_cache(cache)
+        redis = cache.redis
+        await create_handler.propagate(MockedMessage(message_id=0).to_mock())
+
+        cache.get_member = Mock(wraps=cache.get_member)
+        redis.evalsha = Mock(wraps=redis.evalsha)
+        results = [
+            await create_handler.propagate(MockedMessage(message_id=i).to_mock())
+            for i in range(1, 5)
+        ]
+
+        # The script returns the member, so it is never fetched
+        assert cache.get_member.call_count == 0
+        assert redis.evalsha.call_count == 4
+        assert [result.member_was_warned for result in results] == [
+            False,
+            False,
+            True,
+            True,
+        ]
+
+    @pytest.mark.asyncio
+    async def test_scripted_propagate_shared_redis(self, create_handler):
+        server = FakeServer()
+        handlers = []
+        for _ in range(2):
+            handler = AntiSpamHandler(
+                create_handler.bot, Library.DPY, options=Options(use_timeouts=False)
+            )
+            handler.set_cache(
+                RedisCache(handler, FakeAsyncRedis(server=server), use_scripts=True)
+            )
+            handlers.append(handler)
+
+        # Half the messages go through each process, at the same time
+        await asyncio.gather(
+            *(
+                handlers[i % 2].propagate(MockedMessage(message_id=i).to_mock())
+                for i in range(8)
+            )
+        )
+
+        # The same as a single process handling them one at a time
+        for i in range(8):
+            await create_handler.propagate(MockedMessage(message_id=i).to_mock())
+        expected = await create_handler.cache.get_member(12345, 123456789)
+
+        member = await handlers[0].cache.get_member(12345, 123456789)
+        assert len(member.messages) == 8
+        assert member.duplicate_counter == expected.duplicate_counter == 9
+        assert all(message.is_duplicate for message in member.messages)
+
+    @pytest.mark.asyncio
+    async def test_guild_deleted_by_other_client(self, create_handler):
+        server = FakeServer()
+        first = RedisCache(create_handler, FakeAsyncRedis(server=server))
+        second = RedisCache(
+            create_handler, FakeAsyncRedis(server=server), use_scripts=True
+        )
+
+        await first.set_member(Member(1, 1))
+        await second.delete_guild(1)
+        await first.set_member(Member(2, 1))
+        assert await second.get_guild_metadata(1)
+
+        await second.delete_guild(1)
+        await first.add_message(Message(1, 1, 1, 1, "Hello world"))
+        assert await second.get_guild_metadata(1)
+
+        # The script is told the guild exists, then retries sending it
+        await first.delete_guild(1)
+        await second.add_message(Message(2, 1, 1, 1, "Hello world"))
+        assert await first.get_guild_metadata(1)
+        assert len((await second.get_member(1, 1)).messages) == 1
+
+    @pytest.mark.asyncio
+    async def test_known_guilds_are_bounded(self, create_redis_cache):
+        create_redis_cache.max_known_guilds = 2
+        for guild_id in (1, 2, 3):
+            await create_redis_cache.set_member(Member(1, guild_id))
+
+        await create_redis_cache.set_member(Member(2, 2))
+        assert list(create_redis_cache._known_guilds) == [3, 2]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_member_changes(self, create_redis_cache):
+        await create_redis_cache.set_member(Member(1, 1, warn_count=1))
+        await create_redis_cache.add_message(Message(1, 2, 1, 1, "First"))
+
+        first = await create_redis_cache.get_member(1, 1)
+        second = await create_redis_cache.get_member(1, 1)
+        await create_redis_cache.add_message(Message(2, 2, 1, 1, "Second"))
+
+        first.warn_count += 1
+        second.warn_count += 1
+        second.kick_count += 1
+        # Expired, so removed from the start of the list
+        second.messages.pop(0)
+        await create_redis_cache.set_member(first)
+        await create_redis_cache.set_member(second)
+
+        member = await create_redis_cache.get_member(1, 1)
+        assert member.warn_count == 3
+        assert member.kick_count == 1
+        assert [message.id for message in member.messages] == [2]
+
+        await create_redis_cache.reset_member_count(1, 1, ResetType.WARN_COUNTER)
+        await create_redis_cache.reset_member_count(2, 1, ResetType.WARN_COUNTER)
+        assert (await create_redis_cache.get_member(1, 1)).warn_count == 0
+        with pytest.raises(MemberNotFound):
+            await create_redis_cache.get_member(2, 1)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_message_removal(self, create_redis_cache):
+        for message_id in range(1, 4):
+            await create_redis_cache.add_message(
+                Message(message_id, 2, 1, 1, f"Message {message_id}")
+            )
+
+        # Two writers both expire the same message
+        first = await create_redis_cache.get_member(1, 1)
+        second = await create_redis_cache.get_member(1, 1)
+        first.messages.pop(0)
+        second.messages.pop(0)
+        await create_redis_cache.set_member(first)
+        await create_redis_cache.set_member(second)
+
+        member = await create_redis_cache.get_member(1, 1)
+        assert [message.id for message in member.messages] == [2, 3]
+
+        # Messages removed from anywhere are removed by value,
+        # so another writers new message is kept
+        first = await create_redis_cache.get_member(1, 1)
+        await create_redis_cache.add_message(Message(4, 2, 1, 1, "Message 4"))
+        first.messages.pop(1)
+        await create_redis_cache.set_member(first)
+
+        member = await create_redis_cache.get_member(1, 1)
+        assert [message.id for message in member.messages] == [2, 4]
+
+    @pytest.mark.asyncio
+    async def test_member_stored_as_json(self, create_redis_cache):
+        # How members were stored before counters and messages were split out
+        await create_redis_cache.set_guild(Guild(1, Options()))
+        await create_redis_cache.redis.set(
+            "MEMBER:1:1",
+            json.dumps(
+                asdict(
+                    Member(1, 1, warn_count=2, messages=[Message(1, 2, 1, 1, "Hi")]),
+                    recurse=True,
+                )
+            ),
+        )
+        await create_redis_cache.redis.sadd("MEMBERS:1", 1)
+        await create_redis_cache.add_message(Message(2, 2, 1, 1, "There"))
+
+        member = await create_redis_cache.get_member(1, 1)
+        assert member.warn_count == 2
+        assert [message.id for message in member.messages] == [1, 2]
+
+        member.warn_count += 1
+        await create_redis_cache.set_member(member)
+
+        member = await create_redis_cache.get_member(1, 1)
+        assert member.warn_count == 3
+        assert [message.id for message in member.messages] == [1, 2]
+        assert (
+            json.loads(await create_redis_cache.redis.get("MEMBER:1:1"))["messages"]
+            == []
+        )
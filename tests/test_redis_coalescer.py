@@ -0,0 +1,113 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from redis import ResponseError
+
+from antispam.caches.redis import RedisCache
+from antispam.caches.redis.coalescer import CommandCoalescer
+from antispam.dataclasses import Member
+
+from .mocks import MockedMessage
+
+
+class TestRedisCoalescer:
+    @pytest.mark.asyncio
+    async def test_same_tick(self):
+        redis = FakeAsyncRedis()
+        coalescer = CommandCoalescer(redis)
+        redis.pipeline = Mock(wraps=redis.pipeline)
+
+        await asyncio.gather(*(coalescer.set(f"KEY:{i}", i) for i in range(10)))
+        assert redis.pipeline.call_count == 1
+
+        results = await asyncio.gather(
+            coalescer.get("KEY:1"),
+            coalescer.hgetall("MISSING"),
+            coalescer.execute(
+                [(("INCR", "KEY:2"), {}), (("EXISTS", "KEY:3"), {})],
+                transaction=True,
+            ),
+        )
+        assert results == [b"1", {}, [3, 1]]
+        assert redis.pipeline.call_count == 2
+        assert await coalescer.execute([]) == []
+
+        with pytest.raises(ValueError):
+            CommandCoalescer(redis, window=-1)
+
+    @pytest.mark.asyncio
+    async def test_window(self):
+        redis = FakeAsyncRedis()
+        coalescer = CommandCoalescer(redis, window=50_000)
+        redis.pipeline = Mock(wraps=redis.pipeline)
+
+        async def later(i: int):
+            await asyncio.sleep(i / 1000)
+            await coalescer.set(f"KEY:{i}", i)
+
+        await asyncio.gather(*(later(i) for i in range(5)))
+        assert redis.pipeline.call_count == 1
+        assert await redis.get("KEY:4") == b"4"
+
+    @pytest.mark.asyncio
+    async def test_errors_are_separate(self):
+        redis = FakeAsyncRedis()
+        coalescer = CommandCoalescer(redis)
+        await redis.set("STRING", "value")
+
+        results = await asyncio.gather(
+            coalescer.hgetall("STRING"),
+            coalescer.set("OTHER", 1),
+            return_exceptions=True,
+        )
+        assert isinstance(results[0], ResponseError)
+        assert results[1] is True
+
+    @pytest.mark.asyncio
+    async def test_redis_cache(self, create_handler):
+        redis = FakeAsyncRedis()
+        cache = RedisCache(create_handler, redis, coalesce_window=0)
+        coalescer = cache._coalescer
+        coalescer._send = Mock(wraps=coalescer._send)
+
+        await asyncio.gather(
+            *(cache.set_member(Member(member_id, 1)) for member_id in range(10))
+        )
+        members = await asyncio.gather(
+            *(cache.get_member(member_id, 1) for member_id in range(10))
+        )
+        assert [member.id for member in members] == list(range(10))
+        assert coalescer._send.call_count == 2
+
+        create_handler.set_cache(cache)
+        await asyncio.gather(
+            *(
+                create_handler.propagate(
+                    MockedMessage(message_id=i, author_id=i % 3).to_mock()
+                )
+                for i in range(6)
+            )
+        )
+        member = await cache.get_member(2, 123456789)
+        assert [message.id for message in member.messages] == [2, 5]
+
+    @pytest.mark.asyncio
+    async def test_set_member_remembers_guilds(self, create_handler):
+        redis = FakeAsyncRedis()
+        cache = RedisCache(create_handler, redis)
+        redis.pipeline = Mock(wraps=redis.pipeline)
+        redis.execute_command = Mock(wraps=redis.execute_command)
+
+        await cache.set_member(Member(1, 1))
+        await cache.set_member(Member(2, 1))
+
+        # One round trip each, checking the guild still exists within it
+        assert redis.pipeline.call_count == 2
+        assert redis.execute_command.call_count == 0
+        assert await cache.get_guild(1)
+
+        await cache.delete_guild(1)
+        await cache.set_member(Member(1, 1))
+        assert await cache.get_guild(1)
@@ -1,9 +1,12 @@
+import copy
 import datetime
 
 import discord
 import pytest
 
-from antispam.libs.shared import Base
+from antispam import Options
+from antispam.libs.shared import Base, PropagationFilter
+from antispam.libs.shared.propagation_filter import WatchedSet, watch_ignored_sets
 from tests.conftest import MockClass
 from tests.mocks import MockedMessage
 
@@ -19,3 +22,65 @@ class TestSharedBase:
 
         with pytest.raises(NotImplementedError):
             await create_base.dict_to_lib_embed(dict())
+
+    def test_propagation_filter(self):
+        options = Options(ignored_members={1}, ignored_roles={4, 3})
+        guild_options = Options(
+            ignored_members={6},
+            ignored_channels={7},
+            ignored_roles={8},
+            ignore_bots=False,
+        )
+        propagation_filter = PropagationFilter.from_options(5, options, guild_options)
+
+        assert propagation_filter.ignored_members == frozenset({1, 6})
+        assert propagation_filter.check(author_id=6, channel_id=2, is_bot=False) == {
+            "status": "Ignoring this member: 6"
+        }
+        # The first of the authors roles, in the order they are given
+        assert propagation_filter.check(
+            author_id=2, channel_id=2, is_bot=False, role_ids=[5, 4, 3]
+        ) == {"status": "Ignoring this role: 4"}
+        # A guilds own channels and roles are not ignored
+        assert (
+            propagation_filter.check(
+                author_id=2, channel_id=7, is_bot=False, role_ids=[8]
+            )
+            is None
+        )
+        assert propagation_filter.check(author_id=2, channel_id=2, is_bot=True) == {
+            "status": "Ignoring messages from bots"
+        }
+
+        # Guilds without options of their own use the defaults
+        options.ignore_bots = False
+        propagation_filter = PropagationFilter.from_options(5, options)
+        assert propagation_filter.check(author_id=2, channel_id=2, is_bot=True) == {
+            "status": "Ignoring messages from bots"
+        }
+
+        options.ignored_guilds.add(5)
+        propagation_filter = PropagationFilter.from_options(5, options, options)
+        assert propagation_filter.check(author_id=2, channel_id=2, is_bot=False) == {
+            "status": "Ignoring this guild: 5"
+        }
+
+    def test_watched_set(self):
+        options = Options(ignored_members={1})
+        filters = {1: None}
+        watch_ignored_sets(options, filters)
+        assert isinstance(options.ignored_members, WatchedSet)
+        assert options.ignored_members == {1}
+
+        options.ignored_members.add(2)
+        assert not filters
+
+        filters[1] = None
+        options.ignored_channels |= {3}
+        assert not filters
+        assert options.ignored_channels == {3}
+
+        # Copies don't hold onto the filters
+        copied = copy.deepcopy(options)
+        assert type(copied.ignored_members) is set
+        assert copied == options
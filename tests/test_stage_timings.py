@@ -0,0 +1,95 @@
+import pytest
+
+from antispam import AntiSpamHandler, BasePlugin
+from antispam.dataclasses import LatencyHistogram
+from antispam.enums import Library
+from antispam.stage_timings import StageTimings
+
+from .mocks import MockedMessage
+
+
+class TestStageTimings:
+    def test_precision(self):
+        with pytest.raises(ValueError):
+            StageTimings(precision=0)
+
+        with pytest.raises(ValueError):
+            LatencyHistogram(precision=0)
+
+    def test_histogram(self):
+        histogram = LatencyHistogram()
+        assert histogram.value_at_percentile(50) == 0
+        assert histogram.mean == 0
+
+        for ms in range(1, 101):
+            histogram.record(ms / 1000)
+
+        assert histogram.count == 100
+        assert histogram.min == 1_000_000
+        assert histogram.max == 100_000_000
+        assert histogram.mean == pytest.approx(0.0505)
+        assert histogram.value_at_percentile(50) == pytest.approx(0.05, rel=2**-6)
+        assert histogram.value_at_percentile(99) == pytest.approx(0.099, rel=2**-6)
+        assert histogram.value_at_percentile(100) == 0.1
+        # Buckets are shared between close enough values
+        assert len(histogram.counts) < 100
+
+        with pytest.raises(ValueError):
+            histogram.value_at_percentile(101)
+
+        histogram.reset()
+        assert histogram.count == 0
+        assert histogram.counts == {}
+        assert histogram.max is None
+
+    @pytest.mark.asyncio
+    async def test_handler_stages(self, create_handler):
+        class Before(BasePlugin):
+            async def propagate(self, message, data=None):
+                return {}
+
+        class After(Before):
+            pass
+
+        timings = StageTimings()
+        handler = AntiSpamHandler(
+            create_handler.bot,
+            Library.DPY,
+            options=create_handler.options,
+            stage_timings=timings,
+        )
+        handler.register_plugin(Before())
+        handler.register_plugin(After(False))
+
+        punished = 0
+        for i in range(1, 7):
+            data = await handler.propagate(MockedMessage(message_id=i).to_mock())
+            punished += data.member_should_be_punished_this_message
+
+        stages = handler.stage_timings.get_all()
+        assert set(stages) == {
+            "filter",
+            "guild_load",
+            "member_load",
+            "clean_up",
+            "create_message",
+            "ratios",
+            "cache_write",
+            "punishment",
+            "pre_invoke:before",
+            "after_invoke:after",
+        }
+        assert stages["filter"].count == 6
+        assert stages["cache_write"].count == 6
+        assert stages["punishment"].count == punished > 0
+        assert timings.get("punishment").max > 0
+        assert timings.get("unknown").count == 0
+
+        timings.reset()
+        assert timings.get_all() == {}
+
+    def test_disabled_by_default(self, create_handler):
+        assert create_handler.stage_timings is None
+
+        with pytest.raises(ValueError):
+            AntiSpamHandler(create_handler.bot, Library.DPY, stage_timings=1)